@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class GoogleIdentityConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'google_identity'
+
+    def ready(self):
+        from .cache import discovery_document
+
+        if settings.GOOGLE_WARM_UP_DISCOVERY:
+            # Fetched in the background so startup never waits on Google
+            discovery_document.refresh_in_background()
@@ -0,0 +1,355 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+
+logger = logging.getLogger(__name__)
+
+DISCOVERY_DOCUMENT_URL = "https://accounts.google.com/.well-known/openid-configuration"
+
+# Where Google publishes the certificates its ID tokens are signed with
+CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+
+# Seconds to wait on each call to Google
+HTTP_TIMEOUT = 10
+
+# How long to keep a document whose response has no max-age, and the
+# shortest time to keep any document, in seconds
+DEFAULT_MAX_AGE = 60 * 60
+MIN_MAX_AGE = 60
+
+# The share of a document's lifetime after which it is refreshed in the
+# background, so that requests rarely wait on Google
+REFRESH_AHEAD = 0.75
+
+# Seconds to wait before trying again after Google could not be reached
+RETRY_AFTER = 30
+
+# The least number of seconds between fetches for signing keys that are
+# not in the cached set, so tokens with made up key IDs cannot flood Google
+ROTATION_CHECK_INTERVAL = 60
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+def get_max_age(headers) -> int | None:
+    """Get how long a response can be cached for from its headers.
+
+    Args:
+        headers (Mapping): The response headers.
+
+    Returns:
+        int | None: The max-age less the age of the response, in seconds,
+            or None if the response has no max-age.
+    """
+    cache_control = headers.get("Cache-Control", "")
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0
+    match = MAX_AGE_PATTERN.search(cache_control)
+    if match is None:
+        return None
+    try:
+        age = int(headers.get("Age", 0))
+    except ValueError:
+        age = 0
+    return max(int(match.group(1)) - age, 0)
+
+
+class RemoteDocument:
+    """Process-wide copy of a JSON document published by Google.
+
+    The document is kept for as long as the Cache-Control max-age of its
+    response allows, and refreshed in a background thread once most of
+    that time has passed. Requests only wait on Google when there is no
+    copy yet, or when the copy has expired, and then only one thread, or
+    one coroutine per event loop, fetches it while the others wait for its
+    result. If Google cannot be reached the last good copy keeps being
+    served, and the fetch is retried every `RETRY_AFTER` seconds.
+    """
+
+    def __init__(self, url: str, name: str):
+        self.url = url
+        self.name = name
+        # Held while fetching, so that only one fetch runs at a time
+        self.lock = threading.Lock()
+        # The same for coroutines, one per event loop as an asyncio lock
+        # can only be waited on in the loop it was first waited on in
+        self.async_locks = weakref.WeakKeyDictionary()
+        self.clear()
+
+    def clear(self):
+        """Drop the cached copy."""
+        self.document = None
+        self.refresh_at = 0
+        self.expires_at = 0
+        self.retry_at = 0
+
+    @property
+    def expired(self) -> bool:
+        now = time.monotonic()
+        return now >= self.expires_at and now >= self.retry_at
+
+    def get(self) -> dict:
+        """Get the document, fetching it first if needed.
+
+        Returns:
+            dict: The document.
+
+        Raises:
+            requests.RequestException: If there is no copy of the document
+                and Google could not be reached.
+        """
+        if self.document is None or self.expired:
+            with self.lock:
+                # Another thread may have fetched it while we waited
+                if self.document is None or self.expired:
+                    self.fetch()
+        else:
+            self.refresh_if_due()
+        return self.document
+
+    async def aget(self, client: httpx.AsyncClient) -> dict:
+        """Get the document without blocking, fetching it first if needed.
+
+        Args:
+            client (httpx.AsyncClient): The client to fetch it with.
+
+        Returns:
+            dict: The document.
+
+        Raises:
+            httpx.HTTPError: If there is no copy of the document and Google
+                could not be reached.
+        """
+        if self.document is None or self.expired:
+            async with self.async_lock():
+                # Another coroutine may have fetched it while we waited
+                if self.document is None or self.expired:
+                    await self.afetch(client)
+        else:
+            self.refresh_if_due()
+        return self.document
+
+    def async_lock(self) -> asyncio.Lock:
+        """Get the lock that coroutines of the running event loop fetch under."""
+        loop = asyncio.get_running_loop()
+        lock = self.async_locks.get(loop)
+        if lock is None:
+            lock = self.async_locks[loop] = asyncio.Lock()
+        return lock
+
+    def fetch(self):
+        """Fetch the document, keeping the last good copy if that fails.
+
+        Raises:
+            requests.RequestException: If there is no copy of the document
+                and Google could not be reached.
+        """
+        try:
+            response = requests.get(self.url, timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+            self.store(response.json(), response.headers)
+        except (requests.RequestException, ValueError):
+            if self.document is None:
+                raise
+            self.failed()
+
+    async def afetch(self, client: httpx.AsyncClient):
+        """Fetch the document without blocking, keeping the last good copy if
+        that fails.
+
+        Nothing is fetched while a thread is already fetching a document
+        that has a copy, which keeps being served until the thread is done.
+
+        Args:
+            client (httpx.AsyncClient): The client to fetch it with.
+
+        Raises:
+            httpx.HTTPError: If there is no copy of the document and Google
+                could not be reached.
+        """
+        if self.document is not None and self.lock.locked():
+            return
+        try:
+            response = await client.get(self.url)
+            response.raise_for_status()
+            self.store(response.json(), response.headers)
+        except (httpx.HTTPError, ValueError):
+            if self.document is None:
+                raise
+            self.failed()
+
+    def refresh_if_due(self):
+        """Refresh the document in the background if it is about to expire."""
+        if time.monotonic() >= self.refresh_at:
+            self.refresh_in_background()
+
+    def refresh_in_background(self) -> threading.Thread | None:
+        """Fetch the document in a background thread.
+
+        Returns:
+            threading.Thread | None: The thread, or None if a fetch is
+                already running.
+        """
+        if not self.lock.acquire(blocking=False):
+            return None
+
+        def refresh():
+            try:
+                self.fetch()
+            except Exception:
+                logger.exception("Failed to fetch the %s", self.name)
+            finally:
+                self.lock.release()
+
+        thread = threading.Thread(target=refresh, name=self.name, daemon=True)
+        try:
+            thread.start()
+        except Exception:
+            self.lock.release()
+            raise
+        return thread
+
+    def store(self, document: dict, headers):
+        """Keep a freshly fetched document for as long as its headers allow."""
+        max_age = get_max_age(headers)
+        lifetime = DEFAULT_MAX_AGE if max_age is None else max(max_age, MIN_MAX_AGE)
+        now = time.monotonic()
+        self.refresh_at = now + lifetime * REFRESH_AHEAD
+        self.expires_at = now + lifetime
+        self.retry_at = 0
+        self.document = document
+
+    def failed(self):
+        """Keep serving the last good copy and try again later."""
+        logger.warning(
+            "Could not fetch the %s, serving the last good copy",
+            self.name,
+            exc_info=True,
+        )
+        self.retry_at = self.refresh_at = time.monotonic() + RETRY_AFTER
+
+
+class SigningKeys(RemoteDocument):
+    """Process-wide copy of Google's ID token signing certificates.
+
+    Certificates are looked up by the key ID in a token's header, so that
+    verifying a token is a local operation while the set is fresh. A key
+    ID that is not in the set means Google may have rotated its keys, so
+    the set is fetched again, at most once every `ROTATION_CHECK_INTERVAL`
+    seconds. Lookups answered from the cached set count as hits, and ones
+    that had to go to Google as misses.
+    """
+
+    def __init__(self, url: str, name: str):
+        super().__init__(url, name)
+        self.counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """Drop the cached set."""
+        super().clear()
+        self.rotation_checked_at = None
+
+    def get_cert(self, key_id: str) -> str:
+        """Get the certificate of a signing key, fetching the set if needed.
+
+        Args:
+            key_id (str): The ID of the key.
+
+        Returns:
+            str: The PEM encoded certificate.
+
+        Raises:
+            ValueError: If Google has no such key.
+            requests.RequestException: If there is no copy of the set and
+                Google could not be reached.
+        """
+        cert = self.fresh_cert(key_id)
+        if cert is not None:
+            self.count(hit=True)
+            self.refresh_if_due()
+            return cert
+
+        self.count(hit=False)
+        if key_id not in self.get():
+            with self.lock:
+                if self.rotation_check_due():
+                    self.fetch()
+        return self.lookup(key_id)
+
+    async def aget_cert(self, client: httpx.AsyncClient, key_id: str) -> str:
+        """Get the certificate of a signing key without blocking.
+
+        Args:
+            client (httpx.AsyncClient): The client to fetch the set with.
+            key_id (str): The ID of the key.
+
+        Returns:
+            str: The PEM encoded certificate.
+
+        Raises:
+            ValueError: If Google has no such key.
+            httpx.HTTPError: If there is no copy of the set and Google could
+                not be reached.
+        """
+        cert = self.fresh_cert(key_id)
+        if cert is not None:
+            self.count(hit=True)
+            self.refresh_if_due()
+            return cert
+
+        self.count(hit=False)
+        if key_id not in await self.aget(client):
+            async with self.async_lock():
+                if self.rotation_check_due():
+                    await self.afetch(client)
+        return self.lookup(key_id)
+
+    def fresh_cert(self, key_id: str) -> str | None:
+        """Get the certificate of a key if the set has it and has not expired."""
+        document = self.document
+        if document is None or self.expired:
+            return None
+        return document.get(key_id)
+
+    def rotation_check_due(self) -> bool:
+        """Claim a fetch for unknown keys, unless one was made too recently."""
+        now = time.monotonic()
+        with self.counter_lock:
+            if (
+                self.rotation_checked_at is not None
+                and now < self.rotation_checked_at + ROTATION_CHECK_INTERVAL
+            ):
+                return False
+            self.rotation_checked_at = now
+            return True
+
+    def lookup(self, key_id: str) -> str:
+        try:
+            return self.document[key_id]
+        except KeyError:
+            raise ValueError(f"Unknown signing key {key_id}.") from None
+
+    def count(self, hit: bool):
+        with self.counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @property
+    def stats(self) -> dict:
+        """The number of cache hits and misses so far."""
+        with self.counter_lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+discovery_document = RemoteDocument(DISCOVERY_DOCUMENT_URL, "discovery document")
+signing_keys = SigningKeys(CERTS_URL, "signing keys")
@@ -1,22 +1,22 @@
 from urllib.parse import urlencode
 
-import cachecontrol
+import httpx
 import requests
-import google.auth.transport.requests
 from django.conf import settings
-from google.oauth2 import id_token
+from google.auth import jwt
 
+from .cache import HTTP_TIMEOUT, discovery_document, signing_keys
 from .types import DiscoveryDocumentKeys, TokenResponse, IDTokenPayload
 
 
-DISCOVERY_DOCUMENT_URL = "https://accounts.google.com/.well-known/openid-configuration"
 REDIRECT_URI = f"{settings.HOST}/v1/google-identity/signin-callback/"
+ASYNC_REDIRECT_URI = f"{settings.HOST}/v1/google-identity/async/signin-callback/"
+ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
 
 
 class DiscoveryDocument:
     def __init__(self):
-        response = requests.get(DISCOVERY_DOCUMENT_URL)
-        self.discovery_document = response.json()
+        self.discovery_document = discovery_document.get()
 
     def get(self, key: DiscoveryDocumentKeys):
         """Get the value of a key from the discovery document.
@@ -86,8 +86,128 @@ def validate_id_token(token: str) -> IDTokenPayload:
 
     Returns:
         IDTokenPayload: The decoded token payload if valid, None otherwise.
+
+    Raises:
+        ValueError: If the token is invalid.
+    """
+    cert = signing_keys.get_cert(get_key_id(token))
+    return decode_id_token(token, cert)
+
+
+def get_key_id(token: str) -> str:
+    """Get the ID of the key a token was signed with, without verifying it.
+
+    Args:
+        token (str): The Google ID token.
+
+    Returns:
+        str: The key ID from the token header.
+
+    Raises:
+        ValueError: If the token is malformed or has no key ID.
+    """
+    key_id = jwt.decode_header(token).get("kid")
+    if not key_id:
+        raise ValueError("The ID token has no key ID.")
+    return key_id
+
+
+def decode_id_token(token: str, cert: str) -> IDTokenPayload:
+    """Verify and decode a Google ID token locally.
+
+    Args:
+        token (str): The Google ID token.
+        cert (str): The certificate of the key the token was signed with.
+
+    Returns:
+        IDTokenPayload: The decoded token payload.
+
+    Raises:
+        ValueError: If the token is invalid.
+    """
+    payload = jwt.decode(token, certs=cert, audience=settings.GOOGLE_CLIENT_ID)
+    if payload.get("iss") not in ISSUERS:
+        raise ValueError(f"Wrong issuer. 'iss' should be one of {ISSUERS}.")
+    return payload
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Get a non-blocking HTTP client for the calls to Google."""
+    return httpx.AsyncClient(timeout=HTTP_TIMEOUT)
+
+
+async def aget_discovery_document(client: httpx.AsyncClient) -> dict:
+    """Get the discovery document without blocking.
+
+    Args:
+        client (httpx.AsyncClient): The client to fetch it with if it is
+            not cached.
+
+    Returns:
+        dict: The discovery document.
+    """
+    return await discovery_document.aget(client)
+
+
+async def aget_signin_url(client: httpx.AsyncClient, state: str, nonce: str) -> str:
+    """Get the signin URL of the async server flow.
+
+    Args:
+        client (httpx.AsyncClient): The client to call Google with.
+        state (str): The state to use for the signin URL.
+        nonce (str): The nonce to use for the signin URL.
+
+    Returns:
+        The signin URL.
+    """
+    url_params = {
+        "response_type": "code",
+        "client_id": settings.GOOGLE_CLIENT_ID,
+        "scope": "openid email profile",
+        "redirect_uri": ASYNC_REDIRECT_URI,
+        "state": state,
+        "nonce": nonce,
+    }
+    discovery_document = await aget_discovery_document(client)
+    authorization_endpoint = discovery_document["authorization_endpoint"]
+    return f"{authorization_endpoint}?{urlencode(url_params)}"
+
+
+async def aget_tokens(client: httpx.AsyncClient, code: str) -> TokenResponse:
+    """Exchange the code of the async server flow for tokens.
+
+    Args:
+        client (httpx.AsyncClient): The client to call Google with.
+        code (str): The code to use for the tokens.
+
+    Returns:
+        The tokens.
+    """
+    data = {
+        "code": code,
+        "client_id": settings.GOOGLE_CLIENT_ID,
+        "client_secret": settings.GOOGLE_CLIENT_SECRET,
+        "redirect_uri": ASYNC_REDIRECT_URI,
+        "grant_type": "authorization_code",
+    }
+    discovery_document = await aget_discovery_document(client)
+    response = await client.post(discovery_document["token_endpoint"], data=data)
+    return response.json()
+
+
+async def avalidate_id_token(client: httpx.AsyncClient, token: str) -> IDTokenPayload:
+    """Validate a Google ID token, fetching the certificates without blocking
+    if they are not cached.
+
+    Args:
+        client (httpx.AsyncClient): The client to call Google with.
+        token (str): The Google ID token to validate.
+
+    Returns:
+        IDTokenPayload: The decoded token payload.
+
+    Raises:
+        ValueError: If the token is invalid.
     """
-    session = requests.session()
-    cached_session = cachecontrol.CacheControl(session)
-    request = google.auth.transport.requests.Request(session=cached_session)
-    return id_token.verify_oauth2_token(token, request, settings.GOOGLE_CLIENT_ID)
+    cert = await signing_keys.aget_cert(client, get_key_id(token))
+    return decode_id_token(token, cert)
@@ -1,12 +1,31 @@
+import asyncio
 import hashlib
 import os
+import time
 
+import httpx
+import requests
+import rsa
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
 from django.urls import reverse
+from google.auth import crypt, jwt
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
+from .cache import (
+    CERTS_URL,
+    DISCOVERY_DOCUMENT_URL,
+    RemoteDocument,
+    SigningKeys,
+    discovery_document,
+    get_max_age,
+    signing_keys,
+)
 from .models import AuthState
+from .services import validate_id_token
+from shop.models import Customer
 
 
 class GoogleIdentityAuthenticationServerFlowTestCase(APITestCase):
@@ -76,3 +95,400 @@ class GoogleIdentityAuthenticationServerFlowTestCase(APITestCase):
         # Confirm that we have refresh and access tokens in the response
         self.assertIn("access", response.data)
         self.assertIn("refresh", response.data)
+
+
+@override_settings(GOOGLE_CLIENT_ID="client-id", GOOGLE_CLIENT_SECRET="secret")
+class AsyncGoogleIdentityAuthenticationServerFlowTestCase(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        public_key, private_key = rsa.newkeys(1024)
+        cls.signer = crypt.RSASigner.from_string(
+            private_key.save_pkcs1(), key_id="key-1"
+        )
+        cls.certs = {"key-1": public_key.save_pkcs1().decode()}
+
+    def setUp(self):
+        self.auth_state = AuthState.objects.create(
+            state=hashlib.sha256(os.urandom(1024)).hexdigest(),
+            nonce=hashlib.sha256(os.urandom(1024)).hexdigest(),
+        )
+        self.payload = {
+            "iss": "https://accounts.google.com",
+            "aud": "client-id",
+            "sub": "1234567890",
+            "email": "test@example.com",
+            "email_verified": True,
+            "given_name": "Test",
+            "family_name": "User",
+            "nonce": self.auth_state.nonce,
+            "iat": int(time.time()),
+            "exp": int(time.time()) + 3600,
+        }
+        self.requests = []
+        discovery_document.clear()
+        signing_keys.clear()
+        self.addCleanup(discovery_document.clear)
+        self.addCleanup(signing_keys.clear)
+
+    def mock_google(self, request):
+        # Stand in for the discovery document, token and certificate endpoints
+        self.requests.append(request)
+        url = str(request.url)
+        if url == DISCOVERY_DOCUMENT_URL:
+            return httpx.Response(
+                200,
+                json={
+                    "authorization_endpoint": "https://accounts.example.com/auth",
+                    "token_endpoint": "https://oauth2.example.com/token",
+                },
+            )
+        if url == "https://oauth2.example.com/token":
+            token = jwt.encode(self.signer, self.payload).decode()
+            return httpx.Response(200, json={"id_token": token})
+        if url == CERTS_URL:
+            return httpx.Response(200, json=self.certs)
+        return httpx.Response(404)
+
+    def get_client(self):
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.mock_google))
+
+    def callback_url(self, state):
+        return f"{reverse('async_signin_callback')}?state={state}&code=code"
+
+    async def test_server_flow_sign_in(self):
+        with patch("google_identity.views.get_async_client", self.get_client):
+            response = await self.async_client.get(reverse("async_signin_page"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, "https://accounts.example.com/auth?")
+        self.assertContains(response, "async%2Fsignin-callback")
+        self.assertEqual(await AuthState.objects.acount(), 2)
+
+    async def test_server_flow_callback_with_invalid_state(self):
+        response = await self.async_client.get(self.callback_url("invalid_state"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_server_flow_callback_with_valid_id_token(self):
+        with patch("google_identity.views.get_async_client", self.get_client):
+            response = await self.async_client.get(
+                self.callback_url(self.auth_state.state)
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("access", response.json())
+        self.assertIn("refresh", response.json())
+        self.assertEqual(len(self.requests), 3)
+
+        user = await get_user_model().objects.aget(sub="1234567890")
+        self.assertEqual(user.email, "test@example.com")
+        self.assertTrue(await Customer.objects.filter(user=user).aexists())
+        self.assertFalse(
+            await AuthState.objects.filter(state=self.auth_state.state).aexists()
+        )
+
+    async def test_server_flow_callback_reuses_signing_keys(self):
+        with patch("google_identity.views.get_async_client", self.get_client):
+            await self.async_client.get(self.callback_url(self.auth_state.state))
+
+            auth_state = await AuthState.objects.acreate(state="state", nonce="nonce")
+            self.payload["nonce"] = auth_state.nonce
+            self.requests.clear()
+            misses = signing_keys.stats["misses"]
+            response = await self.async_client.get(self.callback_url("state"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Only the code is exchanged, the token is verified locally
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(signing_keys.stats["misses"], misses)
+
+    @patch("google_identity.cache.requests.get")
+    def test_validate_id_token_locally(self, mock_get):
+        mock_get.return_value = Mock(
+            headers={"Cache-Control": "public, max-age=3600"},
+            json=Mock(return_value=self.certs),
+        )
+        token = jwt.encode(self.signer, self.payload).decode()
+        self.assertEqual(validate_id_token(token)["sub"], "1234567890")
+        self.assertEqual(validate_id_token(token)["sub"], "1234567890")
+        mock_get.assert_called_once()
+
+        self.payload["iss"] = "https://accounts.example.com"
+        with self.assertRaises(ValueError):
+            validate_id_token(jwt.encode(self.signer, self.payload).decode())
+        with self.assertRaises(ValueError):
+            validate_id_token("not-a-token")
+
+    async def test_server_flow_callback_with_existing_user(self):
+        user = await get_user_model().objects.acreate(
+            email="test@example.com", sub="1234567890"
+        )
+        with patch("google_identity.views.get_async_client", self.get_client):
+            response = await self.async_client.get(
+                self.callback_url(self.auth_state.state)
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(await get_user_model().objects.acount(), 1)
+        self.assertFalse(await Customer.objects.filter(user=user).aexists())
+
+    async def test_server_flow_callback_with_a_wrong_nonce(self):
+        self.payload["nonce"] = "wrong_nonce"
+        with patch("google_identity.views.get_async_client", self.get_client):
+            response = await self.async_client.get(
+                self.callback_url(self.auth_state.state)
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"error": "Invalid nonce."})
+
+    async def test_server_flow_callback_without_nonce(self):
+        del self.payload["nonce"]
+        with patch("google_identity.views.get_async_client", self.get_client):
+            response = await self.async_client.get(
+                self.callback_url(self.auth_state.state)
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_server_flow_callback_with_a_wrong_audience(self):
+        self.payload["aud"] = "another-client-id"
+        with patch("google_identity.views.get_async_client", self.get_client):
+            response = await self.async_client.get(
+                self.callback_url(self.auth_state.state)
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_server_flow_callback_with_a_wrong_issuer(self):
+        self.payload["iss"] = "https://accounts.example.com"
+        with patch("google_identity.views.get_async_client", self.get_client):
+            response = await self.async_client.get(
+                self.callback_url(self.auth_state.state)
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_server_flow_callback_when_google_is_unreachable(self):
+        def unreachable(request):
+            raise httpx.ConnectError("Connection refused", request=request)
+
+        def get_client():
+            return httpx.AsyncClient(transport=httpx.MockTransport(unreachable))
+
+        with patch("google_identity.views.get_async_client", get_client):
+            response = await self.async_client.get(
+                self.callback_url(self.auth_state.state)
+            )
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertTrue(
+            await AuthState.objects.filter(state=self.auth_state.state).aexists()
+        )
+
+
+class RemoteDocumentTestCase(SimpleTestCase):
+    def setUp(self):
+        self.document = RemoteDocument("https://example.com/doc", "test document")
+        self.now = 1000.0
+        patcher = patch("google_identity.cache.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def response(self, version, cache_control="public, max-age=3600"):
+        return Mock(
+            headers={"Cache-Control": cache_control},
+            json=Mock(return_value={"version": version}),
+            raise_for_status=Mock(),
+        )
+
+    def test_max_age(self):
+        self.assertEqual(get_max_age({"Cache-Control": "public, max-age=3600"}), 3600)
+        self.assertEqual(
+            get_max_age({"Cache-Control": "max-age=3600", "Age": "600"}), 3000
+        )
+        self.assertEqual(get_max_age({"Cache-Control": "no-cache"}), 0)
+        self.assertIsNone(get_max_age({}))
+
+    @patch("google_identity.cache.requests.get")
+    def test_honors_max_age(self, mock_get):
+        mock_get.return_value = self.response(1, "public, max-age=100")
+        self.assertEqual(self.document.get(), {"version": 1})
+
+        mock_get.return_value = self.response(2)
+        self.now += 74
+        self.assertEqual(self.document.get(), {"version": 1})
+        self.assertEqual(mock_get.call_count, 1)
+
+        # Past its max-age the document is fetched before it is served
+        self.now += 26
+        self.assertEqual(self.document.get(), {"version": 2})
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch("google_identity.cache.requests.get")
+    def test_refreshes_ahead_of_expiry(self, mock_get):
+        mock_get.return_value = self.response(1)
+        self.document.get()
+
+        mock_get.return_value = self.response(2)
+        self.now += 3600 * 0.75
+        with patch.object(self.document, "refresh_in_background") as mock_refresh:
+            # The current copy is served while the refresh runs
+            self.assertEqual(self.document.get(), {"version": 1})
+        mock_refresh.assert_called_once()
+
+        self.document.refresh_in_background().join()
+        self.assertEqual(self.document.get(), {"version": 2})
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch("google_identity.cache.requests.get")
+    def test_serves_last_good_copy_when_unreachable(self, mock_get):
+        mock_get.return_value = self.response(1)
+        self.document.get()
+
+        mock_get.side_effect = requests.ConnectionError
+        self.now += 3600
+        self.assertEqual(self.document.get(), {"version": 1})
+        self.assertEqual(mock_get.call_count, 2)
+
+        # Google is not tried again straight away
+        self.assertEqual(self.document.get(), {"version": 1})
+        self.assertEqual(mock_get.call_count, 2)
+
+        mock_get.side_effect = None
+        mock_get.return_value = self.response(2)
+        self.now += 30
+        self.assertEqual(self.document.get(), {"version": 2})
+
+    @patch("google_identity.cache.requests.get")
+    def test_raises_without_a_copy_when_unreachable(self, mock_get):
+        mock_get.side_effect = requests.ConnectionError
+        with self.assertRaises(requests.ConnectionError):
+            self.document.get()
+
+    @patch("google_identity.cache.requests.get")
+    def test_one_refresh_at_a_time(self, mock_get):
+        mock_get.return_value = self.response(1)
+        with self.document.lock:
+            self.assertIsNone(self.document.refresh_in_background())
+        self.document.refresh_in_background().join()
+        self.assertEqual(self.document.document, {"version": 1})
+        self.assertEqual(mock_get.call_count, 1)
+
+    async def test_async_serves_cached_copy(self):
+        requests_made = []
+
+        def handler(request):
+            requests_made.append(request)
+            return httpx.Response(
+                200,
+                json={"version": 1},
+                headers={"Cache-Control": "public, max-age=3600"},
+            )
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            self.assertEqual(await self.document.aget(client), {"version": 1})
+            self.assertEqual(await self.document.aget(client), {"version": 1})
+        self.assertEqual(len(requests_made), 1)
+
+    async def test_async_fetches_once_for_concurrent_requests(self):
+        requests_made = []
+
+        async def handler(request):
+            requests_made.append(request)
+            # Let the other requests start while this one is in flight
+            await asyncio.sleep(0)
+            return httpx.Response(200, json={"version": len(requests_made)})
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            documents = await asyncio.gather(
+                *[self.document.aget(client) for _ in range(10)]
+            )
+            self.assertEqual(documents, [{"version": 1}] * 10)
+
+            # And again once the copy has expired
+            self.now += 3600
+            documents = await asyncio.gather(
+                *[self.document.aget(client) for _ in range(10)]
+            )
+            self.assertEqual(documents, [{"version": 2}] * 10)
+        self.assertEqual(len(requests_made), 2)
+
+    async def test_async_leaves_fetch_to_background_refresh(self):
+        requests_made = []
+
+        def handler(request):
+            requests_made.append(request)
+            return httpx.Response(200, json={"version": 2})
+
+        self.document.store({"version": 1}, {})
+        self.now += 3600
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with self.document.lock:
+                self.assertEqual(await self.document.aget(client), {"version": 1})
+            self.assertEqual(requests_made, [])
+            self.assertEqual(await self.document.aget(client), {"version": 2})
+        self.assertEqual(len(requests_made), 1)
+
+
+class SigningKeysTestCase(SimpleTestCase):
+    def setUp(self):
+        self.keys = SigningKeys("https://example.com/certs", "test keys")
+        self.now = 1000.0
+        patcher = patch("google_identity.cache.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def response(self, certs):
+        return Mock(
+            headers={"Cache-Control": "public, max-age=3600"},
+            json=Mock(return_value=certs),
+            raise_for_status=Mock(),
+        )
+
+    @patch("google_identity.cache.requests.get")
+    def test_counts_hits_and_misses(self, mock_get):
+        mock_get.return_value = self.response({"key-1": "cert-1"})
+        self.assertEqual(self.keys.get_cert("key-1"), "cert-1")
+        self.assertEqual(self.keys.get_cert("key-1"), "cert-1")
+        self.assertEqual(self.keys.get_cert("key-1"), "cert-1")
+        self.assertEqual(self.keys.stats, {"hits": 2, "misses": 1})
+        self.assertEqual(mock_get.call_count, 1)
+
+        # An expired set is fetched again
+        self.now += 3600
+        self.assertEqual(self.keys.get_cert("key-1"), "cert-1")
+        self.assertEqual(self.keys.stats, {"hits": 2, "misses": 2})
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch("google_identity.cache.requests.get")
+    def test_fetches_rotated_keys(self, mock_get):
+        mock_get.return_value = self.response({"key-1": "cert-1"})
+        self.keys.get_cert("key-1")
+
+        mock_get.return_value = self.response({"key-1": "cert-1", "key-2": "cert-2"})
+        self.assertEqual(self.keys.get_cert("key-2"), "cert-2")
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(self.keys.get_cert("key-2"), "cert-2")
+        self.assertEqual(self.keys.stats, {"hits": 1, "misses": 2})
+
+    @patch("google_identity.cache.requests.get")
+    def test_limits_fetches_for_unknown_keys(self, mock_get):
+        mock_get.return_value = self.response({"key-1": "cert-1"})
+        self.keys.get_cert("key-1")
+
+        with self.assertRaises(ValueError):
+            self.keys.get_cert("made-up-1")
+        with self.assertRaises(ValueError):
+            self.keys.get_cert("made-up-2")
+        self.assertEqual(mock_get.call_count, 2)
+
+        self.now += 60
+        with self.assertRaises(ValueError):
+            self.keys.get_cert("made-up-3")
+        self.assertEqual(mock_get.call_count, 3)
+
+    async def test_async_fetches_rotated_keys(self):
+        certs = {"key-1": "cert-1"}
+
+        def handler(request):
+            return httpx.Response(200, json=certs)
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            self.assertEqual(await self.keys.aget_cert(client, "key-1"), "cert-1")
+            certs["key-2"] = "cert-2"
+            self.assertEqual(await self.keys.aget_cert(client, "key-1"), "cert-1")
+            self.assertEqual(await self.keys.aget_cert(client, "key-2"), "cert-2")
+        self.assertEqual(self.keys.stats, {"hits": 1, "misses": 2})
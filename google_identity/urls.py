@@ -8,4 +8,14 @@ urlpatterns = [
     path(
         "signin-callback/", views.ServerFlowCallback.as_view(), name="signin_callback"
     ),
+    path(
+        "async/signin-page/",
+        views.AsyncServerFlowSignIn.as_view(),
+        name="async_signin_page",
+    ),
+    path(
+        "async/signin-callback/",
+        views.AsyncServerFlowCallback.as_view(),
+        name="async_signin_callback",
+    ),
 ]
@@ -1,8 +1,12 @@
 import hashlib
 import os
 
+import httpx
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views import View
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from rest_framework import status
@@ -10,7 +14,15 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 
 from .models import AuthState
-from .services import get_signin_url, get_tokens, validate_id_token
+from .services import (
+    aget_signin_url,
+    aget_tokens,
+    avalidate_id_token,
+    get_async_client,
+    get_signin_url,
+    get_tokens,
+    validate_id_token,
+)
 from shop.models import Customer
 
 
@@ -86,3 +98,94 @@ class ServerFlowCallback(APIView):
         refresh = RefreshToken.for_user(user)
         token_data = {"access": str(refresh.access_token), "refresh": str(refresh)}
         return Response(token_data, status=status.HTTP_200_OK)
+
+
+class AsyncServerFlowSignIn(View):
+    """The signin page of the server flow, served without blocking a worker.
+
+    Runs natively under `PROJECT.asgi`, so the server can handle other
+    requests while this one waits on Google.
+    """
+
+    async def get(self, request):
+        # Create a state token and a nonce to prevent request forgery
+        state = hashlib.sha256(os.urandom(1024)).hexdigest()
+        nonce = hashlib.sha256(os.urandom(1024)).hexdigest()
+        await AuthState.objects.acreate(state=state, nonce=nonce)
+
+        try:
+            async with get_async_client() as client:
+                url = await aget_signin_url(client, state, nonce)
+        except httpx.HTTPError:
+            return JsonResponse(
+                {"error": "Could not reach Google."},
+                status=status.HTTP_502_BAD_GATEWAY,
+            )
+        return render(request, "login.html", {"URL": url})
+
+
+class AsyncServerFlowCallback(View):
+    """The callback of the server flow, served without blocking a worker."""
+
+    async def get(self, request):
+        # Validate the state to prevent request forgery
+        state = request.GET.get("state")
+
+        try:
+            auth_state = await AuthState.objects.aget(state=state)
+        except AuthState.DoesNotExist:
+            return JsonResponse(
+                {"error": "Invalid state."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            # Exchange code for access token and ID token
+            async with get_async_client() as client:
+                tokens = await aget_tokens(client, request.GET.get("code"))
+                id_token_payload = await avalidate_id_token(
+                    client, tokens.get("id_token")
+                )
+        except httpx.HTTPError:
+            return JsonResponse(
+                {"error": "Could not reach Google."},
+                status=status.HTTP_502_BAD_GATEWAY,
+            )
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Validate the nonce
+        nonce = id_token_payload.get("nonce")
+        if not nonce:
+            return JsonResponse(
+                {"error": "No nonce in the ID token."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if auth_state.nonce != nonce:
+            return JsonResponse(
+                {"error": "Invalid nonce."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        await auth_state.adelete()
+
+        try:
+            # Check if the user exists in the database
+            User = get_user_model()
+            user = await User.objects.aget(sub=id_token_payload.get("sub"))
+        except User.DoesNotExist:
+            # Create a user if they don't exist
+            user = await sync_to_async(User.objects.create_user)(
+                email=id_token_payload.get("email"),
+                sub=id_token_payload.get("sub"),
+                first_name=id_token_payload.get("given_name"),
+                last_name=id_token_payload.get("family_name"),
+                image=id_token_payload.get("picture"),
+            )
+
+            # Create a customer profile for the user
+            await Customer.objects.acreate(user=user)
+
+        # Generate a token for the user
+        refresh = RefreshToken.for_user(user)
+        token_data = {"access": str(refresh.access_token), "refresh": str(refresh)}
+        return JsonResponse(token_data, status=status.HTTP_200_OK)
@@ -0,0 +1,244 @@
+import logging
+import pickle
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+
+from .models import Category, Customer, Product
+
+
+logger = logging.getLogger(__name__)
+
+# Pub/sub channel every API process listens on for evicted keys
+INVALIDATION_CHANNEL = "shop:object-cache:invalidate"
+
+# The longest wait between attempts to reconnect to the channel, in seconds
+LISTENER_MAX_BACKOFF = 60
+
+# Cached category trees are keyed on a version that changes with any category
+CATEGORY_TREE_VERSION_KEY = "category-tree:version"
+CATEGORY_TREE_TIMEOUT = 60 * 60
+
+
+class ObjectCache:
+    """Read-through cache of model instances by primary key.
+
+    Lookups go through a bounded in-process LRU tier, then the shared
+    Django cache, then the database. A save or delete evicts the instance
+    from both tiers straight away and again once the transaction commits,
+    and the eviction is broadcast so that other processes drop their
+    local copy too. The local TTL bounds staleness if a broadcast is lost.
+    """
+
+    def __init__(
+        self, queryset, maxsize: int = 1024, ttl: int = 30, timeout: int = 300
+    ):
+        self.queryset = queryset
+        self.prefix = f"object-cache:{queryset.model._meta.label_lower}"
+        self.timeout = timeout
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+        registry[self.prefix] = self
+
+    def key(self, pk) -> str:
+        return f"{self.prefix}:{pk}"
+
+    def get(self, pk):
+        """Get an instance by its primary key.
+
+        Args:
+            pk: The primary key of the instance.
+
+        Returns:
+            Model: A fresh copy of the cached instance, safe to modify.
+
+        Raises:
+            Model.DoesNotExist: If there is no such instance.
+        """
+        start_invalidation_listener()
+        key = self.key(pk)
+        with self.lock:
+            data = self.local.get(key)
+        if data is None:
+            data = cache.get(key)
+            if data is None:
+                data = pickle.dumps(self.queryset.get(pk=pk))
+                cache.set(key, data, self.timeout)
+            with self.lock:
+                self.local[key] = data
+        return pickle.loads(data)
+
+    def get_or_404(self, pk):
+        """Get an instance by its primary key, or raise Http404."""
+        try:
+            return self.get(pk)
+        except self.queryset.model.DoesNotExist:
+            raise Http404(
+                f"No {self.queryset.model._meta.object_name} matches the given query."
+            )
+
+    def evict(self, *keys: str):
+        """Drop keys from the local tier of this process."""
+        with self.lock:
+            for key in keys:
+                self.local.pop(key, None)
+
+    def invalidate(self, pk):
+        """Evict an instance from every tier and every process."""
+        self.invalidate_many([pk])
+
+    def invalidate_many(self, pks):
+        """Evict several instances from every tier and every process."""
+        keys = [self.key(pk) for pk in pks]
+        if not keys:
+            return
+        self.evict(*keys)
+        cache.delete_many(keys)
+
+        # Evict again after commit in case a concurrent read cached the old
+        # rows in the meantime, then tell the other processes
+        def evict_committed():
+            self.evict(*keys)
+            cache.delete_many(keys)
+            publish_invalidation(*keys)
+
+        transaction.on_commit(evict_committed)
+
+    def clear(self):
+        """Drop every key from the local tier of this process."""
+        with self.lock:
+            self.local.clear()
+
+
+registry: dict[str, ObjectCache] = {}
+
+product_cache = ObjectCache(Product.objects.defer("search_vector"))
+category_cache = ObjectCache(Category.objects.all())
+customer_cache = ObjectCache(Customer.objects.select_related("user"))
+
+
+def new_category_tree_version() -> str:
+    # Starts with the time of the change, which detail views send as their
+    # Last-Modified
+    return f"{time.time():.6f}:{uuid.uuid4().hex}"
+
+
+def category_tree_version() -> str:
+    """Get the current version of the category trees."""
+    version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    if version is None:
+        cache.add(CATEGORY_TREE_VERSION_KEY, new_category_tree_version(), None)
+        version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    return version
+
+
+def category_trees_changed_at() -> datetime:
+    """Get when any category last changed, as far as the cache knows.
+
+    A lost version counts as a change, which is never too early.
+    """
+    changed_at = float(category_tree_version().split(":")[0])
+    return datetime.fromtimestamp(changed_at, tz=dt_timezone.utc)
+
+
+def category_tree_key(root_id=None, max_depth: int = None) -> str:
+    """Get the cache key of a category tree at the current version."""
+    return f"category-tree:{category_tree_version()}:{root_id}:{max_depth}"
+
+
+def invalidate_category_trees():
+    """Orphan every cached category tree.
+
+    The version changes straight away and again once the transaction
+    commits, in case a concurrent read cached a tree of the old rows.
+    """
+
+    def bump():
+        cache.set(CATEGORY_TREE_VERSION_KEY, new_category_tree_version(), None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def get_redis():
+    import redis
+
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+def publish_invalidation(*keys: str):
+    """Tell every other process to drop keys from its local tier."""
+    if not settings.OBJECT_CACHE_BROADCAST:
+        return
+    try:
+        get_redis().publish(INVALIDATION_CHANNEL, "\n".join(keys))
+    except Exception:
+        # The local TTL still bounds how long other processes serve them
+        logger.exception("Failed to broadcast invalidation of %d keys", len(keys))
+
+
+def handle_invalidation(message: str):
+    """Drop the broadcast keys from the local tiers they belong to."""
+    for key in message.split("\n"):
+        object_cache = registry.get(key.rsplit(":", 1)[0])
+        if object_cache:
+            object_cache.evict(key)
+
+
+def listen_for_invalidations():
+    """Evict broadcast keys until the process exits, reconnecting on errors.
+
+    Reconnections back off from one second up to `LISTENER_MAX_BACKOFF`
+    while Redis stays down. Only the first failure is logged with its
+    traceback.
+    """
+    backoff = None
+    while True:
+        try:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            backoff = None
+            # Anything broadcast while disconnected was missed
+            for object_cache in registry.values():
+                object_cache.clear()
+            for message in pubsub.listen():
+                handle_invalidation(message["data"].decode())
+        except Exception as error:
+            if backoff is None:
+                logger.exception("Lost the object cache invalidation channel")
+                backoff = 1
+            else:
+                backoff = min(backoff * 2, LISTENER_MAX_BACKOFF)
+                logger.warning(
+                    "Still cannot reach the object cache invalidation channel "
+                    "(%s), retrying in %ds",
+                    error,
+                    backoff,
+                )
+            time.sleep(backoff)
+
+
+_listener_lock = threading.Lock()
+_listener = None
+
+
+def start_invalidation_listener():
+    """Start listening for broadcast invalidations, once per process."""
+    global _listener
+    if _listener is not None or not settings.OBJECT_CACHE_BROADCAST:
+        return
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(
+                target=listen_for_invalidations,
+                name="object-cache-invalidations",
+                daemon=True,
+            )
+            _listener.start()
@@ -0,0 +1,209 @@
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch, QuerySet
+from django.http import StreamingHttpResponse
+
+from .models import CategoryClosure, OrderItem
+
+
+# How many rows each round trip of a server-side cursor fetches
+EXPORT_CHUNK_SIZE = 2000
+
+ORDER_CSV_FIELDS = [
+    "order_id",
+    "created_at",
+    "customer_id",
+    "total_price",
+    "item_id",
+    "product_id",
+    "product_name",
+    "quantity",
+    "price",
+]
+
+PRODUCT_CSV_FIELDS = [
+    "id",
+    "external_id",
+    "name",
+    "price",
+    "description",
+    "image",
+    "category",
+    "created_at",
+    "updated_at",
+]
+
+CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# How many lines are encoded per hop to the database thread when streaming
+# to an ASGI server
+ASYNC_BATCH_SIZE = 500
+
+
+class Echo:
+    """A file-like object that hands back what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def order_rows(orders: QuerySet):
+    """Yield orders with their items, a chunk of orders at a time.
+
+    Args:
+        orders (QuerySet): The orders to export.
+
+    Yields:
+        dict: An order and its items.
+    """
+    items = OrderItem.objects.select_related("product").only(
+        "quantity", "price", "order_id", "product__name"
+    )
+    orders = orders.order_by("created_at", "id").prefetch_related(
+        Prefetch("orderitem_set", queryset=items.order_by("created_at", "id"))
+    )
+    for order in orders.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            "id": order.id,
+            "created_at": order.created_at,
+            "customer_id": order.customer_id,
+            "total_price": order.total_price,
+            "items": [
+                {
+                    "id": item.id,
+                    "product_id": item.product_id,
+                    "product_name": item.product.name,
+                    "quantity": item.quantity,
+                    "price": item.price,
+                }
+                for item in order.orderitem_set.all()
+            ],
+        }
+
+
+def flatten_order_rows(rows):
+    """Yield one row per order item, repeating the fields of the order.
+
+    An order without items still gets a row, with empty item columns, so
+    that CSV exports hold the same orders as NDJSON ones.
+    """
+    for order in rows:
+        fields = {
+            "order_id": order["id"],
+            "created_at": order["created_at"],
+            "customer_id": order["customer_id"],
+            "total_price": order["total_price"],
+        }
+        if not order["items"]:
+            yield fields
+        for item in order["items"]:
+            yield {
+                **fields,
+                "item_id": item["id"],
+                "product_id": item["product_id"],
+                "product_name": item["product_name"],
+                "quantity": item["quantity"],
+                "price": item["price"],
+            }
+
+
+def product_rows(products: QuerySet):
+    """Yield products with their category paths.
+
+    The category column holds the path of category names from the root
+    down, as read by the `import_catalog` command.
+
+    Args:
+        products (QuerySet): The products to export.
+
+    Yields:
+        dict: A product.
+    """
+    # Categories are few, so every path is built upfront in one query
+    paths = {}
+    for link in CategoryClosure.objects.select_related("ancestor").order_by(
+        "descendant_id", "-depth"
+    ):
+        paths.setdefault(link.descendant_id, []).append(link.ancestor.name)
+
+    products = products.order_by("created_at", "id").values(
+        *[field for field in PRODUCT_CSV_FIELDS if field != "category"], "category_id"
+    )
+    for product in products.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        product["category"] = "/".join(paths.get(product.pop("category_id"), []))
+        yield product
+
+
+def stream_ndjson(rows):
+    """Encode rows as newline-delimited JSON, one line at a time."""
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def stream_csv(rows, fieldnames: list[str]):
+    """Encode rows as CSV with a header, one line at a time."""
+    writer = csv.DictWriter(Echo(), fieldnames=fieldnames)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+async def aiterate(content):
+    """Stream a sync iterator to an ASGI server without reading it whole.
+
+    Django reads sync iterators of streaming responses into memory under
+    ASGI, so the lines are pulled a batch at a time on the thread the
+    request's database connection lives on, keeping the cursor usable.
+    """
+    content = iter(content)
+    next_batch = sync_to_async(lambda: list(islice(content, ASYNC_BATCH_SIZE)))
+    while batch := await next_batch():
+        yield "".join(batch)
+
+
+def is_asgi(request) -> bool:
+    """Whether a request is served by an ASGI server."""
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
+def filter_created(
+    queryset: QuerySet, created_after=None, created_before=None
+) -> QuerySet:
+    """Keep the rows created in `[created_after, created_before)`."""
+    if created_after:
+        queryset = queryset.filter(created_at__gte=created_after)
+    if created_before:
+        queryset = queryset.filter(created_at__lt=created_before)
+    return queryset
+
+
+def export_response(
+    request, rows, file_format: str, name: str, fieldnames: list[str]
+) -> StreamingHttpResponse:
+    """Stream rows as an NDJSON or CSV attachment.
+
+    Args:
+        request (Request): The request, to tell whether it is served over
+            ASGI.
+        rows (Iterable[dict]): The rows to export.
+        file_format (str): Either `ndjson` or `csv`.
+        name (str): The name of the file, without an extension.
+        fieldnames (list[str]): The CSV columns.
+
+    Returns:
+        StreamingHttpResponse: The export.
+    """
+    if file_format == "csv":
+        content = stream_csv(rows, fieldnames)
+    else:
+        content = stream_ndjson(rows)
+    if is_asgi(request):
+        content = aiterate(content)
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[file_format])
+    response["Content-Disposition"] = f'attachment; filename="{name}.{file_format}"'
+    return response
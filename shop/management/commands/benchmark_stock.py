@@ -0,0 +1,141 @@
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from rest_framework.exceptions import ValidationError
+
+from shop.models import Category, Customer, OrderItem, Product
+from shop.serializers import CreateOrderSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Place orders for a few products from many threads at once until they "
+        "sell out, then report the throughput and check that no stock was "
+        "oversold. Creates its own products and customer and deletes them "
+        "afterwards. Run it against a disposable PostgreSQL database, as "
+        "SQLite serializes writers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=16, help="How many threads place orders"
+        )
+        parser.add_argument(
+            "--products", type=int, default=1, help="How many products are on sale"
+        )
+        parser.add_argument(
+            "--stock", type=int, default=500, help="The stock of each product"
+        )
+        parser.add_argument(
+            "--quantity", type=int, default=1, help="The quantity of each order"
+        )
+
+    def handle(self, *args, **options):
+        run = uuid.uuid4().hex[:8]
+        user = get_user_model().objects.create_user(
+            email=f"benchmark-{run}@example.com"
+        )
+        customer = Customer.objects.create(user=user)
+        category = Category.objects.create(name=f"Benchmark {run}")
+        products = [
+            Product.objects.create(
+                name=f"Benchmark {run} product {i}",
+                description="Stock reservation benchmark",
+                category=category,
+                price=1,
+                stock=options["stock"],
+            )
+            for i in range(options["products"])
+        ]
+
+        try:
+            self.stdout.write(
+                f"{options['workers']} workers ordering {options['products']} "
+                f"products with {options['stock']} units each"
+            )
+            outcomes, elapsed = self.place_orders(customer, products, options)
+            self.report(products, outcomes, elapsed, options)
+        finally:
+            category.delete()
+            user.delete()
+
+    def place_orders(self, customer, products, options) -> tuple[Counter, float]:
+        """Order from every worker until all the products are sold out."""
+        outcomes = Counter()
+        lock = threading.Lock()
+        sold_out = set()
+        product_ids = [product.id for product in products]
+
+        def work():
+            try:
+                while len(sold_out) < len(product_ids):
+                    product_id = random.choice(product_ids)
+                    serializer = CreateOrderSerializer(
+                        data={
+                            "customer": customer.id,
+                            "order_items": [
+                                {
+                                    "product": product_id,
+                                    "quantity": options["quantity"],
+                                }
+                            ],
+                        }
+                    )
+                    try:
+                        serializer.is_valid(raise_exception=True)
+                        serializer.save()
+                        outcome = "placed"
+                    except ValidationError:
+                        outcome = "rejected"
+                        sold_out.add(product_id)
+                    except Exception as error:
+                        outcome = f"failed ({type(error).__name__})"
+                    with lock:
+                        outcomes[outcome] += 1
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=work) for _ in range(options["workers"])]
+        started = time.monotonic()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return outcomes, time.monotonic() - started
+
+    def report(self, products, outcomes, elapsed, options):
+        """Print the throughput and fail if any product was oversold."""
+        attempts = sum(outcomes.values())
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f"{count} orders {outcome}")
+        self.stdout.write(
+            f"{attempts} attempts in {elapsed:.2f}s ({attempts / elapsed:.0f}/s), "
+            f"{outcomes['placed'] / elapsed:.0f} orders placed/s"
+        )
+
+        sold = dict(
+            OrderItem.objects.filter(product__in=products)
+            .values_list("product_id")
+            .annotate(units=Sum("quantity"))
+        )
+        errors = []
+        for product in products:
+            product.refresh_from_db(fields=["stock"])
+            units = sold.get(product.id, 0)
+            if units + product.stock != options["stock"]:
+                errors.append(
+                    f"{product.name}: {units} units sold and {product.stock} left "
+                    f"out of {options['stock']}"
+                )
+            if product.stock >= options["quantity"]:
+                errors.append(f"{product.name}: {product.stock} units left unsold")
+        if errors:
+            raise CommandError("\n".join(errors))
+        self.stdout.write(self.style.SUCCESS("No product was oversold"))
@@ -0,0 +1,266 @@
+import csv
+import json
+import os
+import time
+import uuid
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework.exceptions import ValidationError
+
+from shop.cache import product_cache
+from shop.models import Category, Product
+from shop.serializers import ImportProductSerializer
+from shop.utils import PRODUCT_UPSERT_FIELDS, refresh_category_stats
+
+
+# Each batch is copied into this table, then upserted into the products
+STAGING_TABLE = "shop_product_import"
+STAGING_COLUMNS = [
+    "id",
+    "created_at",
+    "updated_at",
+    "name",
+    "price",
+    "description",
+    "image",
+    "category_id",
+    "external_id",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Import products and their categories from a CSV or NDJSON file. "
+        "Categories are given as paths of names from the root down, separated "
+        "by '/' in CSV files. Products are matched on their external ID."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=Path, help="The catalog file")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="The format of the file, guessed from its extension by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="How many records to load per transaction",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=Path,
+            help="Where to record progress, next to the file by default",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Start from the beginning even if there is a checkpoint",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not path.is_file():
+            raise CommandError(f"{path} does not exist")
+        file_format = options["format"] or (
+            "csv" if path.suffix.lower() == ".csv" else "ndjson"
+        )
+        batch_size = options["batch_size"]
+        self.checkpoint_path = options["checkpoint"] or path.with_name(
+            f"{path.name}.checkpoint"
+        )
+
+        records, category_ids = 0, set()
+        if self.checkpoint_path.exists() and not options["restart"]:
+            checkpoint = json.loads(self.checkpoint_path.read_text())
+            records = checkpoint["records"]
+            category_ids = {uuid.UUID(pk) for pk in checkpoint["categories"]}
+            self.stdout.write(f"Resuming after {records} records")
+
+        # Category slugs are unique, so a path is resolved by slug
+        self.categories = {
+            slug: (pk, parent_id)
+            for pk, slug, parent_id in Category.objects.values_list(
+                "pk", "slug", "parent_id"
+            )
+        }
+        self.use_copy = connection.vendor == "postgresql"
+        if self.use_copy:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} "
+                    f"(LIKE {Product._meta.db_table})"
+                )
+
+        serializer = ImportProductSerializer()
+        imported = skipped = 0
+        started = time.monotonic()
+        with path.open(newline="", encoding="utf-8") as file:
+            rows = islice(self.read(file, file_format), records, None)
+            while batch := list(islice(rows, batch_size)):
+                # The last record of a product in a batch wins
+                products = {}
+                for number, row in batch:
+                    try:
+                        data = serializer.run_validation(row)
+                        data["category"] = self.resolve_category(data["category"])
+                    except ValidationError as error:
+                        self.stderr.write(f"Record {number}: {error.detail}")
+                        skipped += 1
+                        continue
+                    products[data["external_id"]] = data
+
+                if products:
+                    category_ids.update(self.load(list(products.values())))
+                records += len(batch)
+                imported += len(products)
+                self.save_checkpoint(records, category_ids)
+
+                rate = imported / (time.monotonic() - started)
+                self.stdout.write(
+                    f"{records} records read, {imported} products imported "
+                    f"({rate:.0f}/s)"
+                )
+
+        refresh_category_stats(category_ids)
+        self.checkpoint_path.unlink(missing_ok=True)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {imported} products in {elapsed:.1f}s "
+                f"({imported / elapsed:.0f}/s), skipped {skipped} invalid records"
+            )
+        )
+
+    def read(self, file, file_format):
+        """Yield the records of a catalog file with their record numbers."""
+        if file_format == "csv":
+            for number, row in enumerate(csv.DictReader(file), start=1):
+                # Empty cells are missing values
+                row = {field: value for field, value in row.items() if value}
+                if "category" in row:
+                    row["category"] = self.split_path(row["category"])
+                yield number, row
+            return
+
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            if isinstance(row, dict) and isinstance(row.get("category"), str):
+                row["category"] = self.split_path(row["category"])
+            yield number, row
+
+    @staticmethod
+    def split_path(path: str) -> list[str]:
+        return [name.strip() for name in path.split("/") if name.strip()]
+
+    def resolve_category(self, names: list[str]):
+        """Get the ID of the category at a path, creating missing ones."""
+        parent_id = None
+        for name in names:
+            slug = slugify(name)
+            if slug in self.categories:
+                pk, existing_parent_id = self.categories[slug]
+                if existing_parent_id != parent_id:
+                    raise ValidationError(
+                        {"category": [f"{name} already exists under another parent."]}
+                    )
+            else:
+                pk = Category.objects.create(name=name, parent_id=parent_id).pk
+                self.categories[slug] = (pk, parent_id)
+            parent_id = pk
+        return parent_id
+
+    def load(self, products: list[dict]) -> set:
+        """Upsert a batch of products in one transaction.
+
+        Returns:
+            set: The categories the products were and are now in.
+        """
+        existing = dict(
+            Product.objects.filter(
+                external_id__in=[product["external_id"] for product in products]
+            ).values_list("pk", "category_id")
+        )
+        with transaction.atomic():
+            if self.use_copy:
+                self.copy(products)
+            else:
+                Product.objects.bulk_create(
+                    [
+                        Product(
+                            category_id=product["category"],
+                            **{
+                                field: value
+                                for field, value in product.items()
+                                if field != "category"
+                            },
+                        )
+                        for product in products
+                    ],
+                    batch_size=1000,
+                    update_conflicts=True,
+                    unique_fields=["external_id"],
+                    update_fields=PRODUCT_UPSERT_FIELDS,
+                )
+            product_cache.invalidate_many(existing)
+        return {product["category"] for product in products} | set(existing.values())
+
+    def copy(self, products: list[dict]):
+        """Upsert a batch of products through COPY and the staging table."""
+        now = timezone.now()
+        columns = ", ".join(STAGING_COLUMNS)
+        updates = ", ".join(
+            f"{column} = EXCLUDED.{column}"
+            for column in (
+                Product._meta.get_field(field).column for field in PRODUCT_UPSERT_FIELDS
+            )
+        )
+        with connection.cursor() as cursor:
+            with cursor.copy(f"COPY {STAGING_TABLE} ({columns}) FROM STDIN") as copy:
+                for product in products:
+                    copy.write_row(
+                        [
+                            uuid.uuid4(),
+                            now,
+                            now,
+                            product["name"],
+                            product["price"],
+                            product["description"],
+                            product.get("image"),
+                            product["category"],
+                            product["external_id"],
+                        ]
+                    )
+            cursor.execute(
+                f"INSERT INTO {Product._meta.db_table} ({columns}) "
+                f"SELECT {columns} FROM {STAGING_TABLE} "
+                f"ON CONFLICT (external_id) DO UPDATE SET {updates}"
+            )
+            cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+
+    def save_checkpoint(self, records: int, category_ids: set):
+        """Record how far the import got, replacing the checkpoint atomically."""
+        temporary_path = self.checkpoint_path.with_name(
+            f"{self.checkpoint_path.name}.tmp"
+        )
+        temporary_path.write_text(
+            json.dumps(
+                {
+                    "records": records,
+                    "categories": [str(pk) for pk in category_ids],
+                }
+            )
+        )
+        os.replace(temporary_path, self.checkpoint_path)
@@ -0,0 +1,86 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:36
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def build_stats(apps, schema_editor):
+    CategoryClosure = apps.get_model("shop", "CategoryClosure")
+    CategoryStats = apps.get_model("shop", "CategoryStats")
+
+    rows = CategoryClosure.objects.values("ancestor_id").annotate(
+        product_count=Count("descendant__product"),
+        price_sum=Sum("descendant__product__price"),
+        price_min=Min("descendant__product__price"),
+        price_max=Max("descendant__product__price"),
+    )
+    CategoryStats.objects.bulk_create(
+        [
+            CategoryStats(
+                category_id=row["ancestor_id"],
+                product_count=row["product_count"],
+                price_sum=row["price_sum"] or 0,
+                price_min=row["price_min"],
+                price_max=row["price_max"],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0008_category_closure"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryStats",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("product_count", models.PositiveIntegerField(default=0)),
+                (
+                    "price_sum",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "price_min",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                (
+                    "price_max",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                (
+                    "category",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stats",
+                        to="shop.category",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "category stats",
+            },
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:41
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# The search vector is maintained by a trigger, so that bulk inserts and
+# COPY keep it current too
+CREATE_SEARCH_VECTOR_SQL = """
+CREATE FUNCTION shop_product_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER shop_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description, search_vector ON shop_product
+    FOR EACH ROW EXECUTE FUNCTION shop_product_search_vector_update();
+
+CREATE INDEX shop_product_search_vector_idx
+    ON shop_product USING gin (search_vector);
+
+UPDATE shop_product SET name = name;
+"""
+
+DROP_SEARCH_VECTOR_SQL = """
+DROP INDEX IF EXISTS shop_product_search_vector_idx;
+DROP TRIGGER IF EXISTS shop_product_search_vector_trigger ON shop_product;
+DROP FUNCTION IF EXISTS shop_product_search_vector_update();
+"""
+
+
+def create_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_SEARCH_VECTOR_SQL, params=None)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_SEARCH_VECTOR_SQL, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0010_created_at_id_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
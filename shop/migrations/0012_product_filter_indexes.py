@@ -0,0 +1,71 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:44
+
+from django.db import migrations, models
+
+
+# Case-insensitive name prefix filters compile to UPPER(name::text) LIKE
+# 'PREFIX%', which only a pattern-ops expression index can serve
+CREATE_NAME_PREFIX_INDEXES_SQL = """
+CREATE INDEX shop_product_name_prefix_idx
+    ON shop_product (UPPER(name::text) text_pattern_ops);
+CREATE INDEX shop_product_category_name_prefix_idx
+    ON shop_product (category_id, UPPER(name::text) text_pattern_ops);
+"""
+
+DROP_NAME_PREFIX_INDEXES_SQL = """
+DROP INDEX IF EXISTS shop_product_name_prefix_idx;
+DROP INDEX IF EXISTS shop_product_category_name_prefix_idx;
+"""
+
+
+def create_name_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_NAME_PREFIX_INDEXES_SQL, params=None)
+
+
+def drop_name_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_NAME_PREFIX_INDEXES_SQL, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0011_product_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["price", "id"], name="shop_produc_price_5e650a_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["name", "id"], name="shop_produc_name_9fbd0c_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "-created_at", "-id"],
+                name="shop_produc_categor_4e656a_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "price", "id"],
+                name="shop_produc_categor_634bc6_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "name", "id"], name="shop_produc_categor_21ac3f_idx"
+            ),
+        ),
+        migrations.RunPython(create_name_prefix_indexes, drop_name_prefix_indexes),
+    ]
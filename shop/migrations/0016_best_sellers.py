@@ -0,0 +1,62 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:45
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0015_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BestSeller",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("days", models.PositiveSmallIntegerField()),
+                ("rank", models.PositiveIntegerField()),
+                ("units_sold", models.PositiveIntegerField()),
+                ("revenue", models.DecimalField(decimal_places=2, max_digits=16)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="best_sellers",
+                        to="shop.category",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="shop.product",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["rank"],
+                "indexes": [
+                    models.Index(
+                        fields=["days", "category", "rank"],
+                        name="shop_bestse_days_af2aa2_idx",
+                    )
+                ],
+            },
+        ),
+    ]
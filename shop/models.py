@@ -1,7 +1,12 @@
 import uuid
 
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
 from django.utils.text import slugify
 
 
@@ -19,13 +24,314 @@ class Category(BaseModel):
     slug = models.SlugField(unique=True, null=True, blank=True)
     parent = models.ForeignKey("self", on_delete=models.CASCADE, null=True, blank=True)
 
-    # slugify the name
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_parent_id = instance.__dict__.get("parent_id")
+        return instance
+
+    # slugify the name and keep the closure table in sync with the parent
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if self._state.adding:
+                super().save(*args, **kwargs)
+                self._link_to_parent()
+                CategoryStats.objects.create(category=self)
+            else:
+                previous_parent_id = self._get_previous_parent_id()
+                if self.parent_id != previous_parent_id:
+                    self._check_parent()
+                super().save(*args, **kwargs)
+                if self.parent_id != previous_parent_id:
+                    ancestor_ids = set(
+                        self.get_ancestors().values_list("pk", flat=True)
+                    )
+                    self._move_subtree()
+                    ancestor_ids.update(
+                        self.get_ancestors().values_list("pk", flat=True)
+                    )
+                    CategoryStats.objects.refresh(ancestor_ids)
+        self._loaded_parent_id = self.parent_id
+
+    def get_ancestors(self, include_self: bool = False) -> models.QuerySet:
+        """Get the ancestors of this category, ordered from the root down.
+
+        Args:
+            include_self (bool): Whether to include this category.
+
+        Returns:
+            QuerySet: The ancestor categories.
+        """
+        min_depth = 0 if include_self else 1
+        return Category.objects.filter(
+            descendant_links__descendant=self, descendant_links__depth__gte=min_depth
+        ).order_by("-descendant_links__depth")
+
+    def get_descendants(self, include_self: bool = False) -> models.QuerySet:
+        """Get every category in the subtree rooted at this category.
+
+        Args:
+            include_self (bool): Whether to include this category.
+
+        Returns:
+            QuerySet: The descendant categories.
+        """
+        min_depth = 0 if include_self else 1
+        return Category.objects.filter(
+            ancestor_links__ancestor=self, ancestor_links__depth__gte=min_depth
+        )
+
+    def _get_previous_parent_id(self):
+        if hasattr(self, "_loaded_parent_id"):
+            return self._loaded_parent_id
+        return (
+            Category.objects.filter(pk=self.pk)
+            .values_list("parent_id", flat=True)
+            .first()
+        )
+
+    def _check_parent(self):
+        if self.parent_id is None:
+            return
+        if CategoryClosure.objects.filter(
+            ancestor_id=self.pk, descendant_id=self.parent_id
+        ).exists():
+            raise ValueError(
+                "A category cannot be moved under itself or its descendants."
+            )
+
+    def _link_to_parent(self):
+        links = [CategoryClosure(ancestor_id=self.pk, descendant_id=self.pk, depth=0)]
+        if self.parent_id:
+            links += [
+                CategoryClosure(
+                    ancestor_id=ancestor_id, descendant_id=self.pk, depth=depth + 1
+                )
+                for ancestor_id, depth in CategoryClosure.objects.filter(
+                    descendant_id=self.parent_id
+                ).values_list("ancestor_id", "depth")
+            ]
+        CategoryClosure.objects.bulk_create(links)
+
+    def _move_subtree(self):
+        subtree = list(
+            CategoryClosure.objects.filter(ancestor_id=self.pk).values_list(
+                "descendant_id", "depth"
+            )
+        )
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+
+        # Detach the subtree from its old ancestors
+        CategoryClosure.objects.filter(descendant_id__in=subtree_ids).exclude(
+            ancestor_id__in=subtree_ids
+        ).delete()
+
+        if not self.parent_id:
+            return
+
+        # Attach the subtree to the ancestors of the new parent
+        ancestors = CategoryClosure.objects.filter(
+            descendant_id=self.parent_id
+        ).values_list("ancestor_id", "depth")
+        CategoryClosure.objects.bulk_create(
+            [
+                CategoryClosure(
+                    ancestor_id=ancestor_id,
+                    descendant_id=descendant_id,
+                    depth=ancestor_depth + descendant_depth + 1,
+                )
+                for ancestor_id, ancestor_depth in ancestors
+                for descendant_id, descendant_depth in subtree
+            ]
+        )
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"]),
+            models.Index(fields=["updated_at"]),
+        ]
+
+
+class CategoryClosure(models.Model):
+    """A row for every (ancestor, descendant) pair in the category tree.
+
+    Every category is linked to itself at depth 0, so a whole subtree or
+    an ancestor chain can be read with a single indexed query.
+    """
+
+    ancestor = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="descendant_links"
+    )
+    descendant = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="ancestor_links"
+    )
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ancestor", "descendant"], name="unique_category_closure"
+            )
+        ]
+        indexes = [models.Index(fields=["descendant", "depth"])]
+
+
+class CategoryStatsManager(models.Manager):
+    def refresh(self, category_ids):
+        """Recompute the stats of the given categories from their products.
+
+        Args:
+            category_ids (Iterable[UUID]): The categories to recompute.
+        """
+        rows = (
+            CategoryClosure.objects.filter(ancestor_id__in=list(category_ids))
+            .values("ancestor_id")
+            .annotate(
+                product_count=Count("descendant__product"),
+                price_sum=Sum("descendant__product__price"),
+                price_min=Min("descendant__product__price"),
+                price_max=Max("descendant__product__price"),
+            )
+        )
+        self.bulk_create(
+            [
+                CategoryStats(
+                    category_id=row["ancestor_id"],
+                    product_count=row["product_count"],
+                    price_sum=row["price_sum"] or 0,
+                    price_min=row["price_min"],
+                    price_max=row["price_max"],
+                )
+                for row in rows
+            ],
+            update_conflicts=True,
+            unique_fields=["category"],
+            update_fields=["product_count", "price_sum", "price_min", "price_max"],
+        )
+
+    def add_products(self, category_id, prices):
+        """Add products to the stats of a category and all its ancestors.
+
+        Args:
+            category_id (UUID): The category the products belong to.
+            prices (list[Decimal]): The prices of the products.
+        """
+        if not prices:
+            return
+        minimum = Value(min(prices), output_field=models.DecimalField())
+        maximum = Value(max(prices), output_field=models.DecimalField())
+        self._for_ancestors(category_id).update(
+            product_count=F("product_count") + len(prices),
+            price_sum=F("price_sum") + sum(prices),
+            price_min=Coalesce(Least("price_min", minimum), minimum),
+            price_max=Coalesce(Greatest("price_max", maximum), maximum),
+        )
+
+    def remove_products(self, category_id, prices):
+        """Remove products from the stats of a category and all its ancestors.
+
+        Must be called once the removal is visible in the database, since
+        categories whose minimum or maximum price is affected are recounted.
+
+        Args:
+            category_id (UUID): The category the products belonged to.
+            prices (list[Decimal]): The prices of the products.
+        """
+        if not prices:
+            return
+        stats = self._for_ancestors(category_id)
+        stats.update(
+            product_count=F("product_count") - len(prices),
+            price_sum=F("price_sum") - sum(prices),
+        )
+
+        # A removed price may have been the minimum or maximum, in which
+        # case only a recount can tell what the new bound is
+        stale = stats.filter(
+            Q(price_min__gte=min(prices)) | Q(price_max__lte=max(prices))
+        ).values_list("category_id", flat=True)
+        self.refresh(stale)
+
+    def _for_ancestors(self, category_id):
+        return self.filter(
+            category_id__in=CategoryClosure.objects.filter(
+                descendant_id=category_id
+            ).values("ancestor_id")
+        )
+
+
+class CategoryStats(BaseModel):
+    """Product price statistics over the whole subtree of a category."""
+
+    category = models.OneToOneField(
+        Category, on_delete=models.CASCADE, related_name="stats"
+    )
+    product_count = models.PositiveIntegerField(default=0)
+    price_sum = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    price_min = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    price_max = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+
+    objects = CategoryStatsManager()
+
+    @property
+    def average_price(self):
+        if not self.product_count:
+            return None
+        return self.price_sum / self.product_count
+
+    class Meta:
+        verbose_name_plural = "category stats"
+
+
+class ProductManager(models.Manager):
+    def reserve_stock(self, quantities: dict) -> bool:
+        """Take quantities off the stock of products, all or none of them.
+
+        The rows of the products are locked first, in primary key order,
+        so that concurrent orders for overlapping products wait on each
+        other instead of deadlocking. A single conditional UPDATE then
+        decrements every product that still has enough stock, so orders
+        can never oversell. Must be called in a transaction, which must be
+        rolled back when this returns False.
+
+        Args:
+            quantities (dict): The quantity to take of each product ID.
+
+        Returns:
+            bool: Whether every product had enough stock.
+        """
+        if not quantities:
+            return True
+        # An UPDATE locks rows in whatever order the plan visits them
+        list(
+            self.select_for_update()
+            .filter(pk__in=list(quantities))
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        quantity = self._quantity(quantities)
+        reserved = self.filter(pk__in=list(quantities), stock__gte=quantity).update(
+            stock=F("stock") - quantity, updated_at=timezone.now()
+        )
+        return reserved == len(quantities)
+
+    def short_of_stock(self, quantities: dict) -> models.QuerySet:
+        """Get the products that have less stock than the given quantities."""
+        quantity = self._quantity(quantities)
+        return self.filter(pk__in=list(quantities), stock__lt=quantity)
+
+    @staticmethod
+    def _quantity(quantities: dict) -> Case:
+        return Case(
+            *[When(pk=pk, then=Value(amount)) for pk, amount in quantities.items()],
+            output_field=models.PositiveIntegerField(),
+        )
 
 
 class Product(BaseModel):
@@ -35,8 +341,32 @@ class Product(BaseModel):
     image = models.URLField(null=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
 
+    # Units left to sell, or None when the stock is not tracked
+    stock = models.PositiveIntegerField(null=True, blank=True)
+
+    # Identifier of the product in the upstream catalog, used to match
+    # rows in bulk upserts
+    external_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
+
+    # Weighted name and description lexemes, kept current by a database
+    # trigger on PostgreSQL and left empty elsewhere
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductManager()
+
     class Meta:
         ordering = ["-created_at"]
+        # One index per supported filter and sort combination, each ending
+        # in the primary key so keyset pagination can seek on it
+        indexes = [
+            models.Index(fields=["-created_at", "-id"]),
+            models.Index(fields=["updated_at"]),
+            models.Index(fields=["price", "id"]),
+            models.Index(fields=["name", "id"]),
+            models.Index(fields=["category", "-created_at", "-id"]),
+            models.Index(fields=["category", "price", "id"]),
+            models.Index(fields=["category", "name", "id"]),
+        ]
 
 
 class Customer(BaseModel):
@@ -45,6 +375,10 @@ class Customer(BaseModel):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"]),
+            models.Index(fields=["updated_at"]),
+        ]
 
 
 class Order(BaseModel):
@@ -53,6 +387,10 @@ class Order(BaseModel):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"]),
+            models.Index(fields=["updated_at"]),
+        ]
 
 
 class OrderItem(BaseModel):
@@ -63,3 +401,123 @@ class OrderItem(BaseModel):
 
     class Meta:
         ordering = ["-created_at"]
+
+
+class SalesRollup(BaseModel):
+    """Totals of the orders placed on a day.
+
+    Kept current by the `shop.tasks.update_sales_rollups` task, which adds
+    the orders created since its watermark. Orders are only counted once,
+    when they are first rolled up, so later edits to them and deletions
+    of them are not reflected in the totals.
+    """
+
+    date = models.DateField()
+    order_count = models.PositiveIntegerField(default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    @property
+    def average_basket(self):
+        if not self.order_count:
+            return None
+        return self.revenue / self.order_count
+
+    class Meta:
+        abstract = True
+
+
+class DailySales(SalesRollup):
+    class Meta:
+        verbose_name_plural = "daily sales"
+        constraints = [
+            models.UniqueConstraint(fields=["date"], name="unique_daily_sales")
+        ]
+
+
+class DailyCategorySales(SalesRollup):
+    """Totals of the items of a category's whole subtree sold on a day."""
+
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+
+    class Meta:
+        verbose_name_plural = "daily category sales"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "date"], name="unique_daily_category_sales"
+            )
+        ]
+
+
+class DailyProductSales(SalesRollup):
+    """Totals of the items of a product sold on a day."""
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+
+    class Meta:
+        verbose_name_plural = "daily product sales"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "date"], name="unique_daily_product_sales"
+            )
+        ]
+
+
+class BestSeller(BaseModel):
+    """The place of a product among the best sellers of the last days.
+
+    Rankings are overall when there is no category, and over the whole
+    subtree of the category otherwise. They are rebuilt from the daily
+    product sales by the `refresh_best_sellers` task.
+    """
+
+    days = models.PositiveSmallIntegerField()
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="best_sellers",
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveIntegerField()
+    units_sold = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=16, decimal_places=2)
+
+    class Meta:
+        ordering = ["rank"]
+        indexes = [models.Index(fields=["days", "category", "rank"])]
+
+
+class RollupWatermark(BaseModel):
+    """How far a rollup has read its source rows."""
+
+    name = models.CharField(max_length=255, unique=True)
+    value = models.DateTimeField()
+
+
+class IdempotencyKey(BaseModel):
+    """The response to a request, replayed when it is retried with its key."""
+
+    user = models.ForeignKey(
+        get_user_model(), on_delete=models.CASCADE, related_name="+"
+    )
+    scope = models.CharField(max_length=255)
+    key = models.CharField(max_length=255)
+
+    # Hash of the request, so that a key cannot be reused for another one
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "scope", "key"], name="unique_idempotency_key"
+            )
+        ]
@@ -0,0 +1,277 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    BestSeller,
+    DailyCategorySales,
+    DailyProductSales,
+    DailySales,
+    Order,
+    OrderItem,
+    RollupWatermark,
+)
+
+
+SALES_WATERMARK = "sales"
+
+# Orders newer than this may still be in uncommitted transactions, so they
+# are left for the next run
+SETTLE_TIME = timedelta(minutes=1)
+
+# How many days of orders each transaction rolls up
+ROLLUP_WINDOW = timedelta(days=1)
+
+SALES_FIELDS = ["order_count", "item_count", "revenue"]
+
+# The periods best sellers are ranked over, in days, and how many products
+# each ranking keeps
+BEST_SELLER_DAYS = [7, 30, 90]
+BEST_SELLER_LIMIT = 100
+
+ITEM_REVENUE = Sum(
+    F("price") * F("quantity"),
+    output_field=models.DecimalField(max_digits=16, decimal_places=2),
+)
+
+
+def roll_up_sales(until: datetime = None) -> int:
+    """Add the orders created since the watermark to the daily rollups.
+
+    Orders are read a window at a time, each in its own transaction that
+    also moves the watermark, so a run can stop at any point and the next
+    one carries on without counting an order twice. Orders behind the
+    watermark are never read again, so editing or deleting an order that
+    has been rolled up leaves the totals of its day as they were.
+
+    Args:
+        until (datetime): Roll up the orders created before this time,
+            a minute ago by default.
+
+    Returns:
+        int: The number of orders rolled up.
+    """
+    until = until or timezone.now() - SETTLE_TIME
+    rolled_up = 0
+    while True:
+        with transaction.atomic():
+            watermark = _lock_watermark()
+            since = watermark.value
+            if since >= until:
+                return rolled_up
+
+            # Skip straight over periods without orders
+            next_order = (
+                Order.objects.filter(created_at__gte=since, created_at__lt=until)
+                .order_by("created_at")
+                .values_list("created_at", flat=True)
+                .first()
+            )
+            if next_order is None:
+                window_end = until
+            else:
+                window_end = min(next_order + ROLLUP_WINDOW, until)
+                rolled_up += _roll_up_window(since, window_end)
+            watermark.value = window_end
+            watermark.save(update_fields=["value", "updated_at"])
+
+
+def _lock_watermark() -> RollupWatermark:
+    watermark = (
+        RollupWatermark.objects.select_for_update().filter(name=SALES_WATERMARK).first()
+    )
+    if watermark is None:
+        # Start from the first order ever placed
+        first_order = Order.objects.order_by("created_at").first()
+        start = (
+            first_order.created_at
+            if first_order
+            else datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+        )
+        watermark = RollupWatermark.objects.create(name=SALES_WATERMARK, value=start)
+    return watermark
+
+
+def _roll_up_window(since: datetime, until: datetime) -> int:
+    """Add the orders created in `[since, until)` to the daily rollups."""
+    orders = Order.objects.filter(created_at__gte=since, created_at__lt=until)
+    items = OrderItem.objects.filter(
+        order__created_at__gte=since, order__created_at__lt=until
+    ).annotate(date=TruncDate("order__created_at"))
+
+    daily = {
+        row["date"]: row
+        for row in orders.annotate(date=TruncDate("created_at"))
+        .values("date")
+        .annotate(order_count=Count("id"), revenue=Sum("total_price"))
+        .order_by()
+    }
+    if not daily:
+        return 0
+    for row in daily.values():
+        row["item_count"] = 0
+    for row in items.values("date").annotate(item_count=Sum("quantity")).order_by():
+        daily[row["date"]]["item_count"] = row["item_count"]
+    _add_to_rollups(DailySales, [], daily.values())
+
+    _add_to_rollups(
+        DailyProductSales,
+        ["product_id"],
+        items.values("date", "product_id")
+        .annotate(
+            order_count=Count("order_id", distinct=True),
+            item_count=Sum("quantity"),
+            revenue=ITEM_REVENUE,
+        )
+        .order_by(),
+    )
+
+    # Items count towards their category and every one of its ancestors
+    _add_to_rollups(
+        DailyCategorySales,
+        ["category_id"],
+        items.values(
+            "date", category_id=F("product__category__ancestor_links__ancestor")
+        )
+        .annotate(
+            order_count=Count("order_id", distinct=True),
+            item_count=Sum("quantity"),
+            revenue=ITEM_REVENUE,
+        )
+        .order_by(),
+    )
+    return sum(row["order_count"] for row in daily.values())
+
+
+def _add_to_rollups(model, keys: list[str], rows):
+    """Add the totals of rows to the matching rollups, creating missing ones.
+
+    Args:
+        model (type[SalesRollup]): The rollup to add to.
+        keys (list[str]): The fields that identify a rollup besides its date.
+        rows (Iterable[dict]): The totals to add, with the date and keys.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    filters = {"date__in": {row["date"] for row in rows}}
+    for key in keys:
+        filters[f"{key}__in"] = {row[key] for row in rows}
+    existing = {
+        (rollup.date, *(getattr(rollup, key) for key in keys)): rollup
+        for rollup in model.objects.filter(**filters)
+    }
+
+    rollups = []
+    for row in rows:
+        identity = (row["date"], *(row[key] for key in keys))
+        rollup = existing.get(identity) or model(
+            date=row["date"], **{key: row[key] for key in keys}
+        )
+        for field in SALES_FIELDS:
+            setattr(rollup, field, getattr(rollup, field) + (row[field] or 0))
+        rollups.append(rollup)
+
+    model.objects.bulk_create(
+        rollups,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=[key.removesuffix("_id") for key in keys] + ["date"],
+        update_fields=SALES_FIELDS + ["updated_at"],
+    )
+
+
+def get_sales_series(start, end, category_id=None, product_id=None) -> list[dict]:
+    """Get the daily sales totals between two dates, one entry per day.
+
+    Days without sales are included with zero totals.
+
+    Args:
+        start (date): The first day.
+        end (date): The last day.
+        category_id (UUID): Only count the items of this category's subtree.
+        product_id (UUID): Only count the items of this product.
+
+    Returns:
+        list[dict]: The totals and average basket of each day.
+    """
+    if product_id:
+        rollups = DailyProductSales.objects.filter(product_id=product_id)
+    elif category_id:
+        rollups = DailyCategorySales.objects.filter(category_id=category_id)
+    else:
+        rollups = DailySales.objects.all()
+    by_date = {
+        rollup.date: rollup
+        for rollup in rollups.filter(date__gte=start, date__lte=end).only(
+            "date", *SALES_FIELDS
+        )
+    }
+
+    series = []
+    for offset in range((end - start).days + 1):
+        date = start + timedelta(days=offset)
+        rollup = by_date.get(date)
+        series.append(
+            {
+                "date": date,
+                "order_count": rollup.order_count if rollup else 0,
+                "item_count": rollup.item_count if rollup else 0,
+                "revenue": rollup.revenue if rollup else 0,
+                "average_basket": rollup.average_basket if rollup else None,
+            }
+        )
+    return series
+
+
+def rank_best_sellers(today=None) -> int:
+    """Rebuild the best seller rankings from the daily product sales.
+
+    Products are ranked on units sold, then revenue, overall and within
+    every category subtree, for each of `BEST_SELLER_DAYS`. Reading the
+    rollups keeps this proportional to the products sold in the period
+    rather than to the number of orders.
+
+    Args:
+        today (date): The last day of the periods, today by default.
+
+    Returns:
+        int: The number of ranked products.
+    """
+    today = today or timezone.localdate()
+    rankings = []
+    for days in BEST_SELLER_DAYS:
+        sales = DailyProductSales.objects.filter(
+            date__gt=today - timedelta(days=days), date__lte=today
+        )
+        totals = {"units_sold": Sum("item_count"), "revenue": Sum("revenue")}
+        rankings += _rank(days, None, sales.values("product_id").annotate(**totals))
+
+        # Products count towards their category and every one of its ancestors
+        by_category = defaultdict(list)
+        for row in sales.values(
+            "product_id", category_id=F("product__category__ancestor_links__ancestor")
+        ).annotate(**totals):
+            by_category[row.pop("category_id")].append(row)
+        for category_id, rows in by_category.items():
+            rankings += _rank(days, category_id, rows)
+
+    with transaction.atomic():
+        BestSeller.objects.all().delete()
+        BestSeller.objects.bulk_create(rankings, batch_size=1000)
+    return len(rankings)
+
+
+def _rank(days: int, category_id, rows) -> list[BestSeller]:
+    rows = sorted(
+        rows,
+        key=lambda row: (-row["units_sold"], -row["revenue"], str(row["product_id"])),
+    )
+    return [
+        BestSeller(days=days, category_id=category_id, rank=rank, **row)
+        for rank, row in enumerate(rows[:BEST_SELLER_LIMIT], start=1)
+    ]
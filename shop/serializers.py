@@ -1,15 +1,76 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
 from rest_framework import serializers
 
-from shop.models import Category, Product, Order, Customer, OrderItem
+from shop.models import (
+    BestSeller,
+    Category,
+    CategoryStats,
+    Product,
+    Order,
+    Customer,
+    OrderItem,
+)
+from shop.cache import product_cache
+from shop.sales import BEST_SELLER_DAYS
 from user.serializers import UserSerializer
-from utils.helpers import get_category_tree
+from utils.helpers import get_category_tree, get_category_trees
+from utils.serializers import SparseFieldsetMixin
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = "__all__"
 
+    def validate_parent(self, parent):
+        if (
+            parent
+            and self.instance
+            and self.instance.get_descendants(include_self=True)
+            .filter(pk=parent.pk)
+            .exists()
+        ):
+            raise serializers.ValidationError(
+                "A category cannot be moved under itself or its descendants."
+            )
+        return parent
+
+
+class CategoryTreeQuerySerializer(serializers.Serializer):
+    root = serializers.UUIDField(required=False)
+    depth = serializers.IntegerField(min_value=0, required=False)
+
+
+class CategoryTreeSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    name = serializers.CharField()
+    slug = serializers.SlugField()
+    children = serializers.ListField(child=serializers.DictField())
+
+
+class CategoryStatsSerializer(serializers.ModelSerializer):
+    average_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, read_only=True
+    )
+
+    class Meta:
+        model = CategoryStats
+        fields = [
+            "category",
+            "product_count",
+            "price_sum",
+            "price_min",
+            "price_max",
+            "average_price",
+            "updated_at",
+        ]
+
 
 class CreateCategorySerializer(CategorySerializer):
     class Meta(CategorySerializer.Meta):
@@ -20,24 +81,203 @@ class CreateCategorySerializer(CategorySerializer):
 class CreateProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ["search_vector"]
+
+
+class BulkProductSerializer(serializers.ModelSerializer):
+    """A row of a bulk upsert, matched on its external ID.
+
+    The category is taken as a plain ID so that a whole batch can resolve
+    its categories with a single query.
+    """
+
+    external_id = serializers.CharField(max_length=255)
+    category = serializers.UUIDField()
+
+    class Meta:
+        model = Product
+        fields = ["external_id", "name", "price", "description", "image", "category"]
+
 
+class ImportProductSerializer(BulkProductSerializer):
+    """A product read from a catalog file.
 
-class ProductSerializer(serializers.ModelSerializer):
+    The category is a path of category names from the root down.
+    """
+
+    category = serializers.ListField(
+        child=serializers.CharField(max_length=255), min_length=1
+    )
+
+
+def serialize_category_trees(category_ids) -> dict:
+    """Serialize the category tree of many categories with one query.
+
+    Args:
+        category_ids (Iterable[UUID]): The categories to serialize.
+
+    Returns:
+        dict: The serialized category tree of each category id.
+    """
+    return {
+        category_id: CategorySerializer(tree, many=True).data
+        for category_id, tree in get_category_trees(category_ids).items()
+    }
+
+
+class ProductListSerializer(serializers.ListSerializer):
+    """Serialize a page of products, resolving all category trees at once.
+
+    Products that share a category share the same serialized
+    `categories` list.
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        products = list(data)
+        if "categories" not in self.child.fields:
+            return super().to_representation(products)
+
+        self.child.categories_by_id = serialize_category_trees(
+            {product.category_id for product in products}
+        )
+        try:
+            return super().to_representation(products)
+        finally:
+            del self.child.categories_by_id
+
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     categories = CategorySerializer(many=True, read_only=True)
 
     class Meta:
         model = Product
-        exclude = ["category"]
+        exclude = ["category", "search_vector"]
+        list_serializer_class = ProductListSerializer
+        computed_fields = {"categories": ["category"]}
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation["categories"] = CategorySerializer(
-            get_category_tree(instance.category), many=True
-        ).data
+        if not self.wants("categories"):
+            return representation
+        categories_by_id = getattr(self, "categories_by_id", None)
+        if categories_by_id is not None:
+            representation["categories"] = categories_by_id[instance.category_id]
+        else:
+            representation["categories"] = CategorySerializer(
+                get_category_tree(instance.category), many=True
+            ).data
         return representation
 
 
+class ProductFilterSerializer(serializers.Serializer):
+    category = serializers.PrimaryKeyRelatedField(
+        queryset=Category.objects.all(), required=False
+    )
+    include_descendants = serializers.BooleanField(default=False)
+    min_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal(0), required=False
+    )
+    max_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal(0), required=False
+    )
+    name = serializers.CharField(max_length=255, required=False)
+    sort = serializers.ChoiceField(
+        choices=["created_at", "-created_at", "price", "-price", "name", "-name"],
+        default="-created_at",
+    )
+
+    def validate(self, data):
+        if (
+            data.get("min_price") is not None
+            and data.get("max_price") is not None
+            and data["min_price"] > data["max_price"]
+        ):
+            raise serializers.ValidationError(
+                {"max_price": "Must be greater than or equal to min_price."}
+            )
+        return data
+
+
+class ProductSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=255)
+    category = serializers.PrimaryKeyRelatedField(
+        queryset=Category.objects.all(), required=False
+    )
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    file_format = serializers.ChoiceField(choices=["ndjson", "csv"], default="ndjson")
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if (
+            data.get("created_after")
+            and data.get("created_before")
+            and data["created_after"] > data["created_before"]
+        ):
+            raise serializers.ValidationError(
+                {"created_before": "Must be later than created_after."}
+            )
+        return data
+
+
+class SalesQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    category = serializers.UUIDField(required=False)
+    product = serializers.UUIDField(required=False)
+
+    # Days per series, to bound the response
+    MAX_DAYS = 366
+
+    def validate(self, data):
+        if data.get("category") and data.get("product"):
+            raise serializers.ValidationError(
+                {"product": "Cannot be combined with category."}
+            )
+        data.setdefault("end", timezone.localdate())
+        data.setdefault("start", data["end"] - timedelta(days=29))
+        if data["start"] > data["end"]:
+            raise serializers.ValidationError({"end": "Must be on or after start."})
+        if (data["end"] - data["start"]).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(
+                {"start": f"Cannot be more than {self.MAX_DAYS} days before end."}
+            )
+        return data
+
+
+class SalesSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    order_count = serializers.IntegerField()
+    item_count = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=16, decimal_places=2)
+    average_basket = serializers.DecimalField(
+        max_digits=16, decimal_places=2, allow_null=True
+    )
+
+
+class LeanProductSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ["id", "name", "price", "image"]
+
+
+class BestSellerQuerySerializer(serializers.Serializer):
+    days = serializers.ChoiceField(choices=BEST_SELLER_DAYS, default=30)
+    category = serializers.UUIDField(required=False)
+
+
+class BestSellerSerializer(serializers.ModelSerializer):
+    product = LeanProductSerializer(read_only=True)
+
+    class Meta:
+        model = BestSeller
+        fields = ["rank", "units_sold", "revenue", "product"]
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
 
@@ -46,22 +286,99 @@ class OrderItemSerializer(serializers.ModelSerializer):
         exclude = ["order"]
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    order_items = OrderItemSerializer(many=True, read_only=True)
+class OrderListSerializer(serializers.ListSerializer):
+    """Serialize a page of orders, resolving the category trees of all
+    their products at once.
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        orders = list(data)
+        with_categories = self.child.resolve_categories(orders)
+        try:
+            return super().to_representation(orders)
+        finally:
+            if with_categories:
+                del self.child.product_serializer.categories_by_id
+
+
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    order_items = OrderItemSerializer(many=True, read_only=True, source="orderitem_set")
 
     class Meta:
         model = Order
         fields = "__all__"
+        list_serializer_class = OrderListSerializer
+
+    @classmethod
+    def prefetch(cls, queryset, request=None):
+        """Load the items of orders with their products in one more query.
+
+        The category trees of the products are resolved with one query
+        more when serializing.
+
+        Args:
+            queryset (QuerySet): The orders to serialize.
+            request (Request): The request, to skip the items when it did
+                not ask for them.
+
+        Returns:
+            QuerySet: The orders, with their items prefetched.
+        """
+        if not cls(context={"request": request}).wants("order_items"):
+            return queryset
+        items = OrderItem.objects.select_related("product").defer(
+            "product__search_vector"
+        )
+        return queryset.prefetch_related(Prefetch("orderitem_set", queryset=items))
+
+    @property
+    def product_serializer(self):
+        """The serializer of the products of order items, if any."""
+        if "order_items" not in self.fields:
+            return None
+        product_serializer = self.fields["order_items"].child.fields["product"]
+        return product_serializer if product_serializer.wants("categories") else None
+
+    def resolve_categories(self, orders) -> bool:
+        """Serialize the category trees of the products of orders upfront.
+
+        Returns:
+            bool: Whether the trees were resolved and must be dropped once
+                the orders are serialized.
+        """
+        product_serializer = self.product_serializer
+        if product_serializer is None or hasattr(
+            product_serializer, "categories_by_id"
+        ):
+            return False
+        product_serializer.categories_by_id = serialize_category_trees(
+            {
+                item.product.category_id
+                for order in orders
+                for item in order.orderitem_set.all()
+            }
+        )
+        return True
 
     def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation["order_items"] = OrderItemSerializer(
-            instance.orderitem_set.all(), many=True
-        ).data
-        return representation
+        with_categories = self.resolve_categories([instance])
+        try:
+            return super().to_representation(instance)
+        finally:
+            if with_categories:
+                del self.product_serializer.categories_by_id
+
+
+class OutOfStock(Exception):
+    """Raised to roll back an order when a product runs out of stock."""
 
 
 class OrderItemCreateSerializer(serializers.ModelSerializer):
+    # Products are looked up for the whole order at once
+    product = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = OrderItem
@@ -75,41 +392,96 @@ class CreateOrderSerializer(serializers.ModelSerializer):
         model = Order
         exclude = ["total_price"]
 
+    def validate_order_items(self, order_items):
+        product_ids = {item["product"] for item in order_items}
+        products = Product.objects.defer("search_vector").in_bulk(product_ids)
+        if not product_ids <= products.keys():
+            # Report each item on its own, as the nested serializer would
+            message = serializers.PrimaryKeyRelatedField.default_error_messages[
+                "does_not_exist"
+            ]
+            raise serializers.ValidationError(
+                [
+                    (
+                        {}
+                        if item["product"] in products
+                        else {"product": [message.format(pk_value=item["product"])]}
+                    )
+                    for item in order_items
+                ]
+            )
+        return [{**item, "product": products[item["product"]]} for item in order_items]
+
     def create(self, validated_data):
         order_items = validated_data.pop("order_items")
-        order = Order.objects.create(**validated_data)
-
-        # Create order items, and calculate total price. Creating order
-        # items helps us freeze the price of the product at the time
-        # of order
-        total_price = 0
-        for item in order_items:
-            product = item.get("product")
-            quantity = item.get("quantity")
-            order_item = OrderItem.objects.create(
-                product=product,
-                quantity=quantity,
-                price=product.price,
-                order=order,
-            )
-            total_price += order_item.price * order_item.quantity
 
-        order.total_price = total_price
-        order.save()
+        # Freeze the price of each product at the time of order, and
+        # insert the order with its total and then all its items
+        items = [
+            OrderItem(
+                product=item["product"],
+                quantity=item["quantity"],
+                price=item["product"].price,
+            )
+            for item in order_items
+        ]
+        total_price = sum(item.price * item.quantity for item in items)
+
+        # Only products whose stock is tracked are reserved
+        quantities = defaultdict(int)
+        for item in items:
+            if item.product.stock is not None:
+                quantities[item.product_id] += item.quantity
+
+        try:
+            with transaction.atomic():
+                if not Product.objects.reserve_stock(quantities):
+                    raise OutOfStock
+                order = Order.objects.create(total_price=total_price, **validated_data)
+                for item in items:
+                    item.order = order
+                OrderItem.objects.bulk_create(items)
+                product_cache.invalidate_many(quantities)
+        except OutOfStock:
+            names = Product.objects.short_of_stock(quantities).values_list(
+                "name", flat=True
+            )
+            raise serializers.ValidationError(
+                {
+                    "order_items": [f"Not enough stock for {name}." for name in names]
+                    or ["Not enough stock."]
+                }
+            )
         return order
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
     class Meta:
         model = Customer
         fields = "__all__"
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation["user"] = UserSerializer(instance.user).data
-        return representation
+    @classmethod
+    def prefetch(cls, queryset, request=None):
+        """Join the user of each customer when the request asks for it.
+
+        The reverse side of the join is cached too, so the nested user
+        does not look its customer up again. Its groups and permissions
+        are prefetched.
+
+        Args:
+            queryset (QuerySet): The customers to serialize.
+            request (Request): The request, if any.
+
+        Returns:
+            QuerySet: The customers, with their users joined.
+        """
+        if cls(context={"request": request}).wants("user"):
+            queryset = queryset.select_related("user").prefetch_related(
+                *[f"user__{name}" for name in UserSerializer.PREFETCH_FIELDS]
+            )
+        return queryset
 
 
 class CreateCustomerSerializer(serializers.ModelSerializer):
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import (
+    category_cache,
+    customer_cache,
+    invalidate_category_trees,
+    product_cache,
+)
+from .models import Category, CategoryStats, Customer, Product
+
+
+def _price(product: Product):
+    return Product._meta.get_field("price").to_python(product.price)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_stats(sender, instance, raw=False, **kwargs):
+    """Remember the stored category and price of a product being updated."""
+    if raw or instance._state.adding:
+        instance._previous_stats = None
+        return
+    instance._previous_stats = (
+        Product.objects.filter(pk=instance.pk)
+        .values_list("category_id", "price")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_stats_on_product_save(sender, instance, raw=False, **kwargs):
+    """Move a saved product's price into the stats of its category tree."""
+    if raw:
+        return
+    previous = getattr(instance, "_previous_stats", None)
+    current = (instance.category_id, _price(instance))
+    if previous == current:
+        return
+
+    # Add before removing, so that categories recounted by the removal
+    # are not counted twice
+    CategoryStats.objects.add_products(current[0], [current[1]])
+    if previous:
+        CategoryStats.objects.remove_products(previous[0], [previous[1]])
+
+
+@receiver(post_delete, sender=Product)
+def update_stats_on_product_delete(sender, instance, **kwargs):
+    """Remove a deleted product's price from the stats of its category tree."""
+    CategoryStats.objects.remove_products(instance.category_id, [_price(instance)])
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_ancestors(sender, instance, **kwargs):
+    """Remember the ancestors of a category before its closure rows go."""
+    instance._ancestor_ids = list(instance.get_ancestors().values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def update_stats_on_category_delete(sender, instance, **kwargs):
+    """Recount the ancestors of a deleted category."""
+    CategoryStats.objects.refresh(getattr(instance, "_ancestor_ids", []))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_cached_product(sender, instance, **kwargs):
+    product_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_cached_category(sender, instance, **kwargs):
+    category_cache.invalidate(instance.pk)
+    invalidate_category_trees()
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_cached_customer(sender, instance, **kwargs):
+    customer_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_cached_customer_user(sender, instance, created=False, **kwargs):
+    """Cached customers embed their user, so drop them when it changes."""
+    if created:
+        return
+    for pk in Customer.objects.filter(user=instance).values_list("pk", flat=True):
+        customer_cache.invalidate(pk)
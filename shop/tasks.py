@@ -3,9 +3,16 @@ import logging
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.mail import send_mail
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
 
 from celery import shared_task
 
+from .models import Category, CategoryStats, IdempotencyKey, Order, OrderItem
+from .sales import rank_best_sellers, roll_up_sales
+
 
 logger = logging.getLogger(__name__)
 
@@ -37,3 +44,97 @@ def mail_admin(
         html_message=html_message,
     )
     return True
+
+
+@shared_task
+def send_order_confirmation(order_id: str) -> bool:
+    """Email the admin the details of a new order.
+
+    Args:
+        order_id (str): The ID of the order.
+
+    Returns:
+        bool: Whether the email was sent successfully.
+    """
+    items = OrderItem.objects.select_related("product").only(
+        "quantity", "price", "order_id", "product__name"
+    )
+    order = (
+        Order.objects.select_related("customer__user")
+        .prefetch_related(Prefetch("orderitem_set", queryset=items))
+        .filter(pk=order_id)
+        .first()
+    )
+    if not order:
+        logger.warning(f"Order {order_id} not found")
+        return False
+
+    # Prices are the ones frozen on the items at the time of order
+    html_content = render_to_string(
+        "email/order_confirmation.html",
+        {
+            "order_id": order.id,
+            "items": [
+                {
+                    "name": item.product.name,
+                    "quantity": item.quantity,
+                    "price": item.price,
+                    "total": item.price * item.quantity,
+                }
+                for item in order.orderitem_set.all()
+            ],
+            "total_price": order.total_price,
+            "customer_name": f"{order.customer.user.first_name} {order.customer.user.last_name}",
+            "customer_phone": order.customer.phone_number,
+        },
+    )
+
+    # Fallback text content for non-HTML email clients
+    return mail_admin(
+        subject="New Order Placed",
+        body=strip_tags(html_content),
+        html_message=html_content,
+    )
+
+
+@shared_task
+def rebuild_category_stats() -> int:
+    """Recompute the price statistics of every category from scratch.
+
+    Returns:
+        int: The number of categories recomputed.
+    """
+    category_ids = list(Category.objects.values_list("id", flat=True))
+    CategoryStats.objects.refresh(category_ids)
+    return len(category_ids)
+
+
+@shared_task
+def update_sales_rollups() -> int:
+    """Add the orders placed since the last run to the daily sales rollups.
+
+    Returns:
+        int: The number of orders rolled up.
+    """
+    return roll_up_sales()
+
+
+@shared_task
+def refresh_best_sellers() -> int:
+    """Rebuild the best seller rankings from the daily sales rollups.
+
+    Returns:
+        int: The number of ranked products.
+    """
+    return rank_best_sellers()
+
+
+@shared_task
+def purge_idempotency_keys() -> int:
+    """Delete the idempotency keys that can no longer be replayed.
+
+    Returns:
+        int: The number of keys deleted.
+    """
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
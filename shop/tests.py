@@ -1,11 +1,60 @@
+import csv
+import json
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone
+from io import StringIO
+from pathlib import Path
+
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.tokens import RefreshToken
+from unittest import skipUnless
 from unittest.mock import patch
 
-from .models import Category, Product, Customer, Order
-from .tasks import mail_admin
+from .cache import (
+    INVALIDATION_CHANNEL,
+    category_cache,
+    customer_cache,
+    handle_invalidation,
+    listen_for_invalidations,
+    product_cache,
+    registry,
+)
+from .models import (
+    BestSeller,
+    Category,
+    IdempotencyKey,
+    CategoryStats,
+    Product,
+    Customer,
+    DailyCategorySales,
+    DailyProductSales,
+    DailySales,
+    Order,
+    OrderItem,
+)
+from .sales import rank_best_sellers, roll_up_sales
+from .serializers import CreateOrderSerializer
+from .tasks import (
+    mail_admin,
+    purge_idempotency_keys,
+    rebuild_category_stats,
+    refresh_best_sellers,
+    send_order_confirmation,
+    update_sales_rollups,
+)
+from .utils import get_descendant_categories, search_products
+from utils.helpers import get_category_tree
 
 
 class CategoryTestCase(APITestCase):
@@ -61,6 +110,184 @@ class CategoryTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
 
+class CategoryTreeTestCase(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        test_user = User.objects.create_user(
+            email="testuser@test.com", password="testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=test_user)
+
+        self.root = Category.objects.create(name="Root")
+        self.child = Category.objects.create(name="Child", parent=self.root)
+        self.grandchild = Category.objects.create(name="Grandchild", parent=self.child)
+        self.other = Category.objects.create(name="Other")
+
+    def test_descendants(self):
+        with self.assertNumQueries(1):
+            descendants = get_descendant_categories(self.root)
+        self.assertCountEqual(descendants, [self.child, self.grandchild])
+
+    def test_category_tree(self):
+        with self.assertNumQueries(1):
+            tree = get_category_tree(self.grandchild)
+        self.assertEqual(tree, [self.root, self.child, self.grandchild])
+
+    def test_reparent_moves_subtree(self):
+        self.child.parent = self.other
+        self.child.save()
+        self.assertEqual(get_descendant_categories(self.root), [])
+        self.assertEqual(
+            get_category_tree(self.grandchild),
+            [self.other, self.child, self.grandchild],
+        )
+
+    def test_reparent_under_descendant_is_rejected(self):
+        endpoint = reverse("category_detail", args=[self.root.id])
+        data = {"parent": self.grandchild.id}
+        response = self.client.put(endpoint, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_delete_removes_subtree(self):
+        self.child.delete()
+        self.assertEqual(get_descendant_categories(self.root), [])
+
+    def test_average_price_includes_subtree(self):
+        for category, price in [
+            (self.root, 10),
+            (self.grandchild, 30),
+            (self.other, 99),
+        ]:
+            Product.objects.create(
+                name="Product", description="", category=category, price=price
+            )
+        endpoint = reverse("average_product_price", args=[self.root.id])
+        response = self.client.get(endpoint, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["average_price"], 20)
+
+
+class CategoryTreeViewTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        test_user = User.objects.create_user(
+            email="testuser@test.com", password="testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=test_user)
+        self.endpoint = reverse("category_tree")
+
+        self.root = Category.objects.create(name="Root")
+        self.child = Category.objects.create(name="Child", parent=self.root)
+        self.grandchild = Category.objects.create(name="Grandchild", parent=self.child)
+        self.other = Category.objects.create(name="Other")
+
+    @staticmethod
+    def names(nodes):
+        return [
+            (node["name"], CategoryTreeViewTestCase.names(node["children"]))
+            for node in nodes
+        ]
+
+    def test_tree(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.endpoint)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.names(response.data),
+            [("Other", []), ("Root", [("Child", [("Grandchild", [])])])],
+        )
+
+        # Served from the cache until a category changes
+        with self.assertNumQueries(0):
+            self.client.get(self.endpoint)
+        Category.objects.create(name="Another child", parent=self.root)
+        response = self.client.get(self.endpoint)
+        self.assertEqual(
+            [name for name, _ in self.names(response.data)[1][1]],
+            ["Another child", "Child"],
+        )
+
+    def test_depth(self):
+        response = self.client.get(self.endpoint, {"depth": 1})
+        self.assertEqual(
+            self.names(response.data), [("Other", []), ("Root", [("Child", [])])]
+        )
+
+    def test_subtree(self):
+        response = self.client.get(self.endpoint, {"root": self.child.id})
+        self.assertEqual(self.names(response.data), [("Child", [("Grandchild", [])])])
+
+        response = self.client.get(self.endpoint, {"root": self.root.id, "depth": 1})
+        self.assertEqual(self.names(response.data), [("Root", [("Child", [])])])
+
+        child_id = self.child.id
+        self.child.delete()
+        response = self.client.get(self.endpoint, {"root": child_id})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CategoryStatsTestCase(APITestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name="Root")
+        self.child = Category.objects.create(name="Child", parent=self.root)
+        self.other = Category.objects.create(name="Other")
+        self.cheap = Product.objects.create(
+            name="Cheap", description="", category=self.child, price=10
+        )
+        self.dear = Product.objects.create(
+            name="Dear", description="", category=self.root, price=50
+        )
+
+    def assertStats(self, category, count, total, minimum, maximum):
+        stats = CategoryStats.objects.get(category=category)
+        self.assertEqual(
+            (stats.product_count, stats.price_sum, stats.price_min, stats.price_max),
+            (count, total, minimum, maximum),
+        )
+
+    def test_stats_follow_product_writes(self):
+        self.assertStats(self.root, 2, 60, 10, 50)
+        self.assertStats(self.child, 1, 10, 10, 10)
+
+        self.cheap.price = 20
+        self.cheap.save()
+        self.assertStats(self.root, 2, 70, 20, 50)
+
+        self.cheap.category = self.other
+        self.cheap.save()
+        self.assertStats(self.root, 1, 50, 50, 50)
+        self.assertStats(self.child, 0, 0, None, None)
+        self.assertStats(self.other, 1, 20, 20, 20)
+
+        self.dear.delete()
+        self.assertStats(self.root, 0, 0, None, None)
+
+    def test_stats_follow_category_writes(self):
+        self.child.parent = self.other
+        self.child.save()
+        self.assertStats(self.root, 1, 50, 50, 50)
+        self.assertStats(self.other, 1, 10, 10, 10)
+
+        self.child.delete()
+        self.assertStats(self.other, 0, 0, None, None)
+
+    def test_rebuild_category_stats(self):
+        CategoryStats.objects.update(product_count=0, price_sum=0)
+        self.assertEqual(rebuild_category_stats(), 3)
+        self.assertStats(self.root, 2, 60, 10, 50)
+
+    def test_get_category_stats(self):
+        endpoint = reverse("category_stats", args=[self.root.id])
+        with self.assertNumQueries(1):
+            response = self.client.get(endpoint, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["product_count"], 2)
+        self.assertEqual(response.data["average_price"], "30.00")
+
+
 class ProductTestCase(APITestCase):
     def setUp(self):
         User = get_user_model()
@@ -69,6 +296,7 @@ class ProductTestCase(APITestCase):
         )
         self.client = APIClient()
         self.client.force_authenticate(user=test_user)
+        cache.clear()
         self.list_endpoint = reverse("product_list")
         self.detail_endpoint = lambda id: reverse("product_detail", args=[id])
 
@@ -98,8 +326,12 @@ class ProductTestCase(APITestCase):
 
     def test_get_products(self):
         endpoint = self.list_endpoint
-        response = self.client.get(endpoint, format="json")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(endpoint, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The search vector is never sent, so it is never read
+        for query in queries:
+            self.assertNotIn("search_vector", query["sql"].split(" FROM ")[0])
 
     def test_get_product(self):
         endpoint = self.detail_endpoint(self.product_x.id)
@@ -124,8 +356,121 @@ class ProductTestCase(APITestCase):
         response = self.client.delete(endpoint, format="json")
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_get_products_with_sparse_fields(self):
+        # Validators, count and page, but no category trees
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_endpoint, {"fields": "id,name,price"})
+        self.assertEqual(len(queries), 4)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data["results"][0]), {"id", "name", "price"})
+        self.assertNotIn("description", queries[-1]["sql"])
 
-class CustomerTestCase(APITestCase):
+        response = self.client.get(
+            self.list_endpoint, {"exclude": "description,categories"}
+        )
+        product = response.data["results"][0]
+        self.assertIn("name", product)
+        self.assertNotIn("description", product)
+        self.assertNotIn("categories", product)
+
+    def test_get_products_with_sparse_fields_and_cursor(self):
+        Product.objects.create(
+            name="Product Y", description="", category=self.category_x, price=1
+        )
+        params = {"pagination": "cursor", "per_page": 1, "fields": "name"}
+        response = self.client.get(self.list_endpoint, params)
+
+        # Validators and page, with no queries for deferred cursor columns
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                self.list_endpoint,
+                {"cursor": response.data["next_cursor"], "fields": "name"},
+            )
+        self.assertEqual(response.data["results"], [{"name": "Product X"}])
+
+    def test_get_product_with_sparse_fields(self):
+        endpoint = self.detail_endpoint(self.product_x.id)
+        response = self.client.get(endpoint, {"fields": "name,categories"})
+        self.assertEqual(set(response.data), {"name", "categories"})
+
+    def test_get_products_with_unknown_fields(self):
+        response = self.client.get(self.list_endpoint, {"fields": "name,secret"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_products_count_is_cached(self):
+        response = self.client.get(self.list_endpoint)
+        self.assertEqual(response.data["count"], 1)
+        self.assertTrue(response.data["count_exact"])
+
+        Product.objects.create(
+            name="Product Y", description="", category=self.category_x, price=1
+        )
+        response = self.client.get(self.list_endpoint)
+        self.assertEqual(response.data["count"], 1)
+        self.assertFalse(response.data["count_exact"])
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_get_products_with_cursor_pagination(self):
+        for i in range(24):
+            Product.objects.create(
+                name=f"Product {i}", description="", category=self.category_x, price=1
+            )
+        products = Product.objects.order_by("-created_at", "-id")
+        expected = [str(id) for id in products.values_list("id", flat=True)]
+
+        pages, params = [], {"pagination": "cursor", "per_page": 10}
+        while True:
+            response = self.client.get(self.list_endpoint, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            pages.append([product["id"] for product in response.data["results"]])
+            if not response.data["next_cursor"]:
+                break
+            params = {"cursor": response.data["next_cursor"], "per_page": 10}
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), expected)
+
+        previous_cursor = response.data["previous_cursor"]
+        response = self.client.get(
+            self.list_endpoint, {"cursor": previous_cursor, "per_page": 10}
+        )
+        self.assertEqual(
+            [product["id"] for product in response.data["results"]], pages[1]
+        )
+
+    def test_get_products_with_invalid_cursor(self):
+        response = self.client.get(self.list_endpoint, {"cursor": "invalid"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_products_query_count_is_constant(self):
+        parent = self.category_x
+        for depth in range(5):
+            parent = Category.objects.create(name=f"Depth {depth}", parent=parent)
+            for i in range(3):
+                Product.objects.create(
+                    name=f"Product {depth}-{i}",
+                    description="",
+                    category=parent,
+                    price=10,
+                )
+
+        # Validators, count, page and category trees
+        with self.assertNumQueries(5):
+            response = self.client.get(self.list_endpoint, {"per_page": 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        results = {product["name"]: product for product in response.data["results"]}
+        self.assertEqual(
+            [category["name"] for category in results["Product 4-0"]["categories"]],
+            ["Category X", "Depth 0", "Depth 1", "Depth 2", "Depth 3", "Depth 4"],
+        )
+        self.assertEqual(
+            [category["name"] for category in results["Product X"]["categories"]],
+            ["Category X"],
+        )
+
+
+class ProductBulkTestCase(APITestCase):
     def setUp(self):
         User = get_user_model()
         test_user = User.objects.create_user(
@@ -133,49 +478,197 @@ class CustomerTestCase(APITestCase):
         )
         self.client = APIClient()
         self.client.force_authenticate(user=test_user)
-        self.list_endpoint = reverse("customer_list")
-        self.detail_endpoint = lambda id: reverse("customer_detail", args=[id])
+        self.endpoint = reverse("product_bulk")
 
-        self.customer_x = Customer.objects.create(
-            user=test_user,
-            phone_number="1234567890",
+        self.category_x = Category.objects.create(name="Category X")
+        self.category_y = Category.objects.create(
+            name="Category Y", parent=self.category_x
         )
-
-        self.test_user_x = User.objects.create_user(
-            email="testuserx@test.com", password="testpasswordx"
+        self.product_x = Product.objects.create(
+            name="Product X",
+            description="",
+            category=self.category_x,
+            price=100,
+            external_id="ERP-1",
         )
 
-    def test_create_customer(self):
-        data = {"user": self.test_user_x.id, "phone_number": "1234567890"}
-        response = self.client.post(self.list_endpoint, data, format="json")
-        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    def row(self, external_id, **kwargs):
+        return {
+            "external_id": external_id,
+            "name": f"Product {external_id}",
+            "description": "Imported from the ERP",
+            "price": "10.00",
+            "category": str(self.category_y.id),
+            **kwargs,
+        }
 
-    def test_get_customers(self):
-        response = self.client.get(self.list_endpoint, format="json")
+    def test_upsert(self):
+        rows = [self.row("ERP-1", price="150.00"), self.row("ERP-2")]
+        response = self.client.post(self.endpoint, rows, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["errors"], [])
+        results = {row["external_id"]: row for row in response.data["results"]}
+        self.assertFalse(results["ERP-1"]["created"])
+        self.assertEqual(results["ERP-1"]["id"], self.product_x.id)
+        self.assertTrue(results["ERP-2"]["created"])
 
-    def test_get_customer(self):
-        response = self.client.get(
-            self.detail_endpoint(self.customer_x.id), format="json"
-        )
+        self.product_x.refresh_from_db()
+        self.assertEqual(self.product_x.price, 150)
+        self.assertEqual(self.product_x.category, self.category_y)
+        self.assertEqual(Product.objects.count(), 2)
+
+        # Both products moved into Y, which is still under X
+        stats_x = CategoryStats.objects.get(category=self.category_x)
+        stats_y = CategoryStats.objects.get(category=self.category_y)
+        self.assertEqual((stats_x.product_count, stats_x.price_sum), (2, 160))
+        self.assertEqual((stats_y.product_count, stats_y.price_min), (2, 10))
+
+    def test_row_errors(self):
+        rows = [
+            self.row("ERP-2"),
+            self.row("ERP-3", price="free"),
+            self.row("ERP-2"),
+            self.row("ERP-4", category="7e5ae0b6-1f3a-4c8e-9f51-1a5e0b1b5d3c"),
+            "not a product",
+        ]
+        response = self.client.post(self.endpoint, rows, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [row["external_id"] for row in response.data["results"]], ["ERP-2"]
+        )
+        errors = response.data["errors"]
+        self.assertEqual([error["index"] for error in errors], [1, 2, 3, 4])
+        self.assertIn("price", errors[0]["errors"])
+        self.assertIn("external_id", errors[1]["errors"])
+        self.assertIn("category", errors[2]["errors"])
+        self.assertTrue(Product.objects.filter(external_id="ERP-2").exists())
 
-    def test_update_customer(self):
-        data = {"phone_number": "1234567890"}
-        response = self.client.put(
-            self.detail_endpoint(self.customer_x.id), data, format="json"
+    def test_invalid_batch(self):
+        response = self.client.post(self.endpoint, self.row("ERP-2"), format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count(self):
+        # Categories, existing rows, savepoint, upsert, ancestors, stats and
+        # results, however large the batch
+        rows = [self.row(f"ERP-{i}") for i in range(2, 52)]
+        with self.assertNumQueries(9):
+            response = self.client.post(self.endpoint, rows, format="json")
+        self.assertEqual(len(response.data["results"]), 50)
+
+
+class ImportCatalogTestCase(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write(self, name, content):
+        path = self.directory / name
+        path.write_text(content)
+        return path
+
+    def import_catalog(self, path, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            "import_catalog", str(path), stdout=stdout, stderr=stderr, **options
         )
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data["phone_number"], "1234567890")
+        return stdout.getvalue(), stderr.getvalue()
 
-    def test_delete_customer(self):
-        response = self.client.delete(
-            self.detail_endpoint(self.customer_x.id), format="json"
+    def test_csv(self):
+        path = self.write(
+            "catalog.csv",
+            "external_id,name,price,description,image,category\n"
+            "ERP-1,Phone,100.00,A phone,,Electronics/Phones\n"
+            "ERP-2,Laptop,300.00,A laptop,https://example.com/laptop.png,Electronics\n"
+            "ERP-3,Broken,free,A broken row,,Electronics\n",
         )
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        stdout, stderr = self.import_catalog(path, batch_size=2)
+        self.assertIn("Imported 2 products", stdout)
+        self.assertIn("Record 3", stderr)
+        self.assertFalse(path.with_name("catalog.csv.checkpoint").exists())
 
+        phones = Category.objects.get(name="Phones")
+        self.assertEqual(phones.parent.name, "Electronics")
+        self.assertEqual(Product.objects.get(external_id="ERP-1").category, phones)
+        stats = CategoryStats.objects.get(category=phones.parent)
+        self.assertEqual((stats.product_count, stats.price_sum), (2, 400))
 
-class OrderTestCase(APITestCase):
+        # Importing again updates the same products
+        self.write(
+            "catalog.csv",
+            "external_id,name,price,description,category\n"
+            "ERP-1,Phone,80.00,A phone,Electronics\n",
+        )
+        self.import_catalog(path)
+        self.assertEqual(Product.objects.count(), 2)
+        product = Product.objects.get(external_id="ERP-1")
+        self.assertEqual((product.price, product.category), (80, phones.parent))
+        stats = CategoryStats.objects.get(category=phones)
+        self.assertEqual(stats.product_count, 0)
+
+    def test_ndjson(self):
+        rows = [
+            {
+                "external_id": "ERP-1",
+                "name": "Phone",
+                "price": "100.00",
+                "description": "A phone",
+                "category": ["Electronics", "Phones"],
+            },
+            {
+                "external_id": "ERP-2",
+                "name": "Cable",
+                "price": "5.00",
+                "description": "A cable",
+                "category": "Electronics / Accessories",
+            },
+        ]
+        path = self.write(
+            "catalog.ndjson", "\n".join(json.dumps(row) for row in rows) + "\n\nnope\n"
+        )
+        stdout, stderr = self.import_catalog(path)
+        self.assertIn("Imported 2 products", stdout)
+        self.assertIn("Record 4", stderr)
+        self.assertEqual(
+            Product.objects.get(external_id="ERP-2").category.parent.name,
+            "Electronics",
+        )
+
+    def test_category_conflict(self):
+        Category.objects.create(name="Phones")
+        path = self.write(
+            "catalog.csv",
+            "external_id,name,price,description,category\n"
+            "ERP-1,Phone,100.00,A phone,Electronics/Phones\n",
+        )
+        stdout, stderr = self.import_catalog(path)
+        self.assertIn("already exists under another parent", stderr)
+        self.assertFalse(Product.objects.exists())
+
+    def test_resume(self):
+        path = self.write(
+            "catalog.csv",
+            "external_id,name,price,description,category\n"
+            "ERP-1,Phone,100.00,A phone,Electronics\n"
+            "ERP-2,Laptop,300.00,A laptop,Electronics\n",
+        )
+        # A previous run committed the first record
+        electronics = Category.objects.create(name="Electronics")
+        path.with_name("catalog.csv.checkpoint").write_text(
+            json.dumps({"records": 1, "categories": [str(electronics.pk)]})
+        )
+        stdout, _ = self.import_catalog(path)
+        self.assertIn("Resuming after 1 records", stdout)
+        self.assertEqual(
+            list(Product.objects.values_list("external_id", flat=True)), ["ERP-2"]
+        )
+
+    def test_missing_file(self):
+        with self.assertRaises(CommandError):
+            self.import_catalog(self.directory / "missing.csv")
+
+
+class ConditionalGetTestCase(APITestCase):
     def setUp(self):
         User = get_user_model()
         test_user = User.objects.create_user(
@@ -183,99 +676,708 @@ class OrderTestCase(APITestCase):
         )
         self.client = APIClient()
         self.client.force_authenticate(user=test_user)
-        self.list_endpoint = reverse("order_list")
-        self.detail_endpoint = lambda id: reverse("order_detail", args=[id])
 
-        self.customer_x = Customer.objects.create(
-            user=test_user, phone_number="1234567890"
+        self.category_x = Category.objects.create(name="Category X")
+        self.product_x = Product.objects.create(
+            name="Product X", description="", category=self.category_x, price=100
         )
 
-        # User without phone number
-        user_without_phone_number = User.objects.create_user(
-            email="testuserx@test.com", password="testpasswordx"
+    def assertNotModified(self, endpoint, etag):
+        response = self.client.get(endpoint, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_product_detail(self):
+        endpoint = reverse("product_detail", args=[self.product_x.id])
+        response = self.client.get(endpoint)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Last-Modified", response)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertNotIn("public", response["Cache-Control"])
+        etag = response["ETag"]
+        self.assertNotModified(endpoint, etag)
+
+        # Renaming a category changes the embedded category tree
+        self.category_x.name = "Category Y"
+        self.category_x.save()
+        response = self.client.get(endpoint, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_detail_validators_come_from_the_cache(self):
+        customer = Customer.objects.create(
+            user=get_user_model().objects.first(), phone_number="1234567890"
         )
+        for endpoint in [
+            reverse("product_detail", args=[self.product_x.id]),
+            reverse("category_detail", args=[self.category_x.id]),
+            reverse("customer_detail", args=[customer.id]),
+        ]:
+            etag = self.client.get(endpoint)["ETag"]
+            with self.assertNumQueries(0):
+                self.assertNotModified(endpoint, etag)
 
-        # Customer without phone number
-        self.customer_without_phone_number = Customer.objects.create(
-            user=user_without_phone_number, phone_number=None
+    def test_customer_detail_follows_user(self):
+        customer = Customer.objects.create(
+            user=get_user_model().objects.first(), phone_number="1234567890"
         )
+        endpoint = reverse("customer_detail", args=[customer.id])
+        etag = self.client.get(endpoint)["ETag"]
+        customer.user.first_name = "Changed"
+        customer.user.save()
+        response = self.client.get(endpoint, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        self.category_x = Category.objects.create(
-            name="Category x",
+    def test_product_list(self):
+        endpoint = reverse("product_list")
+        etag = self.client.get(endpoint)["ETag"]
+        self.assertNotModified(endpoint, etag)
+        self.assertNotEqual(self.client.get(endpoint, {"page": 2})["ETag"], etag)
+
+        self.product_x.delete()
+        response = self.client.get(endpoint, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @patch("utils.conditional.estimate_count", return_value=20_000)
+    @patch("utils.pagination.estimate_count", return_value=20_000)
+    def test_order_list_uses_estimated_count(self, *mocks):
+        endpoint = reverse("order_list")
+        etag = self.client.get(endpoint)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertNotModified(endpoint, etag)
+        self.assertFalse(
+            any("COUNT(" in query["sql"].upper() for query in queries.captured_queries)
+        )
+
+    def test_customer_detail(self):
+        customer = Customer.objects.create(
+            user=get_user_model().objects.first(), phone_number="1234567890"
+        )
+        endpoint = reverse("customer_detail", args=[customer.id])
+        response = self.client.get(endpoint)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertNotModified(endpoint, response["ETag"])
+
+
+class ObjectCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        for object_cache in registry.values():
+            object_cache.clear()
+
+        User = get_user_model()
+        self.test_user = User.objects.create_user(
+            email="testuser@test.com", password="testpassword"
         )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.test_user)
 
+        self.category_x = Category.objects.create(name="Category X")
         self.product_x = Product.objects.create(
-            name="Product x",
-            description="Product x description",
-            category=self.category_x,
-            price=100,
-            image="https://via.placeholder.com/150",
+            name="Product X", description="", category=self.category_x, price=100
+        )
+        self.customer_x = Customer.objects.create(
+            user=self.test_user, phone_number="1234567890"
         )
 
-    @patch("shop.views.mail_admin.delay_on_commit")
-    @patch("africas_talking.tasks.send_sms.delay_on_commit")
-    def test_create_order(self, mock_send_sms, mock_mail_admin):
-        data = {
-            "customer": self.customer_x.id,
-            "order_items": [{"product": self.product_x.id, "quantity": 4}],
-        }
-        response = self.client.post(self.list_endpoint, data, format="json")
-        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(response.data["customer"], self.customer_x.id)
-        self.assertEqual(
-            response.data["order_items"][0]["product"]["id"], str(self.product_x.id)
+    def test_read_through(self):
+        self.assertEqual(product_cache.get(self.product_x.id), self.product_x)
+        with self.assertNumQueries(0):
+            product = product_cache.get(self.product_x.id)
+        self.assertEqual(product.name, "Product X")
+
+        # The shared tier serves processes with a cold local tier
+        product_cache.clear()
+        with self.assertNumQueries(0):
+            product_cache.get(self.product_x.id)
+
+    def test_copies_are_independent(self):
+        product_cache.get(self.product_x.id).name = "Changed"
+        self.assertEqual(product_cache.get(self.product_x.id).name, "Product X")
+
+    def test_missing(self):
+        product_id = self.product_x.id
+        product_cache.get(product_id)
+        self.product_x.delete()
+        with self.assertRaises(Product.DoesNotExist):
+            product_cache.get(product_id)
+        response = self.client.get(reverse("product_detail", args=[product_id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_update_invalidates(self):
+        endpoint = reverse("product_detail", args=[self.product_x.id])
+        self.client.get(endpoint)
+        self.client.put(endpoint, {"price": "120.00"}, format="json")
+        response = self.client.get(endpoint)
+        self.assertEqual(response.data["price"], "120.00")
+
+        category_cache.get(self.category_x.id)
+        self.category_x.name = "Category Y"
+        self.category_x.save()
+        self.assertEqual(category_cache.get(self.category_x.id).name, "Category Y")
+
+    def test_user_update_invalidates_customer(self):
+        customer_cache.get(self.customer_x.id)
+        self.test_user.first_name = "Jane"
+        self.test_user.save()
+        customer = customer_cache.get(self.customer_x.id)
+        self.assertEqual(customer.user.first_name, "Jane")
+
+    def test_broadcast(self):
+        key = product_cache.key(self.product_x.id)
+        product_cache.get(self.product_x.id)
+
+        with self.settings(OBJECT_CACHE_BROADCAST=True), patch(
+            "shop.cache.get_redis"
+        ) as get_redis:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product_x.save()
+        get_redis.return_value.publish.assert_called_once_with(
+            INVALIDATION_CHANNEL, key
         )
-        self.assertEqual(response.data["order_items"][0]["quantity"], 4)
 
-        # Verify that the order was created
-        order = Order.objects.first()
-        self.assertIsNotNone(order)
-        self.assertEqual(order.customer.id, self.customer_x.id)
+        # Other processes drop the key from their local tier
+        product_cache.get(self.product_x.id)
+        handle_invalidation(key)
+        self.assertNotIn(key, product_cache.local)
 
-        # Verify that the SMS task was called with the correct arguments
-        mock_send_sms.assert_called_once_with(
-            "Your order has been placed.",
-            [self.customer_x.phone_number],
+    def test_listener_backs_off(self):
+        class Stop(Exception):
+            pass
+
+        delays = []
+
+        def sleep(seconds):
+            delays.append(seconds)
+            if len(delays) == 8:
+                raise Stop
+
+        with patch("shop.cache.get_redis", side_effect=ConnectionError), patch(
+            "shop.cache.time.sleep", side_effect=sleep
+        ), self.assertLogs("shop.cache", level="WARNING") as logs:
+            with self.assertRaises(Stop):
+                listen_for_invalidations()
+        self.assertEqual(delays, [1, 2, 4, 8, 16, 32, 60, 60])
+        # Only the first failure carries a traceback
+        self.assertEqual(logs.records[0].levelname, "ERROR")
+        self.assertTrue(
+            all(record.levelname == "WARNING" for record in logs.records[1:])
         )
 
-        # Verify that the email task was called with the correct arguments
-        mock_mail_admin.assert_called_once()
-        call_args = mock_mail_admin.call_args
 
-        # Check the subject
-        self.assertEqual(call_args.kwargs["subject"], "New Order Placed")
+class ProductFilterTestCase(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        test_user = User.objects.create_user(
+            email="testuser@test.com", password="testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=test_user)
+        self.endpoint = reverse("product_list")
 
-        # Check the body (plain text content)
-        self.assertIn(f"{order.id}", call_args.kwargs["body"])
-        self.assertIn(f"{order.total_price}", call_args.kwargs["body"])
+        self.shoes = Category.objects.create(name="Shoes")
+        self.trail = Category.objects.create(name="Trail", parent=self.shoes)
+        for name, price, category in [
+            ("Boots", 120, self.shoes),
+            ("Sandals", 15, self.shoes),
+            ("Trail runners", 80, self.trail),
+            ("Trail boots", 150, self.trail),
+        ]:
+            Product.objects.create(
+                name=name, description="", category=category, price=price
+            )
 
-        # Check the HTML content
-        self.assertIn(f"{order.id}", call_args.kwargs["html_message"])
-        self.assertIn(f"{order.total_price}", call_args.kwargs["html_message"])
+    def get_names(self, params):
+        response = self.client.get(self.endpoint, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product["name"] for product in response.data["results"]]
 
-    @patch("africas_talking.tasks.send_sms.delay_on_commit")
-    def test_create_order_without_phone_number(self, mock_send_sms):
-        data = {
-            "customer": self.customer_without_phone_number.id,
-            "order_items": [{"product": self.product_x.id, "quantity": 4}],
-        }
-        response = self.client.post(self.list_endpoint, data, format="json")
-        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    def test_filter_by_category(self):
         self.assertEqual(
-            response.data["customer"], self.customer_without_phone_number.id
+            self.get_names({"category": self.shoes.id, "sort": "name"}),
+            ["Boots", "Sandals"],
         )
         self.assertEqual(
-            response.data["order_items"][0]["product"]["id"], str(self.product_x.id)
+            self.get_names(
+                {"category": self.shoes.id, "include_descendants": True, "sort": "name"}
+            ),
+            ["Boots", "Sandals", "Trail boots", "Trail runners"],
         )
-        self.assertEqual(response.data["order_items"][0]["quantity"], 4)
 
-        # Verify that the order was created
-        order = Order.objects.first()
-        self.assertIsNotNone(order)
-        self.assertEqual(order.customer.id, self.customer_without_phone_number.id)
+    def test_filter_by_price_and_name(self):
+        self.assertEqual(
+            self.get_names({"min_price": 50, "max_price": 130, "sort": "-price"}),
+            ["Boots", "Trail runners"],
+        )
+        self.assertEqual(
+            self.get_names({"name": "trail", "sort": "price"}),
+            ["Trail runners", "Trail boots"],
+        )
 
-        # Verify that the SMS task was not called
-        mock_send_sms.assert_not_called()
+    def test_sort_with_cursor_pagination(self):
+        params = {"pagination": "cursor", "per_page": 3, "sort": "price"}
+        response = self.client.get(self.endpoint, params)
+        names = [product["name"] for product in response.data["results"]]
+        params = {
+            "cursor": response.data["next_cursor"],
+            "per_page": 3,
+            "sort": "price",
+        }
+        names += self.get_names(params)
+        self.assertEqual(names, ["Sandals", "Trail runners", "Boots", "Trail boots"])
+
+    def test_invalid_price_range(self):
+        response = self.client.get(self.endpoint, {"min_price": 10, "max_price": 5})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductSearchTestCase(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        test_user = User.objects.create_user(
+            email="testuser@test.com", password="testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=test_user)
+        self.endpoint = reverse("product_search")
+
+        self.shoes = Category.objects.create(name="Shoes")
+        self.shirts = Category.objects.create(name="Shirts")
+        self.trail = Category.objects.create(name="Trail", parent=self.shoes)
+        Product.objects.create(
+            name="Blue shirt",
+            description="Light enough for running",
+            category=self.shirts,
+            price=20,
+        )
+        Product.objects.create(
+            name="Running shoes",
+            description="Grippy soles",
+            category=self.trail,
+            price=80,
+        )
+        Product.objects.create(
+            name="Sandals", description="Open toe", category=self.shoes, price=15
+        )
+
+    def test_search_products(self):
+        response = self.client.get(self.endpoint, {"q": "running"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [product["name"] for product in response.data["results"]],
+            ["Running shoes", "Blue shirt"],
+        )
+
+    def test_search_products_in_category(self):
+        response = self.client.get(
+            self.endpoint, {"q": "running", "category": self.shoes.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [product["name"] for product in response.data["results"]],
+            ["Running shoes"],
+        )
+
+    def test_search_does_not_read_the_search_vector(self):
+        # It is matched and ranked on in the database only
+        for product in search_products("running"):
+            self.assertIn("search_vector", product.get_deferred_fields())
+
+    def test_search_products_without_query(self):
+        response = self.client.get(self.endpoint)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CustomerTestCase(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        test_user = User.objects.create_user(
+            email="testuser@test.com", password="testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=test_user)
+        self.list_endpoint = reverse("customer_list")
+        self.detail_endpoint = lambda id: reverse("customer_detail", args=[id])
+
+        self.customer_x = Customer.objects.create(
+            user=test_user,
+            phone_number="1234567890",
+        )
+
+        self.test_user_x = User.objects.create_user(
+            email="testuserx@test.com", password="testpasswordx"
+        )
+
+    def test_create_customer(self):
+        data = {"user": self.test_user_x.id, "phone_number": "1234567890"}
+        response = self.client.post(self.list_endpoint, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_get_customers(self):
+        response = self.client.get(self.list_endpoint, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_get_customers_with_a_fixed_number_of_queries(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.list_endpoint, {"per_page": 100})
+
+        User = get_user_model()
+        users = User.objects.bulk_create(
+            User(email=f"user{i}@test.com", password="password") for i in range(50)
+        )
+        Customer.objects.bulk_create(Customer(user=user) for user in users)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(self.list_endpoint, {"per_page": 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 51)
+        self.assertEqual(len(large), len(small))
+
+        customer = response.data["results"][0]
+        self.assertEqual(str(customer["user"]["customer_id"]), customer["id"])
+
+        # Without the user, it is not joined
+        response = self.client.get(self.list_endpoint, {"fields": "id,phone_number"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data["results"][0]), {"id", "phone_number"})
+
+    def test_get_customer(self):
+        response = self.client.get(
+            self.detail_endpoint(self.customer_x.id), format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_update_customer(self):
+        data = {"phone_number": "1234567890"}
+        response = self.client.put(
+            self.detail_endpoint(self.customer_x.id), data, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["phone_number"], "1234567890")
+
+    def test_delete_customer(self):
+        response = self.client.delete(
+            self.detail_endpoint(self.customer_x.id), format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class OrderTestCase(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        test_user = User.objects.create_user(
+            email="testuser@test.com", password="testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=test_user)
+        self.list_endpoint = reverse("order_list")
+        self.detail_endpoint = lambda id: reverse("order_detail", args=[id])
+
+        self.customer_x = Customer.objects.create(
+            user=test_user, phone_number="1234567890"
+        )
+
+        # User without phone number
+        user_without_phone_number = User.objects.create_user(
+            email="testuserx@test.com", password="testpasswordx"
+        )
+
+        # Customer without phone number
+        self.customer_without_phone_number = Customer.objects.create(
+            user=user_without_phone_number, phone_number=None
+        )
+
+        self.category_x = Category.objects.create(
+            name="Category x",
+        )
+
+        self.product_x = Product.objects.create(
+            name="Product x",
+            description="Product x description",
+            category=self.category_x,
+            price=100,
+            image="https://via.placeholder.com/150",
+        )
+
+    @patch("shop.views.send_order_confirmation.delay_on_commit")
+    @patch("africas_talking.tasks.send_sms.delay_on_commit")
+    def test_create_order(self, mock_send_sms, mock_send_order_confirmation):
+        data = {
+            "customer": self.customer_x.id,
+            "order_items": [{"product": self.product_x.id, "quantity": 4}],
+        }
+        response = self.client.post(self.list_endpoint, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["customer"], self.customer_x.id)
+        self.assertEqual(
+            response.data["order_items"][0]["product"]["id"], str(self.product_x.id)
+        )
+        self.assertEqual(response.data["order_items"][0]["quantity"], 4)
+
+        # Verify that the order was created
+        order = Order.objects.first()
+        self.assertIsNotNone(order)
+        self.assertEqual(order.customer.id, self.customer_x.id)
+
+        # Verify that the SMS task was called with the correct arguments
+        mock_send_sms.assert_called_once_with(
+            "Your order has been placed.",
+            [self.customer_x.phone_number],
+        )
+
+        # Verify that only the order ID was queued for the email
+        mock_send_order_confirmation.assert_called_once_with(str(order.id))
+
+    @patch("africas_talking.tasks.send_sms.delay_on_commit")
+    def test_create_order_without_phone_number(self, mock_send_sms):
+        data = {
+            "customer": self.customer_without_phone_number.id,
+            "order_items": [{"product": self.product_x.id, "quantity": 4}],
+        }
+        response = self.client.post(self.list_endpoint, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            response.data["customer"], self.customer_without_phone_number.id
+        )
+        self.assertEqual(
+            response.data["order_items"][0]["product"]["id"], str(self.product_x.id)
+        )
+        self.assertEqual(response.data["order_items"][0]["quantity"], 4)
+
+        # Verify that the order was created
+        order = Order.objects.first()
+        self.assertIsNotNone(order)
+        self.assertEqual(order.customer.id, self.customer_without_phone_number.id)
+
+        # Verify that the SMS task was not called
+        mock_send_sms.assert_not_called()
+
+    def test_create_order_in_one_pass(self):
+        products = Product.objects.bulk_create(
+            Product(
+                name=f"Product {i}",
+                description="Description",
+                category=self.category_x,
+                price=i + 1,
+            )
+            for i in range(50)
+        )
+        data = {
+            "customer": self.customer_x.id,
+            "order_items": [
+                {"product": product.id, "quantity": 2} for product in products
+            ],
+        }
+        serializer = CreateOrderSerializer(data=data)
+
+        # Customer and products, then the order and its items in a savepoint
+        with self.assertNumQueries(6):
+            self.assertTrue(serializer.is_valid())
+            order = serializer.save()
+
+        self.assertEqual(order.total_price, sum(2 * (i + 1) for i in range(50)))
+        self.assertEqual(order.orderitem_set.count(), 50)
+        self.assertEqual(Order.objects.get(pk=order.pk).total_price, order.total_price)
+
+    def test_create_order_with_unknown_product(self):
+        data = {
+            "customer": self.customer_x.id,
+            "order_items": [
+                {"product": self.product_x.id, "quantity": 1},
+                {"product": "00000000-0000-0000-0000-000000000000", "quantity": 1},
+            ],
+        }
+        response = self.client.post(self.list_endpoint, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.json()["order_items"],
+            [
+                {},
+                {
+                    "product": [
+                        'Invalid pk "00000000-0000-0000-0000-000000000000" - '
+                        "object does not exist."
+                    ]
+                },
+            ],
+        )
+        self.assertFalse(Order.objects.exists())
+
+    def test_create_order_reserves_stock(self):
+        self.product_x.stock = 10
+        self.product_x.save()
+        data = {
+            "customer": self.customer_x.id,
+            "order_items": [
+                {"product": self.product_x.id, "quantity": 4},
+                {"product": self.product_x.id, "quantity": 2},
+            ],
+        }
+        response = self.client.post(self.list_endpoint, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.product_x.refresh_from_db()
+        self.assertEqual(self.product_x.stock, 4)
+
+        # Products whose stock is not tracked are not limited
+        product_y = Product.objects.create(
+            name="Product y",
+            description="Product y description",
+            category=self.category_x,
+            price=10,
+        )
+        data = {
+            "customer": self.customer_x.id,
+            "order_items": [
+                {"product": self.product_x.id, "quantity": 4},
+                {"product": product_y.id, "quantity": 1000},
+            ],
+        }
+        response = self.client.post(self.list_endpoint, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.product_x.refresh_from_db()
+        self.assertEqual(self.product_x.stock, 0)
+        product_y.refresh_from_db()
+        self.assertIsNone(product_y.stock)
+
+    def test_create_order_out_of_stock(self):
+        self.product_x.stock = 3
+        self.product_x.save()
+        product_y = Product.objects.create(
+            name="Product y",
+            description="Product y description",
+            category=self.category_x,
+            price=10,
+            stock=5,
+        )
+        data = {
+            "customer": self.customer_x.id,
+            "order_items": [
+                {"product": product_y.id, "quantity": 5},
+                {"product": self.product_x.id, "quantity": 4},
+            ],
+        }
+        response = self.client.post(self.list_endpoint, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data["order_items"], ["Not enough stock for Product x."]
+        )
+
+        # Nothing was reserved or ordered
+        self.assertFalse(Order.objects.exists())
+        product_y.refresh_from_db()
+        self.assertEqual(product_y.stock, 5)
+        self.product_x.refresh_from_db()
+        self.assertEqual(self.product_x.stock, 3)
+
+    def test_create_order_with_invalid_quantity(self):
+        data = {
+            "customer": self.customer_x.id,
+            "order_items": [{"product": self.product_x.id, "quantity": 0}],
+        }
+        response = self.client.post(self.list_endpoint, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch("shop.views.send_order_confirmation.delay_on_commit")
+    @patch("africas_talking.tasks.send_sms.delay_on_commit")
+    def test_create_order_with_idempotency_key(
+        self, mock_send_sms, mock_send_order_confirmation
+    ):
+        data = {
+            "customer": self.customer_x.id,
+            "order_items": [{"product": self.product_x.id, "quantity": 4}],
+        }
+        headers = {"Idempotency-Key": "order-1"}
+        response = self.client.post(
+            self.list_endpoint, data, format="json", headers=headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", response)
+
+        # A retry gets the same order from one lookup, in a savepoint
+        with self.assertNumQueries(3):
+            retry = self.client.post(
+                self.list_endpoint, data, format="json", headers=headers
+            )
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.json(), response.json())
+        self.assertEqual(Order.objects.count(), 1)
+        mock_send_sms.assert_called_once()
+        mock_send_order_confirmation.assert_called_once()
+
+        # The key cannot be reused for another order
+        data["order_items"][0]["quantity"] = 5
+        response = self.client.post(
+            self.list_endpoint, data, format="json", headers=headers
+        )
+        self.assertEqual(response.status_code, 422)
+
+        # Keys are per user
+        self.client.force_authenticate(user=self.customer_without_phone_number.user)
+        response = self.client.post(
+            self.list_endpoint, data, format="json", headers=headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+
+    @patch("shop.views.send_order_confirmation.delay_on_commit")
+    def test_create_order_with_idempotency_key_after_failure(self, mock_send):
+        headers = {"Idempotency-Key": "order-1"}
+        data = {
+            "customer": self.customer_without_phone_number.id,
+            "order_items": [{"product": self.product_x.id, "quantity": 0}],
+        }
+        response = self.client.post(
+            self.list_endpoint, data, format="json", headers=headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        # The failed request did not use up the key
+        data["order_items"][0]["quantity"] = 1
+        response = self.client.post(
+            self.list_endpoint, data, format="json", headers=headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # An expired key places the order again
+        IdempotencyKey.objects.update(
+            expires_at=datetime(2025, 1, 1, tzinfo=timezone.utc)
+        )
+        response = self.client.post(
+            self.list_endpoint, data, format="json", headers=headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Order.objects.count(), 2)
+
+        response = self.client.post(
+            self.list_endpoint,
+            data,
+            format="json",
+            headers={"Idempotency-Key": "x" * 256},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_purge_idempotency_keys(self):
+        user = self.customer_x.user
+        IdempotencyKey.objects.create(
+            user=user,
+            scope="orders",
+            key="old",
+            fingerprint="",
+            expires_at=datetime(2025, 1, 1, tzinfo=timezone.utc),
+        )
+        IdempotencyKey.objects.create(
+            user=user,
+            scope="orders",
+            key="new",
+            fingerprint="",
+            expires_at=datetime(2999, 1, 1, tzinfo=timezone.utc),
+        )
+        self.assertEqual(purge_idempotency_keys(), 1)
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list("key", flat=True)), ["new"]
+        )
 
     def test_get_orders(self):
         data = {
@@ -286,6 +1388,80 @@ class OrderTestCase(APITestCase):
         response = self.client.get(self.list_endpoint, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def create_orders(self, count, items_per_order):
+        subcategory, _ = Category.objects.get_or_create(
+            name="Sub x", parent=self.category_x
+        )
+        products = Product.objects.bulk_create(
+            Product(
+                name=f"Product {i}",
+                description="Description",
+                category=subcategory if i % 2 else self.category_x,
+                price=10,
+            )
+            for i in range(items_per_order)
+        )
+        for _ in range(count):
+            order = Order.objects.create(customer=self.customer_x, total_price=0)
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=product, quantity=1, price=10)
+                for product in products
+            )
+        return order
+
+    def test_get_orders_with_a_fixed_number_of_queries(self):
+        self.create_orders(3, 2)
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get(self.list_endpoint)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.create_orders(5, 20)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(self.list_endpoint)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(large), len(small))
+
+        order = response.data["results"][0]
+        self.assertEqual(len(order["order_items"]), 20)
+        categories = [
+            [category["name"] for category in item["product"]["categories"]]
+            for item in order["order_items"]
+        ]
+        self.assertIn(["Category x"], categories)
+        self.assertIn(["Category x", "Sub x"], categories)
+
+        # Without the items, they are not loaded at all
+        with CaptureQueriesContext(connection) as trimmed:
+            response = self.client.get(self.list_endpoint, {"fields": "id,total_price"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(trimmed), len(small) - 2)
+
+    def test_get_order_with_a_fixed_number_of_queries(self):
+        order = self.create_orders(1, 2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.detail_endpoint(order.id))
+
+        order = self.create_orders(1, 30)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(self.detail_endpoint(order.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["order_items"]), 30)
+        self.assertEqual(len(large), len(small))
+
+    @patch("utils.pagination.estimate_count")
+    def test_get_orders_with_estimated_count(self, mock_estimate_count):
+        mock_estimate_count.return_value = None
+        response = self.client.get(self.list_endpoint)
+        self.assertEqual(response.data["count"], 0)
+        self.assertTrue(response.data["count_exact"])
+
+        mock_estimate_count.return_value = 50_000
+        response = self.client.get(self.list_endpoint, {"page": 9})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 50_000)
+        self.assertFalse(response.data["count_exact"])
+        self.assertEqual(response.data["results"], [])
+
     def test_get_order(self):
         data = {
             "customer": self.customer_x.id,
@@ -307,6 +1483,602 @@ class OrderTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
 
+class StockReservationTestCase(TransactionTestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Category x")
+        self.product = Product.objects.create(
+            name="Product x",
+            description="Product x description",
+            category=self.category,
+            price=10,
+            stock=40,
+        )
+        self.customers = [
+            Customer.objects.create(
+                user=get_user_model().objects.create_user(
+                    email=f"user{i}@test.com", password="password"
+                )
+            )
+            for i in range(8)
+        ]
+
+    @skipUnless(
+        connection.vendor == "postgresql", "SQLite serializes concurrent writers"
+    )
+    def test_concurrent_orders_never_oversell(self):
+        outcomes = []
+        barrier = threading.Barrier(len(self.customers))
+
+        def order(customer):
+            try:
+                barrier.wait()
+                for _ in range(10):
+                    serializer = CreateOrderSerializer(
+                        data={
+                            "customer": customer.id,
+                            "order_items": [
+                                {"product": self.product.id, "quantity": 1}
+                            ],
+                        }
+                    )
+                    serializer.is_valid(raise_exception=True)
+                    try:
+                        serializer.save()
+                        outcomes.append(True)
+                    except ValidationError:
+                        outcomes.append(False)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=order, args=[customer])
+            for customer in self.customers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count(True), 40)
+        self.assertEqual(outcomes.count(False), 40)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(OrderItem.objects.count(), 40)
+
+    @skipUnless(
+        connection.vendor == "postgresql", "SQLite serializes concurrent writers"
+    )
+    def test_overlapping_orders_do_not_deadlock(self):
+        other = Product.objects.create(
+            name="Product y",
+            description="Product y description",
+            category=self.category,
+            price=10,
+            stock=40,
+        )
+        errors = []
+        barrier = threading.Barrier(len(self.customers))
+
+        def order(customer, products):
+            try:
+                barrier.wait()
+                for _ in range(5):
+                    serializer = CreateOrderSerializer(
+                        data={
+                            "customer": customer.id,
+                            "order_items": [
+                                {"product": product.id, "quantity": 1}
+                                for product in products
+                            ],
+                        }
+                    )
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(
+                target=order,
+                args=[customer, [self.product, other][:: 1 if i % 2 else -1]],
+            )
+            for i, customer in enumerate(self.customers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(other.stock, 0)
+
+    @skipUnless(
+        connection.vendor == "postgresql", "SQLite serializes concurrent writers"
+    )
+    @patch("shop.views.send_order_confirmation.delay_on_commit")
+    @patch("africas_talking.tasks.send_sms.delay_on_commit")
+    def test_concurrent_retries_place_one_order(self, mock_send_sms, mock_send):
+        user = self.customers[0].user
+        data = {
+            "customer": self.customers[0].id,
+            "order_items": [{"product": self.product.id, "quantity": 1}],
+        }
+        responses = []
+        barrier = threading.Barrier(4)
+
+        def post():
+            try:
+                client = APIClient()
+                client.force_authenticate(user=user)
+                barrier.wait()
+                responses.append(
+                    client.post(
+                        reverse("order_list"),
+                        data,
+                        format="json",
+                        headers={"Idempotency-Key": "order-1"},
+                    )
+                )
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [201] * 4)
+        self.assertEqual(len({response.json()["id"] for response in responses}), 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 39)
+        mock_send.assert_called_once()
+
+    def test_benchmark_stock(self):
+        out = StringIO()
+        call_command(
+            "benchmark_stock", "--workers=1", "--products=2", "--stock=5", stdout=out
+        )
+        self.assertIn("10 orders placed", out.getvalue())
+        self.assertIn("No product was oversold", out.getvalue())
+
+        # Everything the benchmark created is gone
+        self.assertEqual(Product.objects.count(), 1)
+        self.assertEqual(Customer.objects.count(), len(self.customers))
+
+
+class ExportTestCase(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        test_user = User.objects.create_user(
+            email="testuser@test.com", password="testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=test_user)
+        self.access_token = str(RefreshToken.for_user(test_user).access_token)
+        self.customer_x = Customer.objects.create(user=test_user)
+
+        self.category_x = Category.objects.create(name="Category X")
+        self.category_y = Category.objects.create(
+            name="Category Y", parent=self.category_x
+        )
+        self.product_x = Product.objects.create(
+            name="Product X",
+            description="Product X description",
+            category=self.category_y,
+            price=100,
+            external_id="ERP-1",
+        )
+        self.product_y = Product.objects.create(
+            name="Product Y",
+            description="Product Y description",
+            category=self.category_x,
+            price=50,
+            external_id="ERP-2",
+        )
+
+        self.orders = []
+        for day in (1, 2):
+            order = Order.objects.create(customer=self.customer_x, total_price=250)
+            OrderItem.objects.create(
+                order=order, product=self.product_x, quantity=2, price=100
+            )
+            OrderItem.objects.create(
+                order=order, product=self.product_y, quantity=1, price=50
+            )
+            Order.objects.filter(pk=order.pk).update(
+                created_at=datetime(2025, 1, day, tzinfo=timezone.utc)
+            )
+            self.orders.append(order)
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_orders_ndjson(self):
+        response, content = self.export("order_export")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertIn('filename="orders.ndjson"', response["Content-Disposition"])
+        orders = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [order["id"] for order in orders],
+            [str(self.orders[0].id), str(self.orders[1].id)],
+        )
+        self.assertEqual(len(orders[0]["items"]), 2)
+        self.assertEqual(orders[0]["items"][0]["product_name"], "Product X")
+
+    def test_orders_csv(self):
+        response, content = self.export(
+            "order_export", file_format="csv", created_after="2025-01-02T00:00:00Z"
+        )
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row["order_id"] for row in rows}, {str(self.orders[1].id)})
+
+    def test_orders_csv_without_items(self):
+        order = Order.objects.create(customer=self.customer_x, total_price=0)
+        Order.objects.filter(pk=order.pk).update(
+            created_at=datetime(2025, 1, 3, tzinfo=timezone.utc)
+        )
+        _, content = self.export(
+            "order_export", file_format="csv", created_after="2025-01-03T00:00:00Z"
+        )
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["order_id"], str(order.id))
+        self.assertEqual(rows[0]["item_id"], "")
+        self.assertEqual(rows[0]["quantity"], "")
+
+    def test_orders_created_before(self):
+        _, content = self.export("order_export", created_before="2025-01-02T00:00:00Z")
+        self.assertEqual(len(content.splitlines()), 1)
+
+    def test_query_count(self):
+        # Orders and their items, however many orders there are
+        with self.assertNumQueries(2):
+            self.export("order_export")
+
+    async def test_orders_streamed_under_asgi(self):
+        response = await self.async_client.get(
+            reverse("order_export"),
+            {"file_format": "csv"},
+            headers={"Authorization": f"Bearer {self.access_token}"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Lines are streamed rather than read into memory by Django
+        self.assertTrue(response.is_async)
+        content = "".join(
+            [chunk.decode() async for chunk in response.streaming_content]
+        )
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 4)
+
+    def test_invalid_range(self):
+        response = self.client.get(
+            reverse("order_export"),
+            {
+                "created_after": "2025-01-02T00:00:00Z",
+                "created_before": "2025-01-01T00:00:00Z",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_products_round_trip(self):
+        _, content = self.export("product_export", file_format="csv")
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(rows[0]["category"], "Category X/Category Y")
+
+        # The export can be imported back as it is
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / "products.csv"
+        path.write_text(content)
+        stdout = StringIO()
+        call_command("import_catalog", str(path), stdout=stdout, stderr=StringIO())
+        self.assertIn("Imported 2 products", stdout.getvalue())
+        self.assertEqual(Product.objects.count(), 2)
+
+
+class SalesRollupTestCase(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        test_user = User.objects.create_user(
+            email="testuser@test.com", password="testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=test_user)
+        self.endpoint = reverse("daily_sales")
+        self.customer_x = Customer.objects.create(user=test_user)
+
+        self.category_x = Category.objects.create(name="Category X")
+        self.category_y = Category.objects.create(
+            name="Category Y", parent=self.category_x
+        )
+        self.product_x = Product.objects.create(
+            name="Product X",
+            description="Product X description",
+            category=self.category_y,
+            price=100,
+        )
+        self.product_y = Product.objects.create(
+            name="Product Y",
+            description="Product Y description",
+            category=self.category_x,
+            price=50,
+        )
+
+    def place_order(self, created_at, *lines):
+        order = Order.objects.create(
+            customer=self.customer_x,
+            total_price=sum(product.price * quantity for product, quantity in lines),
+        )
+        for product, quantity in lines:
+            OrderItem.objects.create(
+                order=order, product=product, quantity=quantity, price=product.price
+            )
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        return order
+
+    def test_roll_up_sales(self):
+        self.place_order(
+            datetime(2025, 1, 1, 9, tzinfo=timezone.utc),
+            (self.product_x, 2),
+            (self.product_y, 1),
+        )
+        self.place_order(
+            datetime(2025, 1, 1, 18, tzinfo=timezone.utc), (self.product_y, 4)
+        )
+        self.place_order(
+            datetime(2025, 1, 3, 12, tzinfo=timezone.utc), (self.product_x, 1)
+        )
+
+        self.assertEqual(
+            roll_up_sales(until=datetime(2025, 1, 2, tzinfo=timezone.utc)), 2
+        )
+        daily = DailySales.objects.get(date="2025-01-01")
+        self.assertEqual(daily.order_count, 2)
+        self.assertEqual(daily.item_count, 7)
+        self.assertEqual(daily.revenue, 450)
+        self.assertEqual(daily.average_basket, 225)
+
+        # The parent category counts the items of its subcategory too
+        parent = DailyCategorySales.objects.get(category=self.category_x)
+        self.assertEqual(
+            (parent.order_count, parent.item_count, parent.revenue), (2, 7, 450)
+        )
+        child = DailyCategorySales.objects.get(category=self.category_y)
+        self.assertEqual(
+            (child.order_count, child.item_count, child.revenue), (1, 2, 200)
+        )
+        product = DailyProductSales.objects.get(product=self.product_y)
+        self.assertEqual(
+            (product.order_count, product.item_count, product.revenue), (2, 5, 250)
+        )
+
+        # Orders behind the watermark are not counted again, later ones are
+        # added to the existing days
+        self.place_order(
+            datetime(2025, 1, 3, 15, tzinfo=timezone.utc), (self.product_x, 1)
+        )
+        self.assertEqual(
+            roll_up_sales(until=datetime(2025, 1, 4, tzinfo=timezone.utc)), 2
+        )
+        self.assertEqual(
+            roll_up_sales(until=datetime(2025, 1, 4, tzinfo=timezone.utc)), 0
+        )
+        self.assertEqual(DailySales.objects.get(date="2025-01-01").order_count, 2)
+        daily = DailySales.objects.get(date="2025-01-03")
+        self.assertEqual((daily.order_count, daily.revenue), (2, 200))
+        self.assertEqual(
+            DailyCategorySales.objects.get(
+                category=self.category_x, date="2025-01-03"
+            ).order_count,
+            2,
+        )
+
+    def test_update_sales_rollups(self):
+        self.place_order(
+            datetime(2025, 1, 1, 9, tzinfo=timezone.utc), (self.product_x, 2)
+        )
+        self.assertEqual(update_sales_rollups(), 1)
+        self.assertEqual(update_sales_rollups(), 0)
+
+    def test_get_daily_sales(self):
+        self.place_order(
+            datetime(2025, 1, 1, 9, tzinfo=timezone.utc),
+            (self.product_x, 2),
+            (self.product_y, 1),
+        )
+        self.place_order(
+            datetime(2025, 1, 3, 9, tzinfo=timezone.utc), (self.product_y, 1)
+        )
+        roll_up_sales(until=datetime(2025, 1, 4, tzinfo=timezone.utc))
+
+        params = {"start": "2025-01-01", "end": "2025-01-03"}
+        with self.assertNumQueries(1):
+            response = self.client.get(self.endpoint, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [day["date"] for day in response.data],
+            ["2025-01-01", "2025-01-02", "2025-01-03"],
+        )
+        self.assertEqual(response.data[0]["order_count"], 1)
+        self.assertEqual(response.data[0]["item_count"], 3)
+        self.assertEqual(response.data[0]["revenue"], "250.00")
+        self.assertEqual(response.data[0]["average_basket"], "250.00")
+        self.assertEqual(response.data[1]["order_count"], 0)
+        self.assertIsNone(response.data[1]["average_basket"])
+
+        response = self.client.get(
+            self.endpoint, {**params, "category": self.category_y.id}
+        )
+        self.assertEqual(
+            [day["revenue"] for day in response.data], ["200.00", "0.00", "0.00"]
+        )
+
+        response = self.client.get(
+            self.endpoint, {**params, "product": self.product_y.id}
+        )
+        self.assertEqual([day["item_count"] for day in response.data], [1, 0, 1])
+
+        # The last 30 days by default
+        response = self.client.get(self.endpoint)
+        self.assertEqual(len(response.data), 30)
+
+    def test_get_daily_sales_with_invalid_range(self):
+        response = self.client.get(
+            self.endpoint, {"start": "2025-01-02", "end": "2025-01-01"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(
+            self.endpoint, {"start": "2023-01-01", "end": "2025-01-01"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(
+            self.endpoint,
+            {"category": self.category_x.id, "product": self.product_x.id},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BestSellerTestCase(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        test_user = User.objects.create_user(
+            email="testuser@test.com", password="testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=test_user)
+        self.endpoint = reverse("product_best_sellers")
+
+        self.category_x = Category.objects.create(name="Category X")
+        self.category_y = Category.objects.create(
+            name="Category Y", parent=self.category_x
+        )
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}",
+                description="Description",
+                category=self.category_y if i % 2 else self.category_x,
+                price=10,
+            )
+            for i in range(4)
+        ]
+        self.today = date(2025, 3, 31)
+
+        # Product 0 sold most over 30 days, product 3 over the last week
+        for product, days_ago, units in [
+            (self.products[0], 20, 50),
+            (self.products[1], 1, 10),
+            (self.products[2], 60, 100),
+            (self.products[3], 2, 20),
+            (self.products[3], 3, 5),
+        ]:
+            DailyProductSales.objects.create(
+                product=product,
+                date=self.today - timedelta(days=days_ago),
+                order_count=1,
+                item_count=units,
+                revenue=units * 10,
+            )
+
+    def ranking(self, days, category=None):
+        return [
+            (best_seller.product.name, best_seller.units_sold)
+            for best_seller in BestSeller.objects.filter(
+                days=days, category=category
+            ).order_by("rank")
+        ]
+
+    def test_rank_best_sellers(self):
+        self.assertEqual(rank_best_sellers(self.today), 24)
+        self.assertEqual(self.ranking(7), [("Product 3", 25), ("Product 1", 10)])
+        self.assertEqual(
+            self.ranking(30),
+            [("Product 0", 50), ("Product 3", 25), ("Product 1", 10)],
+        )
+        self.assertEqual(
+            self.ranking(90),
+            [
+                ("Product 2", 100),
+                ("Product 0", 50),
+                ("Product 3", 25),
+                ("Product 1", 10),
+            ],
+        )
+
+        # A category ranks the products of its whole subtree
+        self.assertEqual(
+            self.ranking(30, self.category_x),
+            [("Product 0", 50), ("Product 3", 25), ("Product 1", 10)],
+        )
+        self.assertEqual(
+            self.ranking(30, self.category_y), [("Product 3", 25), ("Product 1", 10)]
+        )
+
+        # Rankings are replaced on every refresh
+        DailyProductSales.objects.all().delete()
+        self.assertEqual(rank_best_sellers(self.today), 0)
+        self.assertFalse(BestSeller.objects.exists())
+
+    def test_refresh_best_sellers(self):
+        self.assertEqual(refresh_best_sellers(), 0)
+
+    def test_get_best_sellers(self):
+        rank_best_sellers(self.today)
+
+        # The page and its count
+        with self.assertNumQueries(2):
+            response = self.client.get(self.endpoint)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 3)
+        first = response.data["results"][0]
+        self.assertEqual(first["rank"], 1)
+        self.assertEqual(first["units_sold"], 50)
+        self.assertEqual(first["revenue"], "500.00")
+        self.assertEqual(first["product"]["id"], str(self.products[0].id))
+
+        response = self.client.get(
+            self.endpoint, {"days": 7, "category": self.category_y.id}
+        )
+        self.assertEqual(
+            [
+                best_seller["product"]["name"]
+                for best_seller in response.data["results"]
+            ],
+            ["Product 3", "Product 1"],
+        )
+
+        response = self.client.get(
+            self.endpoint, {"days": 90, "pagination": "cursor", "per_page": 3}
+        )
+        self.assertEqual(
+            [best_seller["rank"] for best_seller in response.data["results"]],
+            [1, 2, 3],
+        )
+        response = self.client.get(
+            self.endpoint,
+            {"days": 90, "cursor": response.data["next_cursor"], "per_page": 3},
+        )
+        self.assertEqual(
+            [best_seller["rank"] for best_seller in response.data["results"]], [4]
+        )
+
+    def test_get_best_sellers_with_invalid_days(self):
+        response = self.client.get(self.endpoint, {"days": 14})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class MailAdminTestCase(APITestCase):
     def test_mail_admin(self):
         # Without an admin
@@ -319,3 +2091,48 @@ class MailAdminTestCase(APITestCase):
         )
         result = mail_admin("Subject here", "Here is the message.")
         self.assertEqual(result, True)
+
+    def test_send_order_confirmation(self):
+        get_user_model().objects.create_user(
+            email="admin@test.com", password="password", is_admin=True
+        )
+        user = get_user_model().objects.create_user(
+            email="customer@test.com",
+            password="password",
+            first_name="Jane",
+            last_name="Doe",
+        )
+        customer = Customer.objects.create(user=user, phone_number="1234567890")
+        category = Category.objects.create(name="Category x")
+        products = Product.objects.bulk_create(
+            Product(
+                name=f"Product {i}",
+                description="Description",
+                category=category,
+                price=10,
+            )
+            for i in range(20)
+        )
+        order = Order.objects.create(customer=customer, total_price=60)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=3, price=1)
+            for product in products
+        )
+
+        # The order, its items with their products, and the admin
+        with self.assertNumQueries(3):
+            result = send_order_confirmation(str(order.id))
+        self.assertEqual(result, True)
+
+        self.assertEqual(len(mail.outbox), 1)
+        email = mail.outbox[0]
+        self.assertEqual(email.subject, "New Order Placed")
+        self.assertEqual(email.to, ["admin@test.com"])
+        self.assertIn(str(order.id), email.body)
+        self.assertIn("Jane Doe", email.body)
+        self.assertIn("Product 19", email.body)
+        self.assertIn(str(order.id), email.alternatives[0][0])
+
+    def test_send_order_confirmation_for_missing_order(self):
+        result = send_order_confirmation("00000000-0000-0000-0000-000000000000")
+        self.assertEqual(result, False)
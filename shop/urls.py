@@ -5,8 +5,17 @@ from shop import views
 
 urlpatterns = [
     path("products/", views.ProductList.as_view(), name="product_list"),
+    path("products/search/", views.ProductSearch.as_view(), name="product_search"),
+    path("products/bulk/", views.ProductBulk.as_view(), name="product_bulk"),
+    path("products/export/", views.ProductExport.as_view(), name="product_export"),
+    path(
+        "products/best-sellers/",
+        views.ProductBestSellers.as_view(),
+        name="product_best_sellers",
+    ),
     path("products/<uuid:pk>/", views.ProductDetail.as_view(), name="product_detail"),
     path("categories/", views.CategoryList.as_view(), name="category_list"),
+    path("categories/tree/", views.CategoryTree.as_view(), name="category_tree"),
     path(
         "categories/<uuid:pk>/", views.CategoryDetail.as_view(), name="category_detail"
     ),
@@ -15,8 +24,15 @@ urlpatterns = [
         views.AverageProductPrice.as_view(),
         name="average_product_price",
     ),
+    path(
+        "categories/<uuid:pk>/stats/",
+        views.CategoryStatsDetail.as_view(),
+        name="category_stats",
+    ),
     path("orders/", views.OrderList.as_view(), name="order_list"),
+    path("orders/export/", views.OrderExport.as_view(), name="order_export"),
     path("orders/<uuid:pk>/", views.OrderDetail.as_view(), name="order_detail"),
+    path("sales/daily/", views.DailySalesList.as_view(), name="daily_sales"),
     path("customers/", views.CustomerList.as_view(), name="customer_list"),
     path(
         "customers/<uuid:pk>/", views.CustomerDetail.as_view(), name="customer_detail"
@@ -1,11 +1,218 @@
-from .models import Category
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections, transaction
+from django.db.models import Case, F, FloatField, Q, QuerySet, Value, When
+
+from .cache import product_cache
+from .models import Category, CategoryClosure, CategoryStats, Product
 
 
 def get_descendant_categories(category):
-    """Recursively fetch all descendant categories of a given category."""
-    descendants = []
-    children = Category.objects.filter(parent=category)
-    for child in children:
-        descendants.append(child)
-        descendants.extend(get_descendant_categories(child))
-    return descendants
+    """Fetch all descendant categories of a given category.
+
+    The subtree is read from the category closure table in a single
+    query, no matter how deep the tree is.
+    """
+    return list(category.get_descendants())
+
+
+def get_nested_categories(root_id=None, max_depth: int = None) -> list[dict]:
+    """Load categories in one query and nest them under their parents.
+
+    Args:
+        root_id (UUID): Only nest the subtree of this category.
+        max_depth (int): How many levels of children to keep below the
+            top-level categories.
+
+    Returns:
+        list[dict]: The top-level categories, or the root category alone,
+            each with its nested `children`, ordered by name.
+    """
+    categories = Category.objects.order_by("name", "id")
+    if root_id is not None:
+        # One filter call, so both conditions apply to the same closure row
+        links = {"ancestor_links__ancestor": root_id}
+        if max_depth is not None:
+            links["ancestor_links__depth__lte"] = max_depth
+        categories = categories.filter(**links)
+    rows = list(categories.values("id", "name", "slug", "parent_id"))
+
+    nodes = {
+        row["id"]: {"id": row["id"], "name": row["name"], "slug": row["slug"]}
+        for row in rows
+    }
+    for node in nodes.values():
+        node["children"] = []
+    roots = []
+    for row in rows:
+        parent = nodes.get(row["parent_id"])
+        if parent is None or row["id"] == root_id:
+            roots.append(nodes[row["id"]])
+        else:
+            parent["children"].append(nodes[row["id"]])
+
+    if root_id is None and max_depth is not None:
+        level = roots
+        for _ in range(max_depth):
+            level = [child for node in level for child in node["children"]]
+        for node in level:
+            node["children"] = []
+    return roots
+
+
+def filter_products(
+    products: QuerySet,
+    category: Category = None,
+    include_descendants: bool = False,
+    min_price=None,
+    max_price=None,
+    name: str = None,
+    sort: str = "-created_at",
+) -> QuerySet:
+    """Filter and sort products.
+
+    Every combination is backed by an index on `Product`, and the
+    ordering always ends in the primary key so it is stable across pages.
+
+    Args:
+        products (QuerySet): The products to filter.
+        category (Category): Only keep products in this category.
+        include_descendants (bool): Also keep products in the descendants
+            of the category.
+        min_price (Decimal): The lowest price to keep.
+        max_price (Decimal): The highest price to keep.
+        name (str): A case-insensitive prefix of the product name.
+        sort (str): The field to sort by, prefixed with `-` for descending.
+
+    Returns:
+        QuerySet: The filtered and sorted products.
+    """
+    if category and include_descendants:
+        products = products.filter(
+            category__in=category.get_descendants(include_self=True)
+        )
+    elif category:
+        products = products.filter(category=category)
+    if min_price is not None:
+        products = products.filter(price__gte=min_price)
+    if max_price is not None:
+        products = products.filter(price__lte=max_price)
+    if name:
+        products = products.filter(name__istartswith=name)
+    return products.order_by(sort, "-id" if sort.startswith("-") else "id")
+
+
+def search_products(query: str, category: Category = None) -> QuerySet:
+    """Search products by name and description, best matches first.
+
+    On PostgreSQL this is a ranked full-text search over the stored
+    search vector. Other databases fall back to a case-insensitive
+    substring match that ranks name matches above description matches.
+
+    Args:
+        query (str): The search terms.
+        category (Category): Only search this category and its descendants.
+
+    Returns:
+        QuerySet: The matching products, annotated with their `rank`.
+    """
+    # The vector is searched and ranked in the database, never read
+    products = Product.objects.defer("search_vector")
+    if category:
+        products = products.filter(
+            category__in=category.get_descendants(include_self=True)
+        )
+
+    if connections[products.db].vendor == "postgresql":
+        search_query = SearchQuery(query, config="english", search_type="websearch")
+        return (
+            products.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F("search_vector"), search_query))
+            .order_by("-rank", "-created_at", "-id")
+        )
+
+    return (
+        products.filter(Q(name__icontains=query) | Q(description__icontains=query))
+        .annotate(
+            rank=Case(
+                When(name__icontains=query, then=Value(1.0)),
+                default=Value(0.5),
+                output_field=FloatField(),
+            )
+        )
+        .order_by("-rank", "-created_at", "-id")
+    )
+
+
+# Fields an upsert overwrites on products that already exist
+PRODUCT_UPSERT_FIELDS = [
+    "name",
+    "price",
+    "description",
+    "image",
+    "category",
+    "updated_at",
+]
+
+
+def refresh_category_stats(category_ids):
+    """Recompute the stats of categories and all their ancestors.
+
+    Args:
+        category_ids (Iterable[UUID]): The categories whose products changed.
+    """
+    CategoryStats.objects.refresh(
+        CategoryClosure.objects.filter(descendant_id__in=list(category_ids))
+        .values_list("ancestor_id", flat=True)
+        .distinct()
+    )
+
+
+def upsert_products(rows: list[dict]) -> dict:
+    """Create or update products matched on their external ID.
+
+    All rows are written with one upsert per batch, and the stats of every
+    category whose products changed are recomputed once at the end.
+
+    Args:
+        rows (list[dict]): Validated rows with a unique `external_id` and
+            the ID of an existing `category`.
+
+    Returns:
+        dict: The ID of each product and whether it was created, by
+            external ID.
+    """
+    external_ids = [row["external_id"] for row in rows]
+    existing = {
+        external_id: (pk, category_id)
+        for external_id, pk, category_id in Product.objects.filter(
+            external_id__in=external_ids
+        ).values_list("external_id", "pk", "category_id")
+    }
+
+    products = [
+        Product(
+            category_id=row["category"],
+            **{field: value for field, value in row.items() if field != "category"},
+        )
+        for row in rows
+    ]
+    category_ids = {row["category"] for row in rows}
+    category_ids.update(category_id for _, category_id in existing.values())
+
+    with transaction.atomic():
+        Product.objects.bulk_create(
+            products,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=["external_id"],
+            update_fields=PRODUCT_UPSERT_FIELDS,
+        )
+        refresh_category_stats(category_ids)
+        product_cache.invalidate_many(pk for pk, _ in existing.values())
+
+    return {
+        external_id: (pk, external_id not in existing)
+        for external_id, pk in Product.objects.filter(
+            external_id__in=external_ids
+        ).values_list("external_id", "pk")
+    }
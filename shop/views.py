@@ -1,31 +1,96 @@
 import logging
 
-from django.db.models import Avg
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, extend_schema_view
 from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
-from .models import Product, Category, Order, Customer
+from .cache import (
+    CATEGORY_TREE_TIMEOUT,
+    category_cache,
+    category_tree_key,
+    category_trees_changed_at,
+    customer_cache,
+    product_cache,
+)
+from .models import (
+    BestSeller,
+    Product,
+    Category,
+    CategoryStats,
+    Order,
+    OrderItem,
+    Customer,
+)
+from .exports import (
+    ORDER_CSV_FIELDS,
+    PRODUCT_CSV_FIELDS,
+    export_response,
+    filter_created,
+    flatten_order_rows,
+    order_rows,
+    product_rows,
+)
 from .serializers import (
+    BestSellerQuerySerializer,
+    BestSellerSerializer,
+    BulkProductSerializer,
+    ExportQuerySerializer,
     ProductSerializer,
+    ProductFilterSerializer,
+    ProductSearchQuerySerializer,
     CreateProductSerializer,
     CategorySerializer,
+    CategoryStatsSerializer,
+    CategoryTreeQuerySerializer,
+    CategoryTreeSerializer,
     CreateCategorySerializer,
     OrderSerializer,
     CreateOrderSerializer,
+    SalesQuerySerializer,
+    SalesSerializer,
     CustomerSerializer,
     CreateCustomerSerializer,
 )
-from .tasks import mail_admin
-from .utils import get_descendant_categories
+from .sales import get_sales_series
+from .tasks import send_order_confirmation
+from .utils import (
+    filter_products,
+    get_nested_categories,
+    search_products,
+    upsert_products,
+)
 from africas_talking.tasks import send_sms
 from user.views import AuthenticatedAPIView
-from utils.pagination import StandardPagination
-from utils.open_api import page, per_page, get_paginated_response_schema
+from utils.conditional import (
+    CATALOG_CACHE_CONTROL,
+    PRIVATE_CACHE_CONTROL,
+    conditional,
+    conditional_cached,
+)
+from utils.pagination import (
+    COUNT_CACHED,
+    COUNT_ESTIMATED,
+    COUNT_EXACT,
+    StandardPagination,
+    get_paginator,
+)
+from utils.idempotency import idempotent
+from utils.open_api import (
+    cursor,
+    exclude,
+    fields,
+    get_paginated_response_schema,
+    idempotency_key,
+    page,
+    pagination,
+    per_page,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -34,7 +99,15 @@ logger = logging.getLogger(__name__)
 @extend_schema(tags=["Product"])
 @extend_schema_view(
     get=extend_schema(
-        parameters=[page, per_page],
+        parameters=[
+            ProductFilterSerializer,
+            page,
+            per_page,
+            pagination,
+            cursor,
+            fields,
+            exclude,
+        ],
         responses={
             200: get_paginated_response_schema(
                 ProductSerializer, "Paginated list of products"
@@ -48,12 +121,27 @@ logger = logging.getLogger(__name__)
 class ProductList(AuthenticatedAPIView):
     serializer_class = ProductSerializer
     pagination_class = StandardPagination
+    count_mode = COUNT_CACHED
 
+    def get_queryset(self):
+        filter_serializer = ProductFilterSerializer(data=self.request.query_params)
+        filter_serializer.is_valid(raise_exception=True)
+        return filter_products(
+            Product.objects.defer("search_vector"), **filter_serializer.validated_data
+        )
+
+    @conditional(
+        lambda view, request, **kwargs: [view.get_queryset(), Category.objects.all()],
+        cache_control=CATALOG_CACHE_CONTROL,
+    )
     def get(self, request, format=None):
-        """Get a paginated list of products."""
-        paginator = self.pagination_class()
-        products = paginator.paginate_queryset(Product.objects.all(), request)
-        serializer = self.serializer_class(products, many=True)
+        """Get a filtered, sorted and paginated list of products."""
+        paginator = get_paginator(request, self.pagination_class)
+        products = self.serializer_class.trim_queryset(self.get_queryset(), request)
+        products = paginator.paginate_queryset(products, request, view=self)
+        serializer = self.serializer_class(
+            products, many=True, context={"request": request}
+        )
         response = paginator.get_paginated_response(serializer.data)
         return Response(response, status=200)
 
@@ -65,14 +153,124 @@ class ProductList(AuthenticatedAPIView):
         return Response(serializer.data, status=201)
 
 
+@extend_schema(tags=["Product"])
+@extend_schema_view(
+    post=extend_schema(
+        request=BulkProductSerializer(many=True),
+    ),
+)
+class ProductBulk(AuthenticatedAPIView):
+    max_rows = 5000
+
+    def post(self, request, format=None):
+        """Create or update a batch of products by their external IDs.
+
+        Invalid rows are reported by their index in the batch, and the
+        valid rows are written regardless.
+        """
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response(
+                {"error": "Expected a list of products."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(rows) > self.max_rows:
+            return Response(
+                {"error": f"A batch can hold at most {self.max_rows} products."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Validate every row with the same serializer, like a list
+        # serializer would, but keep going past invalid rows
+        row_serializer = BulkProductSerializer()
+        valid, errors = {}, []
+        for index, row in enumerate(rows):
+            try:
+                data = row_serializer.run_validation(row)
+            except ValidationError as error:
+                errors.append({"index": index, "errors": error.detail})
+                continue
+            if data["external_id"] in valid:
+                errors.append(
+                    {
+                        "index": index,
+                        "errors": {"external_id": ["Duplicate external ID in batch."]},
+                    }
+                )
+                continue
+            valid[data["external_id"]] = (index, data)
+
+        category_ids = set(
+            Category.objects.filter(
+                pk__in={data["category"] for _, data in valid.values()}
+            ).values_list("pk", flat=True)
+        )
+        for external_id, (index, data) in list(valid.items()):
+            if data["category"] not in category_ids:
+                errors.append(
+                    {"index": index, "errors": {"category": ["Category not found."]}}
+                )
+                del valid[external_id]
+
+        written = upsert_products([data for _, data in valid.values()]) if valid else {}
+        results = [
+            {
+                "index": index,
+                "external_id": external_id,
+                "id": written[external_id][0],
+                "created": written[external_id][1],
+            }
+            for external_id, (index, _) in valid.items()
+        ]
+        errors.sort(key=lambda error: error["index"])
+        return Response({"results": results, "errors": errors}, status=200)
+
+
+@extend_schema(tags=["Product"])
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[ExportQuerySerializer],
+        responses={
+            (200, "application/x-ndjson"): OpenApiTypes.STR,
+            (200, "text/csv"): OpenApiTypes.STR,
+        },
+    ),
+)
+class ProductExport(AuthenticatedAPIView):
+    def get(self, request, format=None):
+        """Stream every product created in a range, oldest first."""
+        query_serializer = ExportQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        query = query_serializer.validated_data
+        products = filter_created(
+            Product.objects.all(),
+            created_after=query.get("created_after"),
+            created_before=query.get("created_before"),
+        )
+        return export_response(
+            request,
+            product_rows(products),
+            query["file_format"],
+            "products",
+            PRODUCT_CSV_FIELDS,
+        )
+
+
 @extend_schema(tags=["Product"])
 class ProductDetail(AuthenticatedAPIView):
     serializer_class = ProductSerializer
 
+    @conditional_cached(
+        lambda view, request, pk, **kwargs: [
+            product_cache.get_or_404(pk).updated_at,
+            category_trees_changed_at(),
+        ],
+        cache_control=CATALOG_CACHE_CONTROL,
+    )
     def get(self, request, pk, format=None):
         """Get a product by its ID."""
-        product = get_object_or_404(Product, pk=pk)
-        serializer = self.serializer_class(product)
+        product = product_cache.get_or_404(pk)
+        serializer = self.serializer_class(product, context={"request": request})
         return Response(serializer.data, status=200)
 
     def put(self, request, pk, format=None):
@@ -90,10 +288,44 @@ class ProductDetail(AuthenticatedAPIView):
         return Response(status=204)
 
 
+@extend_schema(tags=["Product"])
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[ProductSearchQuerySerializer, page, per_page, fields, exclude],
+        responses={
+            200: get_paginated_response_schema(
+                ProductSerializer, "Paginated list of matching products"
+            ),
+        },
+    ),
+)
+class ProductSearch(AuthenticatedAPIView):
+    serializer_class = ProductSerializer
+    pagination_class = StandardPagination
+
+    def get(self, request, format=None):
+        """Search products by name and description, best matches first."""
+        query_serializer = ProductSearchQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        products = search_products(
+            query_serializer.validated_data["q"],
+            query_serializer.validated_data.get("category"),
+        )
+
+        paginator = self.pagination_class()
+        products = self.serializer_class.trim_queryset(products, request)
+        products = paginator.paginate_queryset(products, request, view=self)
+        serializer = self.serializer_class(
+            products, many=True, context={"request": request}
+        )
+        response = paginator.get_paginated_response(serializer.data)
+        return Response(response, status=200)
+
+
 @extend_schema(tags=["Category"])
 @extend_schema_view(
     get=extend_schema(
-        parameters=[page, per_page],
+        parameters=[page, per_page, pagination, cursor, fields, exclude],
         responses={
             200: get_paginated_response_schema(
                 CategorySerializer, "Paginated list of categories"
@@ -107,12 +339,22 @@ class ProductDetail(AuthenticatedAPIView):
 class CategoryList(AuthenticatedAPIView):
     serializer_class = CategorySerializer
     pagination_class = StandardPagination
+    count_mode = COUNT_EXACT
 
+    @conditional(
+        lambda view, request, **kwargs: [Category.objects.all()],
+        cache_control=CATALOG_CACHE_CONTROL,
+    )
     def get(self, request, format=None):
         """Get a paginated list of categories."""
-        paginator = self.pagination_class()
-        categories = paginator.paginate_queryset(Category.objects.all(), request)
-        serializer = self.serializer_class(categories, many=True)
+        paginator = get_paginator(request, self.pagination_class)
+        categories = self.serializer_class.trim_queryset(
+            Category.objects.all(), request
+        )
+        categories = paginator.paginate_queryset(categories, request, view=self)
+        serializer = self.serializer_class(
+            categories, many=True, context={"request": request}
+        )
         response = paginator.get_paginated_response(serializer.data)
         return Response(response, status=200)
 
@@ -124,14 +366,88 @@ class CategoryList(AuthenticatedAPIView):
         return Response(serializer.data, status=201)
 
 
+@extend_schema(tags=["Product"])
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[BestSellerQuerySerializer, page, per_page, pagination, cursor],
+        responses={
+            200: get_paginated_response_schema(
+                BestSellerSerializer, "Paginated list of best sellers"
+            ),
+        },
+    ),
+)
+class ProductBestSellers(AuthenticatedAPIView):
+    serializer_class = BestSellerSerializer
+    pagination_class = StandardPagination
+
+    def get(self, request, format=None):
+        """Get the best selling products of the last 7, 30 or 90 days.
+
+        Products are ranked on units sold, then revenue. Use `category`
+        to rank only the products of a category and its descendants.
+        Rankings are refreshed periodically.
+        """
+        query_serializer = BestSellerQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        data = query_serializer.validated_data
+
+        paginator = get_paginator(request, self.pagination_class)
+        best_sellers = (
+            BestSeller.objects.filter(
+                days=data["days"], category_id=data.get("category")
+            )
+            .select_related("product")
+            .order_by("rank")
+        )
+        best_sellers = paginator.paginate_queryset(best_sellers, request, view=self)
+        serializer = self.serializer_class(best_sellers, many=True)
+        response = paginator.get_paginated_response(serializer.data)
+        return Response(response, status=200)
+
+
+@extend_schema(tags=["Category"])
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[CategoryTreeQuerySerializer],
+        responses={200: CategoryTreeSerializer(many=True)},
+    ),
+)
+class CategoryTree(AuthenticatedAPIView):
+    def get(self, request, format=None):
+        """Get the nested category tree, or the subtree of a category.
+
+        Use `root` to get the subtree of a category, and `depth` to limit
+        how many levels of children are included.
+        """
+        query_serializer = CategoryTreeQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        root_id = query_serializer.validated_data.get("root")
+        max_depth = query_serializer.validated_data.get("depth")
+
+        key = category_tree_key(root_id, max_depth)
+        tree = cache.get(key)
+        if tree is None:
+            tree = get_nested_categories(root_id, max_depth)
+            cache.set(key, tree, CATEGORY_TREE_TIMEOUT)
+
+        if root_id and not tree:
+            raise NotFound("Category not found.")
+        return Response(tree, status=200)
+
+
 @extend_schema(tags=["Category"])
 class CategoryDetail(AuthenticatedAPIView):
     serializer_class = CategorySerializer
 
+    @conditional_cached(
+        lambda view, request, pk, **kwargs: [category_cache.get_or_404(pk).updated_at],
+        cache_control=CATALOG_CACHE_CONTROL,
+    )
     def get(self, request, pk, format=None):
         """Get a category by its ID."""
-        category = get_object_or_404(Category, pk=pk)
-        serializer = self.serializer_class(category)
+        category = category_cache.get_or_404(pk)
+        serializer = self.serializer_class(category, context={"request": request})
         return Response(serializer.data, status=200)
 
     def put(self, request, pk, format=None):
@@ -152,7 +468,7 @@ class CategoryDetail(AuthenticatedAPIView):
 @extend_schema(tags=["Order"])
 @extend_schema_view(
     get=extend_schema(
-        parameters=[page, per_page],
+        parameters=[page, per_page, pagination, cursor, fields, exclude],
         responses={
             200: get_paginated_response_schema(
                 OrderSerializer, "Paginated list of orders"
@@ -161,22 +477,40 @@ class CategoryDetail(AuthenticatedAPIView):
     ),
     post=extend_schema(
         request=CreateOrderSerializer,
+        parameters=[idempotency_key],
     ),
 )
 class OrderList(AuthenticatedAPIView):
     serializer_class = OrderSerializer
     pagination_class = StandardPagination
-
+    count_mode = COUNT_ESTIMATED
+
+    @conditional(
+        lambda view, request, **kwargs: [
+            Order.objects.all(),
+            Product.objects.all(),
+            Category.objects.all(),
+        ],
+        cache_control=PRIVATE_CACHE_CONTROL,
+    )
     def get(self, request, format=None):
         """Get a paginated list of orders."""
-        paginator = self.pagination_class()
-        orders = paginator.paginate_queryset(Order.objects.all(), request)
-        serializer = self.serializer_class(orders, many=True)
+        paginator = get_paginator(request, self.pagination_class)
+        orders = self.serializer_class.prefetch(Order.objects.all(), request)
+        orders = self.serializer_class.trim_queryset(orders, request)
+        orders = paginator.paginate_queryset(orders, request, view=self)
+        serializer = self.serializer_class(
+            orders, many=True, context={"request": request}
+        )
         response = paginator.get_paginated_response(serializer.data)
         return Response(response, status=200)
 
+    @idempotent("orders")
     def post(self, request, format=None):
-        """Create a new order."""
+        """Create a new order.
+
+        Send an `Idempotency-Key` header to safely retry the request.
+        """
         serializer = CreateOrderSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         order = serializer.save()
@@ -190,42 +524,45 @@ class OrderList(AuthenticatedAPIView):
         else:
             logger.warning(f"No phone number for customer {order.customer.id}")
 
-        # Prepare email content
-        items = []
-        for item in order.orderitem_set.all():
-            items.append(
-                {
-                    "name": item.product.name,
-                    "quantity": item.quantity,
-                    "price": item.product.price,
-                    "total": item.product.price * item.quantity,
-                }
-            )
+        # Email the admin, rendered by the worker
+        send_order_confirmation.delay_on_commit(str(order.id))
 
-        # Render HTML template for the email
-        html_content = render_to_string(
-            "email/order_confirmation.html",
-            {
-                "order_id": order.id,
-                "items": items,
-                "total_price": order.total_price,
-                "customer_name": f"{order.customer.user.first_name} {order.customer.user.last_name}",
-                "customer_phone": order.customer.phone_number,
-            },
+        order = self.serializer_class.prefetch(Order.objects.all()).get(pk=order.pk)
+        return Response(
+            self.serializer_class(order).data, status=status.HTTP_201_CREATED
         )
 
-        # Fallback text content for non-HTML email clients
-        text_content = strip_tags(html_content)
 
-        # Send the email to the admin
-        mail_admin.delay_on_commit(
-            subject="New Order Placed",
-            body=text_content,
-            html_message=html_content,
-        )
+@extend_schema(tags=["Order"])
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[ExportQuerySerializer],
+        responses={
+            (200, "application/x-ndjson"): OpenApiTypes.STR,
+            (200, "text/csv"): OpenApiTypes.STR,
+        },
+    ),
+)
+class OrderExport(AuthenticatedAPIView):
+    def get(self, request, format=None):
+        """Stream every order created in a range with its items, oldest first.
 
-        return Response(
-            self.serializer_class(order).data, status=status.HTTP_201_CREATED
+        NDJSON has a line per order, and CSV has a row per order item, or a
+        row with empty item columns for an order without items.
+        """
+        query_serializer = ExportQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        query = query_serializer.validated_data
+        orders = filter_created(
+            Order.objects.all(),
+            created_after=query.get("created_after"),
+            created_before=query.get("created_before"),
+        )
+        rows = order_rows(orders)
+        if query["file_format"] == "csv":
+            rows = flatten_order_rows(rows)
+        return export_response(
+            request, rows, query["file_format"], "orders", ORDER_CSV_FIELDS
         )
 
 
@@ -233,15 +570,29 @@ class OrderList(AuthenticatedAPIView):
 class OrderDetail(AuthenticatedAPIView):
     serializer_class = OrderSerializer
 
+    @conditional(
+        lambda view, request, pk, **kwargs: [
+            Order.objects.filter(pk=pk),
+            OrderItem.objects.filter(order=pk),
+            Product.objects.filter(orderitem__order=pk),
+            Category.objects.filter(
+                descendant_links__descendant__product__orderitem__order=pk
+            ),
+        ],
+        cache_control=PRIVATE_CACHE_CONTROL,
+    )
     def get(self, request, pk, format=None):
         """Get an order by its ID."""
-        order = get_object_or_404(Order, pk=pk)
-        serializer = self.serializer_class(order)
+        orders = self.serializer_class.prefetch(Order.objects.all(), request)
+        order = get_object_or_404(orders, pk=pk)
+        serializer = self.serializer_class(order, context={"request": request})
         return Response(serializer.data, status=200)
 
     def put(self, request, pk, format=None):
         """Update an order by its ID."""
-        order = get_object_or_404(Order, pk=pk)
+        order = get_object_or_404(
+            self.serializer_class.prefetch(Order.objects.all()), pk=pk
+        )
         serializer = self.serializer_class(order, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -254,10 +605,42 @@ class OrderDetail(AuthenticatedAPIView):
         return Response(status=204)
 
 
+@extend_schema(tags=["Order"])
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[SalesQuerySerializer],
+        responses={200: SalesSerializer(many=True)},
+    ),
+)
+class DailySalesList(AuthenticatedAPIView):
+    serializer_class = SalesSerializer
+
+    def get(self, request, format=None):
+        """Get the orders, items sold, revenue and average basket per day.
+
+        Defaults to the last 30 days. Use `category` to count only the
+        items of a category and its descendants, or `product` to count
+        only the items of a product. Totals are rolled up periodically,
+        so the latest orders may not be counted yet.
+        """
+        query_serializer = SalesQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        data = query_serializer.validated_data
+
+        series = get_sales_series(
+            data["start"],
+            data["end"],
+            category_id=data.get("category"),
+            product_id=data.get("product"),
+        )
+        serializer = self.serializer_class(series, many=True)
+        return Response(serializer.data, status=200)
+
+
 @extend_schema(tags=["Customer"])
 @extend_schema_view(
     get=extend_schema(
-        parameters=[page, per_page],
+        parameters=[page, per_page, pagination, cursor, fields, exclude],
         responses={
             200: get_paginated_response_schema(
                 CustomerSerializer, "Paginated list of customers"
@@ -271,12 +654,24 @@ class OrderDetail(AuthenticatedAPIView):
 class CustomerList(AuthenticatedAPIView):
     serializer_class = CustomerSerializer
     pagination_class = StandardPagination
-
+    count_mode = COUNT_ESTIMATED
+
+    @conditional(
+        lambda view, request, **kwargs: [
+            Customer.objects.all(),
+            get_user_model().objects.all(),
+        ],
+        cache_control=PRIVATE_CACHE_CONTROL,
+    )
     def get(self, request, format=None):
         """Get a paginated list of customers."""
-        paginator = self.pagination_class()
-        customers = paginator.paginate_queryset(Customer.objects.all(), request)
-        serializer = self.serializer_class(customers, many=True)
+        paginator = get_paginator(request, self.pagination_class)
+        customers = self.serializer_class.prefetch(Customer.objects.all(), request)
+        customers = self.serializer_class.trim_queryset(customers, request)
+        customers = paginator.paginate_queryset(customers, request, view=self)
+        serializer = self.serializer_class(
+            customers, many=True, context={"request": request}
+        )
         response = paginator.get_paginated_response(serializer.data)
         return Response(response, status=200)
 
@@ -292,10 +687,17 @@ class CustomerList(AuthenticatedAPIView):
 class CustomerDetail(AuthenticatedAPIView):
     serializer_class = CustomerSerializer
 
+    @conditional_cached(
+        lambda view, request, pk, **kwargs: [
+            (customer := customer_cache.get_or_404(pk)).updated_at,
+            customer.user.updated_at,
+        ],
+        cache_control=PRIVATE_CACHE_CONTROL,
+    )
     def get(self, request, pk, format=None):
         """Get a customer by their ID."""
-        customer = get_object_or_404(Customer, pk=pk)
-        serializer = self.serializer_class(customer)
+        customer = customer_cache.get_or_404(pk)
+        serializer = self.serializer_class(customer, context={"request": request})
         return Response(serializer.data, status=200)
 
     def put(self, request, pk, format=None):
@@ -320,17 +722,22 @@ class AverageProductPrice(APIView):
         Return the average product price for a given category and its
         child categories.
         """
-        # Get the main category
-        category = get_object_or_404(Category, pk=pk)
+        # Read the precomputed stats of the category and its descendants
+        stats = get_object_or_404(CategoryStats, category_id=pk)
 
-        # Get all descendant categories (including the main category)
-        all_categories = [category] + get_descendant_categories(category)
+        # Return the response
+        return Response({"average_price": stats.average_price}, status=200)
 
-        # Get all products in the category and its descendants
-        products = Product.objects.filter(category__in=all_categories)
 
-        # Calculate the average price
-        average_price = products.aggregate(Avg("price"))["price__avg"]
+@extend_schema(tags=["Category"])
+class CategoryStatsDetail(APIView):
+    serializer_class = CategoryStatsSerializer
 
-        # Return the response
-        return Response({"average_price": average_price}, status=200)
+    def get(self, request, pk, format=None):
+        """
+        Return the product count and price statistics for a given category
+        and its child categories.
+        """
+        stats = get_object_or_404(CategoryStats, category_id=pk)
+        serializer = self.serializer_class(stats)
+        return Response(serializer.data, status=200)
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("user", "0003_alter_user_options_user_created_at_user_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="user_user_created_a9f810_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("user", "0004_created_at_id_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["updated_at"], name="user_user_updated_2abdb5_idx"
+            ),
+        ),
+    ]
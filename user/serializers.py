@@ -3,19 +3,49 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import get_user_model
 
 from user.models import User
+from utils.serializers import SparseFieldsetMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    PREFETCH_FIELDS = ["groups", "user_permissions"]
+
     class Meta:
         model = get_user_model()
         exclude = ["password"]
+        computed_fields = {"is_customer": [], "customer_id": []}
+
+    @classmethod
+    def prefetch(cls, queryset, request=None):
+        """Load the customer, groups and permissions of users upfront.
+
+        Only the relations the request asks for are loaded.
+
+        Args:
+            queryset (QuerySet): The users to serialize.
+            request (Request): The request, if any.
+
+        Returns:
+            QuerySet: The users, with their customers joined and their
+                groups and permissions prefetched.
+        """
+        serializer = cls(context={"request": request})
+        if serializer.wants("is_customer") or serializer.wants("customer_id"):
+            queryset = queryset.select_related("customer")
+        return queryset.prefetch_related(
+            *[name for name in cls.PREFETCH_FIELDS if name in serializer.fields]
+        )
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        ret["is_customer"] = hasattr(instance, "customer")
+        if not (self.wants("is_customer") or self.wants("customer_id")):
+            return ret
+
+        customer = getattr(instance, "customer", None)
+        if self.wants("is_customer"):
+            ret["is_customer"] = customer is not None
 
-        if hasattr(instance, "customer"):
-            ret["customer_id"] = instance.customer.id
+        if customer is not None and self.wants("customer_id"):
+            ret["customer_id"] = customer.id
 
         return ret
 
@@ -1,8 +1,12 @@
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 
+from shop.models import Customer
+
 
 class UserTestCase(APITestCase):
     def setUp(self):
@@ -62,6 +66,52 @@ class UserTestCase(APITestCase):
         response = self.client.get(endpoint, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_get_users_with_cursor_pagination(self):
+        response = self.client.get(
+            self.list_endpoint, {"pagination": "cursor", "per_page": 2}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNone(response.data["previous_cursor"])
+
+        response = self.client.get(
+            self.list_endpoint, {"cursor": response.data["next_cursor"], "per_page": 2}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next_cursor"])
+
+    def test_get_users_with_sparse_fields(self):
+        response = self.client.get(self.list_endpoint, {"fields": "id,email"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for user in response.data["results"]:
+            self.assertEqual(set(user), {"id", "email"})
+
+        response = self.client.get(
+            self.detail_endpoint(self.user_x.id), {"exclude": "customer_id"}
+        )
+        self.assertFalse(response.data["is_customer"])
+        self.assertNotIn("customer_id", response.data)
+
+    def test_get_users_with_a_fixed_number_of_queries(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.list_endpoint, {"per_page": 100})
+
+        User = get_user_model()
+        users = User.objects.bulk_create(
+            User(email=f"user{i}@gmail.com", password="password") for i in range(100)
+        )
+        Customer.objects.bulk_create(Customer(user=user) for user in users[::2])
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(self.list_endpoint, {"per_page": 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 100)
+        self.assertEqual(len(large), len(small))
+
+        customers = [user for user in response.data["results"] if user["is_customer"]]
+        self.assertEqual(len(customers), 50)
+        self.assertTrue(all(user["customer_id"] for user in customers))
+
     def test_update_user(self):
         endpoint = self.detail_endpoint(self.user_x.id)
         response = self.client.put(endpoint, format="json")
@@ -6,8 +6,20 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .serializers import CreateUserSerializer, UserSerializer
-from utils.pagination import StandardPagination
-from utils.open_api import get_paginated_response_schema, page, per_page
+from utils.pagination import (
+    COUNT_ESTIMATED,
+    StandardPagination,
+    get_paginator,
+)
+from utils.open_api import (
+    cursor,
+    exclude,
+    fields,
+    get_paginated_response_schema,
+    page,
+    pagination,
+    per_page,
+)
 
 
 class AuthenticatedAPIView(APIView):
@@ -17,7 +29,7 @@ class AuthenticatedAPIView(APIView):
 @extend_schema(tags=["User"])
 @extend_schema_view(
     get=extend_schema(
-        parameters=[page, per_page],
+        parameters=[page, per_page, pagination, cursor, fields, exclude],
         responses={
             200: get_paginated_response_schema(
                 UserSerializer, "Paginated list of users"
@@ -28,11 +40,14 @@ class AuthenticatedAPIView(APIView):
 class UserList(AuthenticatedAPIView):
     serializer_class = CreateUserSerializer
     pagination_class = StandardPagination
+    count_mode = COUNT_ESTIMATED
 
     def get(self, request, format=None):
-        paginator = self.pagination_class()
-        users = paginator.paginate_queryset(get_user_model().objects.all(), request)
-        serializer = UserSerializer(users, many=True)
+        paginator = get_paginator(request, self.pagination_class)
+        users = UserSerializer.prefetch(get_user_model().objects.all(), request)
+        users = UserSerializer.trim_queryset(users, request)
+        users = paginator.paginate_queryset(users, request, view=self)
+        serializer = UserSerializer(users, many=True, context={"request": request})
         response = paginator.get_paginated_response(serializer.data)
         return Response(response, status=200)
 
@@ -49,8 +64,9 @@ class UserDetail(AuthenticatedAPIView):
     serializer_class = UserSerializer
 
     def get(self, request, pk, format=None):
-        user = get_object_or_404(get_user_model(), pk=pk)
-        serializer = self.serializer_class(user)
+        users = self.serializer_class.prefetch(get_user_model().objects.all(), request)
+        user = get_object_or_404(users, pk=pk)
+        serializer = self.serializer_class(user, context={"request": request})
         return Response(serializer.data, status=200)
 
     def put(self, request, pk, format=None):
@@ -72,5 +88,5 @@ class UserMe(AuthenticatedAPIView):
 
     def get(self, request, format=None):
         user = request.user
-        serializer = self.serializer_class(user)
+        serializer = self.serializer_class(user, context={"request": request})
         return Response(serializer.data, status=200)
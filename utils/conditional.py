@@ -0,0 +1,189 @@
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from utils.pagination import (
+    COUNT_CACHE_TIMEOUT,
+    COUNT_CACHED,
+    COUNT_ESTIMATE_THRESHOLD,
+    COUNT_ESTIMATED,
+    COUNT_EXACT,
+    count_cache_key,
+    estimate_count,
+)
+
+# Catalog reads are the same for every client, but they need credentials,
+# so only the client's own cache may keep them for a short while
+CATALOG_CACHE_CONTROL = {"private": True, "max_age": 60}
+
+# Everything else must be revalidated with the origin on every use
+PRIVATE_CACHE_CONTROL = {"private": True, "no_cache": True}
+
+
+def get_validators(
+    queryset, *related, key: str = "", count_mode: str = COUNT_EXACT
+) -> tuple[str, int | None]:
+    """Compute the validators of a representation from cheap aggregates.
+
+    Deleted rows are caught by the number of rows, which is only counted
+    exactly when the view's paginator would count them exactly too. An
+    estimated count may miss a deletion until the planner statistics
+    change, and a cached one until it expires, the same staleness as the
+    count in the response.
+
+    Args:
+        queryset (QuerySet): The rows the representation is built from.
+        *related (QuerySet): Other rows embedded in the representation.
+        key (str): Anything else the representation depends on.
+        count_mode (str): How the view's paginator counts `queryset`.
+
+    Returns:
+        tuple[str, int | None]: The ETag and the Last-Modified timestamp.
+    """
+    count = None
+    if count_mode == COUNT_ESTIMATED:
+        count = estimate_count(queryset)
+        if count is not None and count < COUNT_ESTIMATE_THRESHOLD:
+            count = None
+    elif count_mode == COUNT_CACHED:
+        # Cached apart from the paginator's count, which reports whether it
+        # was made for the request
+        count_key = count_cache_key(queryset, namespace="conditional")
+        count = cache.get(count_key)
+
+    if count is None:
+        aggregates = queryset.aggregate(
+            last_modified=Max("updated_at"), count=Count("pk")
+        )
+        if count_mode == COUNT_CACHED:
+            cache.set(count_key, aggregates["count"], COUNT_CACHE_TIMEOUT)
+    else:
+        aggregates = queryset.aggregate(last_modified=Max("updated_at"))
+        aggregates["count"] = count
+    timestamps = [aggregates["last_modified"]] + [
+        rows.aggregate(last_modified=Max("updated_at"))["last_modified"]
+        for rows in related
+    ]
+    return get_timestamp_validators(*timestamps, key=f"{key}:{aggregates['count']}")
+
+
+def get_timestamp_validators(*timestamps, key: str = "") -> tuple[str, int | None]:
+    """Compute the validators of a representation from when its parts changed.
+
+    Args:
+        *timestamps (datetime | None): When each part of the representation
+            last changed.
+        key (str): Anything else the representation depends on.
+
+    Returns:
+        tuple[str, int | None]: The ETag and the Last-Modified timestamp.
+    """
+    fingerprint = ":".join(
+        [key] + [timestamp.isoformat() if timestamp else "" for timestamp in timestamps]
+    )
+    etag = quote_etag(hashlib.sha256(fingerprint.encode()).hexdigest())
+
+    timestamps = [timestamp for timestamp in timestamps if timestamp]
+    last_modified = int(max(timestamps).timestamp()) if timestamps else None
+    return etag, last_modified
+
+
+def conditional_response(
+    request, etag: str, last_modified: int | None, get_response, cache_control=None
+):
+    """Answer a conditional GET, or build the response if it is stale.
+
+    Args:
+        request (Request): The request.
+        etag (str): The ETag of the current representation.
+        last_modified (int | None): When the representation last changed.
+        get_response (Callable): Builds the full response.
+        cache_control (dict): Cache-Control directives for the response.
+
+    Returns:
+        Response: A 304 response, or the full one.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = get_response()
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        if cache_control:
+            patch_cache_control(response, **cache_control)
+    return response
+
+
+def conditional(get_querysets, cache_control: dict = None):
+    """Answer conditional GETs without running the view when possible.
+
+    The ETag of a response covers the rows returned by `get_querysets`
+    and the full path of the request, so each page and filter combination
+    is validated on its own. The rows are counted the way the `count_mode`
+    of the view asks for.
+
+    Args:
+        get_querysets (Callable): Called with the view and the view
+            arguments, returns the querysets passed to `get_validators`.
+        cache_control (dict): Cache-Control directives for the response.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            etag, last_modified = get_validators(
+                *get_querysets(view, request, *args, **kwargs),
+                key=request.get_full_path(),
+                count_mode=getattr(view, "count_mode", COUNT_EXACT),
+            )
+
+            return conditional_response(
+                request,
+                etag,
+                last_modified,
+                lambda: method(view, request, *args, **kwargs),
+                cache_control,
+            )
+
+        return wrapper
+
+    return decorator
+
+
+def conditional_cached(get_timestamps, cache_control: dict = None):
+    """Answer conditional GETs of cached objects without the database.
+
+    Like `conditional`, but the validators come from when the parts of
+    the representation last changed, as read from caches, so a matching
+    ETag is answered without a query.
+
+    Args:
+        get_timestamps (Callable): Called with the view and the view
+            arguments, returns the timestamps passed to
+            `get_timestamp_validators`.
+        cache_control (dict): Cache-Control directives for the response.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            etag, last_modified = get_timestamp_validators(
+                *get_timestamps(view, request, *args, **kwargs),
+                key=request.get_full_path(),
+            )
+            return conditional_response(
+                request,
+                etag,
+                last_modified,
+                lambda: method(view, request, *args, **kwargs),
+                cache_control,
+            )
+
+        return wrapper
+
+    return decorator
@@ -1,27 +1,47 @@
 from django.core.mail import mail_admins
 
-from shop.models import Category
+from shop.models import Category, CategoryClosure
 
 
 def get_category_tree(category: Category) -> list[Category]:
     """Utility function to get the category tree.
 
+    The ancestor chain is read from the category closure table in a
+    single query.
+
     Args:
         category (Category): The category to get the tree for.
 
     Returns:
-        list: The category tree.
+        list: The category tree, ordered from the root down.
+    """
+    if category is None:
+        return []
+    return list(category.get_ancestors(include_self=True))
+
+
+def get_category_trees(category_ids) -> dict:
+    """Utility function to get the category trees of many categories.
+
+    Every ancestor chain is read from the category closure table in a
+    single query.
+
+    Args:
+        category_ids (Iterable[UUID]): The categories to get the trees for.
+
+    Returns:
+        dict: The category tree of each category id, ordered from the
+            root down.
     """
-    visited = set()
-    categories = []
-    while category:
-        if category.id in visited:
-            break
-        visited.add(category.id)
-        categories.append(category)
-        category = category.parent
-    categories.reverse()
-    return categories
+    trees = {category_id: [] for category_id in category_ids}
+    links = (
+        CategoryClosure.objects.filter(descendant_id__in=trees)
+        .select_related("ancestor")
+        .order_by("descendant_id", "-depth")
+    )
+    for link in links:
+        trees[link.descendant_id].append(link.ancestor)
+    return trees
 
 
 def send_email(subject: str, message: str):
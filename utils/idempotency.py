@@ -0,0 +1,96 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from shop.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+# How long a response can be replayed for
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+
+def get_fingerprint(request) -> str:
+    """Hash the method, path and body of a request."""
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    payload = f"{request.method}:{request.get_full_path()}:{body}"
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def idempotent(scope: str):
+    """Replay the response of a request retried with the same idempotency key.
+
+    Requests without an `Idempotency-Key` header run as usual. The key is
+    claimed in the same transaction that runs the view, so a concurrent
+    retry blocks on the unique index until the first request commits,
+    then replays its response. Only successful responses are stored; a
+    failed request can be retried with the same key.
+
+    Args:
+        scope (str): What the keys are for, as keys are unique per user
+            and scope.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return method(view, request, *args, **kwargs)
+            if len(key) > 255:
+                return Response(
+                    {"error": f"{IDEMPOTENCY_HEADER} must be at most 255 characters."},
+                    status=400,
+                )
+
+            fingerprint = get_fingerprint(request)
+            now = timezone.now()
+            with transaction.atomic():
+                keys = IdempotencyKey.objects.select_for_update()
+                record, created = keys.get_or_create(
+                    user=request.user,
+                    scope=scope,
+                    key=key,
+                    defaults={
+                        "fingerprint": fingerprint,
+                        "expires_at": now + IDEMPOTENCY_KEY_TTL,
+                    },
+                )
+
+                if not created and record.expires_at > now:
+                    if record.fingerprint != fingerprint:
+                        return Response(
+                            {
+                                "error": f"{IDEMPOTENCY_HEADER} was already used "
+                                "for a different request."
+                            },
+                            status=422,
+                        )
+                    response = Response(
+                        record.response_body, status=record.response_status
+                    )
+                    response["Idempotent-Replayed"] = "true"
+                    return response
+
+                response = method(view, request, *args, **kwargs)
+                if response.status_code >= 400:
+                    # Release the key along with anything the view wrote
+                    transaction.set_rollback(True)
+                    return response
+
+                record.fingerprint = fingerprint
+                record.expires_at = now + IDEMPOTENCY_KEY_TTL
+                record.response_status = response.status_code
+                record.response_body = response.data
+                record.save()
+            return response
+
+        return wrapper
+
+    return decorator
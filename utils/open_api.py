@@ -1,6 +1,7 @@
 from drf_spectacular.utils import (
     OpenApiResponse,
     OpenApiParameter,
+    PolymorphicProxySerializer,
     inline_serializer,
 )
 from drf_spectacular.types import OpenApiTypes
@@ -12,17 +13,35 @@ def get_paginated_response_schema(
 ) -> OpenApiResponse:
     """
     Utility function to generate a paginated response schema for
-    drf-spectacular.
+    drf-spectacular, covering both the page number and the cursor
+    response shapes.
     """
+    name = serializer_class.__name__
     return OpenApiResponse(
-        response=inline_serializer(
-            name=f"Paginated{serializer_class.__name__}Response",
-            fields={
-                "page": serializers.IntegerField(),
-                "per_page": serializers.IntegerField(),
-                "count": serializers.IntegerField(),
-                "results": serializer_class(many=True),
-            },
+        response=PolymorphicProxySerializer(
+            component_name=f"Paginated{name}Response",
+            serializers=[
+                inline_serializer(
+                    name=f"PageNumberPaginated{name}Response",
+                    fields={
+                        "page": serializers.IntegerField(),
+                        "per_page": serializers.IntegerField(),
+                        "count": serializers.IntegerField(),
+                        "count_exact": serializers.BooleanField(),
+                        "results": serializer_class(many=True),
+                    },
+                ),
+                inline_serializer(
+                    name=f"CursorPaginated{name}Response",
+                    fields={
+                        "per_page": serializers.IntegerField(),
+                        "next_cursor": serializers.CharField(allow_null=True),
+                        "previous_cursor": serializers.CharField(allow_null=True),
+                        "results": serializer_class(many=True),
+                    },
+                ),
+            ],
+            resource_type_field_name=None,
         ),
         description=description,
     )
@@ -46,3 +65,53 @@ per_page = OpenApiParameter(
     default=10,
     required=False,
 )
+
+
+pagination = OpenApiParameter(
+    name="pagination",
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.QUERY,
+    description="Pagination mode. Use `cursor` for keyset pagination",
+    enum=["page", "cursor"],
+    default="page",
+    required=False,
+)
+
+
+cursor = OpenApiParameter(
+    name="cursor",
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.QUERY,
+    description="Cursor returned as `next_cursor` or `previous_cursor`",
+    required=False,
+)
+
+
+fields = OpenApiParameter(
+    name="fields",
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.QUERY,
+    description="Comma-separated fields to include, all by default",
+    required=False,
+)
+
+
+exclude = OpenApiParameter(
+    name="exclude",
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.QUERY,
+    description="Comma-separated fields to leave out",
+    required=False,
+)
+
+
+idempotency_key = OpenApiParameter(
+    name="Idempotency-Key",
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.HEADER,
+    description=(
+        "A unique key for the request. Retries with the same key within 24 "
+        "hours get the original response instead of repeating the request"
+    ),
+    required=False,
+)
@@ -1,15 +1,269 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import partial
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+
+COUNT_EXACT = "exact"
+COUNT_ESTIMATED = "estimated"
+COUNT_CACHED = "cached"
+
+# Below this many estimated rows an exact count is cheap enough to run
+COUNT_ESTIMATE_THRESHOLD = 10_000
+COUNT_CACHE_TIMEOUT = 60
+
+
+def estimate_count(queryset) -> int | None:
+    """Estimate the number of rows of a queryset from the query planner.
+
+    Args:
+        queryset (QuerySet): The queryset to estimate.
+
+    Returns:
+        int | None: The planner's row estimate, or None when the database
+            has no usable planner statistics.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_cache_key(queryset, namespace: str = "pagination") -> str:
+    """Get the cache key of the count of a queryset's rows.
+
+    Args:
+        queryset (QuerySet): The queryset to count.
+        namespace (str): Keeps the counts of different callers apart, so
+            that one does not find a count the other just made.
+
+    Returns:
+        str: The cache key.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.sha256(f"{queryset.db}:{sql}:{params}".encode()).hexdigest()
+    return f"{namespace}:count:{digest}"
+
+
+def cached_count(queryset) -> tuple[int, bool]:
+    """Count the rows of a queryset, reusing a recent count of the same query.
+
+    Args:
+        queryset (QuerySet): The queryset to count.
+
+    Returns:
+        tuple[int, bool]: The count and whether it was computed just now.
+    """
+    key = count_cache_key(queryset)
+    count = cache.get(key)
+    if count is not None:
+        return count, False
+    count = queryset.count()
+    cache.set(key, count, COUNT_CACHE_TIMEOUT)
+    return count, True
+
+
+class CountingPaginator(Paginator):
+    """A paginator that can trade an exact count for a cheaper one.
+
+    With an estimated or cached count, pages past the reported count are
+    still served, since the count may be low.
+    """
+
+    def __init__(self, *args, count_mode: str = COUNT_EXACT, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_mode = count_mode
+
+    @cached_property
+    def _count(self) -> tuple[int, bool]:
+        if self.count_mode == COUNT_ESTIMATED:
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate >= COUNT_ESTIMATE_THRESHOLD:
+                return estimate, False
+        elif self.count_mode == COUNT_CACHED:
+            return cached_count(self.object_list)
+        return super().count, True
+
+    @property
+    def count(self):
+        return self._count[0]
+
+    @property
+    def count_exact(self):
+        return self._count[1]
+
+    def validate_number(self, number):
+        if self.count_exact:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        if self.count_exact:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom : bottom + self.per_page], number, self
+        )
 
 
 class StandardPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = "per_page"
     max_page_size = 100
+    count_mode = COUNT_EXACT
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Views pick how the total is counted with a `count_mode` attribute
+        count_mode = getattr(view, "count_mode", self.count_mode)
+        self.django_paginator_class = partial(CountingPaginator, count_mode=count_mode)
+        return super().paginate_queryset(queryset, request, view)
 
     def get_paginated_response(self, data):
         return {
             "page": self.page.number,
             "per_page": self.page.paginator.per_page,
             "count": self.page.paginator.count,
+            "count_exact": self.page.paginator.count_exact,
             "results": data,
         }
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination that seeks on the ordering columns.
+
+    Unlike page numbers, a page is found with an indexed range scan from
+    the position in the cursor, so there is no COUNT(*) and no OFFSET.
+    The explicit ordering of the queryset is used if it has one, and
+    `ordering` otherwise. The last ordering field must be unique.
+    """
+
+    page_size = 10
+    page_size_query_param = "per_page"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    ordering = ("-created_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.per_page = self.get_page_size(request)
+        ordering = tuple(queryset.query.order_by) or self.ordering
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip("-")) for name in ordering
+        ]
+
+        position, reverse = self.decode_cursor(request)
+        if reverse:
+            ordering = [self._flip(name) for name in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek(ordering, position))
+
+        results = list(queryset[: self.per_page + 1])
+        has_more = len(results) > self.per_page
+        results = results[: self.per_page]
+        if reverse:
+            results.reverse()
+
+        self.next_cursor = self.previous_cursor = None
+        if results and (has_more or reverse):
+            self.next_cursor = self.encode_cursor(results[-1], reverse=False)
+        if results and ((has_more and reverse) or (position and not reverse)):
+            self.previous_cursor = self.encode_cursor(results[0], reverse=True)
+        return results
+
+    def get_paginated_response(self, data):
+        return {
+            "per_page": self.per_page,
+            "next_cursor": self.next_cursor,
+            "previous_cursor": self.previous_cursor,
+            "results": data,
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, instance, reverse: bool) -> str:
+        """Encode the position of an instance into an opaque cursor."""
+        position = [field.value_to_string(instance) for field in self.fields]
+        payload = json.dumps({"p": position, "r": reverse})
+        return urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request):
+        """Decode the cursor of a request into a position and a direction."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(cursor.encode()).decode())
+            position = [
+                field.to_python(value)
+                for field, value in zip(self.fields, payload["p"], strict=True)
+            ]
+            return position, bool(payload["r"])
+        except (ValueError, KeyError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _seek(self, ordering, position) -> Q:
+        # (a, b) after (x, y) is written as a <= x AND (a < x OR b < y) for
+        # descending fields, so the planner can range scan on the first
+        # column of the index
+        name, value = ordering[0], position[0]
+        lookup = "lt" if name.startswith("-") else "gt"
+        column = name.lstrip("-")
+        if len(ordering) == 1:
+            return Q(**{f"{column}__{lookup}": value})
+        return Q(**{f"{column}__{lookup}e": value}) & (
+            Q(**{f"{column}__{lookup}": value}) | self._seek(ordering[1:], position[1:])
+        )
+
+    @staticmethod
+    def _flip(name: str) -> str:
+        return name[1:] if name.startswith("-") else f"-{name}"
+
+
+def get_paginator(request, default=StandardPagination):
+    """Get the paginator a list request asked for.
+
+    Clients opt into keyset pagination with `?pagination=cursor`, and
+    keep using it by following the returned cursors.
+
+    Args:
+        request (Request): The list request.
+        default (type): The pagination class to use otherwise.
+
+    Returns:
+        The paginator instance.
+    """
+    if (
+        request.query_params.get("pagination") == "cursor"
+        or KeysetPagination.cursor_query_param in request.query_params
+    ):
+        return KeysetPagination()
+    return default()
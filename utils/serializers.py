@@ -0,0 +1,110 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def get_requested_fields(request, param: str) -> list[str] | None:
+    """Get a comma-separated list of field names from a query parameter.
+
+    Args:
+        request (Request): The request, if any.
+        param (str): The name of the query parameter.
+
+    Returns:
+        list[str] | None: The field names, or None if the parameter is
+            missing.
+    """
+    value = getattr(request, "query_params", {}).get(param)
+    if not value:
+        return None
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class SparseFieldsetMixin:
+    """Let requests trim the fields of a model serializer.
+
+    `?fields=` keeps only the listed fields and `?exclude=` drops the
+    listed ones. The request is read from the serializer context.
+
+    Names that `to_representation` fills in itself go in
+    `Meta.computed_fields`, mapped to the model fields they read, and
+    are only computed when `wants` returns True for them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sparse_fields = None
+
+        request = self.context.get("request")
+        fields = get_requested_fields(request, "fields")
+        exclude = get_requested_fields(request, "exclude")
+        if fields is None and exclude is None:
+            return
+
+        computed_fields = getattr(self.Meta, "computed_fields", {})
+        available = list(self.fields) + [
+            name for name in computed_fields if name not in self.fields
+        ]
+        unknown = [
+            name for name in (fields or []) + (exclude or []) if name not in available
+        ]
+        if unknown:
+            raise serializers.ValidationError(
+                {"fields": [f"Unknown fields: {', '.join(unknown)}."]}
+            )
+
+        self.sparse_fields = [
+            name
+            for name in available
+            if (fields is None or name in fields)
+            and (exclude is None or name not in exclude)
+        ]
+        for name in list(self.fields):
+            if name not in self.sparse_fields:
+                self.fields.pop(name)
+
+    def wants(self, name: str) -> bool:
+        """Whether the request asked for a field."""
+        return self.sparse_fields is None or name in self.sparse_fields
+
+    @classmethod
+    def trim_queryset(cls, queryset, request):
+        """Load only the columns the fields asked for by a request need.
+
+        Args:
+            queryset (QuerySet): The rows to serialize.
+            request (Request): The request.
+
+        Returns:
+            QuerySet: The queryset, limited with `.only()` when the request
+                picked its fields.
+        """
+        serializer = cls(context={"request": request})
+        if serializer.sparse_fields is None:
+            return queryset
+
+        model = queryset.model
+        computed_fields = getattr(cls.Meta, "computed_fields", {})
+        sources = []
+        for name in serializer.sparse_fields:
+            if name in computed_fields:
+                sources.extend(computed_fields[name])
+            elif name in serializer.fields:
+                sources.append(serializer.fields[name].source.split(".")[0])
+
+        # Ordering columns are needed for keyset cursors
+        ordering = queryset.query.order_by or model._meta.ordering
+        sources.extend(name.lstrip("-") for name in ordering if isinstance(name, str))
+
+        # Joined relations are kept whole, as they cannot be deferred
+        related = queryset.query.select_related
+        relations = list(related) if isinstance(related, dict) else []
+
+        columns = set()
+        for source in sources:
+            try:
+                field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete:
+                columns.add(field.name)
+        return queryset.only(*columns, *relations)